@@ -52,6 +52,8 @@ import bpy
 
 from . import axis, operators, panel, preferences
 from . import translations
+from .core.occlusion_pool import shutdown_pool
+from .operators.occlusion import register_horizon_handlers, unregister_horizon_handlers
 
 bl_info = {
     'name': 'Light Painter',
@@ -76,6 +78,7 @@ operators_to_register = (
     operators.LIGHTPAINTER_OT_Flag,
     operators.LIGHTPAINTER_OT_Lamp_Texture,
     operators.LIGHTPAINTER_OT_Lamp_Texture_Remove,
+    operators.LIGHTPAINTER_OT_Clear_Cache,
 
     preferences.VIEW3D_AddonPreferences,
 )
@@ -99,6 +102,8 @@ def register():
     for cls in operators_to_register:
         bpy.utils.register_class(cls)
 
+    register_horizon_handlers()
+
     texture_type_items = [
         ('NOISE', 'Noise', ''),
         ('MAGIC', 'Magic', ''),
@@ -181,6 +186,9 @@ def unregister():
     for cls in operators_to_register[::-1]:
         bpy.utils.unregister_class(cls)
 
+    unregister_horizon_handlers()
+    shutdown_pool()
+
 
 if __name__ == '__main__':
     register()
@@ -15,58 +15,27 @@
 #     You should have received a copy of the GNU General Public License
 #     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-import math
+import numpy as np
 
-from mathutils import Vector
+from .core import stroke
 
-VECTORS = {'X': Vector((1, 0, 0)), 'Y': Vector((0, 1, 0)), 'Z': Vector((0, 0, 1))}
-"""List of arbitrary axes and their given vector."""
-RAY_OFFSET = 0.001
-"""Epsilon offset for ray casts, to prevent self-collisions."""
 
+def prep_stroke(context, vertices, normals, axis: str, offset: float):
+    """Updates vertices and normals to match the artist's chosen axis, see :func:`core.stroke.prep_stroke`.
 
-def reflect_vector(input_vector: Vector, normal: Vector) -> Vector:
-    """Reflects input vector based on a given normal."""
-    dn = 2 * input_vector.dot(normal)
-    reflected_v = input_vector - normal * dn
-    reflected_v.normalize()
-    return reflected_v
-
-
-def get_world_axis_normals(axis_val: str, count: int):
-    """Returns list of vectors facing the world axis."""
-    val = VECTORS[axis_val]
-    return tuple(val for _ in range(count))
-
-
-def prep_stroke(context, vertices: list[Vector], normals: list[Vector], axis: str, offset: float):
-    """Updates vertices and normals to match the artist's chosen axis."""
-    if axis in VECTORS:
-        normals = tuple(VECTORS[axis] for _ in range(len(vertices)))
-    elif axis == 'REFLECT':
-        scene = context.scene
-        camera = scene.camera
-
+    :param context: Blender context, whose scene camera is reflected off the surface for rim lighting
+    :param vertices: list of stroke vertices as Vectors
+    :param normals: list of surface normals as Vectors
+    :param axis: chosen axis
+    :param offset: distance vertices are moved along their normals
+    :exception ValueError: if reflecting without a scene camera
+    :return: tuple of (offset vertices, normals, original vertices) as NumPy arrays, each of shape (N, 3)
+    """
+    camera_origin = None
+    if axis == 'REFLECT':
+        camera = context.scene.camera
         if camera is None:
-            raise ValueError('Set a camera for your scene to use rim lighting!')
-
-        camera_origin = camera.matrix_world.translation
-
-        for idx, vertex, normal in zip(range(len(vertices)), vertices, normals):
-            direction = vertex - camera_origin
-            direction.normalize()
-
-            normals[idx] = reflect_vector(direction, normal)
-
-    orig_vertices = vertices[:]
-
-    if not math.isclose(offset, 0.0):
-        vertices = tuple(
-            v + n * offset
-            for v, n in zip(vertices, normals)
-        )
-
-    if offset < 0.0:
-        normals = [normal * -1 for normal in normals]
+            raise ValueError(stroke.CAMERA_ERROR)
+        camera_origin = np.array(camera.matrix_world.translation, dtype=np.float64)
 
-    return vertices, normals, orig_vertices
+    return stroke.prep_stroke(vertices, normals, axis, offset, camera_origin)
@@ -0,0 +1,5 @@
+"""Geometry and solvers for Light Painter that only depend on NumPy.
+
+Nothing in this package may import ``bpy`` or ``mathutils``:
+it must stay importable from a plain Python process, such as the occlusion worker processes.
+"""
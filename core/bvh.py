@@ -0,0 +1,208 @@
+import numpy as np
+
+LEAF_SIZE = 8
+"""Maximum number of primitives in a BVH leaf."""
+RAY_EPSILON = 1e-12
+"""Determinant threshold below which a ray is considered parallel to a triangle."""
+
+
+class BVH:
+    """Bounding volume hierarchy over axis-aligned primitive bounds, stored as flat NumPy arrays.
+
+    Children of node ``n`` are ``child[n]`` and ``child[n] + 1``; leaves have a child of -1
+    and own the primitives ``order[start[n]:start[n] + count[n]]``.
+    """
+
+    ARRAY_NAMES = ('bounds_min', 'bounds_max', 'child', 'start', 'count', 'order')
+
+    def __init__(self, bounds_min, bounds_max, child, start, count, order):
+        self.bounds_min = bounds_min
+        self.bounds_max = bounds_max
+        self.child = child
+        self.start = start
+        self.count = count
+        self.order = order
+
+    @classmethod
+    def build(cls, primitive_min: np.ndarray, primitive_max: np.ndarray, leaf_size: int = LEAF_SIZE) -> 'BVH':
+        """Builds a BVH by median splits along the longest axis of primitive centroids.
+
+        :param primitive_min: minimum corner of each primitive, shape (P, 3)
+        :param primitive_max: maximum corner of each primitive, shape (P, 3)
+        :param leaf_size: maximum number of primitives per leaf
+        :return: BVH
+        """
+        primitive_min = np.asarray(primitive_min, dtype=np.float64)
+        primitive_max = np.asarray(primitive_max, dtype=np.float64)
+        centroids = (primitive_min + primitive_max) * 0.5
+        order = np.arange(len(centroids), dtype=np.int32)
+
+        bounds_min, bounds_max, child, start, count = [None], [None], [-1], [0], [len(order)]
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            node_start, node_count = start[node], count[node]
+            indices = order[node_start:node_start + node_count]
+            if node_count == 0:
+                bounds_min[node], bounds_max[node] = np.full(3, np.inf), np.full(3, -np.inf)
+                continue
+
+            bounds_min[node] = primitive_min[indices].min(axis=0)
+            bounds_max[node] = primitive_max[indices].max(axis=0)
+            if node_count <= leaf_size:
+                continue
+
+            node_centroids = centroids[indices]
+            extent = node_centroids.max(axis=0) - node_centroids.min(axis=0)
+            axis = int(np.argmax(extent))
+            if extent[axis] <= 0.0:
+                continue  # all centroids overlap, splitting would not separate anything
+
+            half = node_count // 2
+            partition = np.argpartition(node_centroids[:, axis], half)
+            order[node_start:node_start + node_count] = indices[partition]
+
+            left = len(child)
+            child[node] = left
+            for child_start, child_count in ((node_start, half), (node_start + half, node_count - half)):
+                bounds_min.append(None)
+                bounds_max.append(None)
+                child.append(-1)
+                start.append(child_start)
+                count.append(child_count)
+            stack += (left + 1, left)
+
+        return cls(
+            np.array(bounds_min), np.array(bounds_max),
+            np.array(child, dtype=np.int32), np.array(start, dtype=np.int32), np.array(count, dtype=np.int32),
+            order,
+        )
+
+    @classmethod
+    def from_arrays(cls, arrays: dict) -> 'BVH':
+        return cls(*(arrays[name] for name in cls.ARRAY_NAMES))
+
+    def to_arrays(self) -> dict:
+        return {name: getattr(self, name) for name in self.ARRAY_NAMES}
+
+    def traverse(self, origins: np.ndarray, directions: np.ndarray, max_distance: np.ndarray, done: np.ndarray):
+        """Yields the leaves crossed by each ray, skipping rays marked as done in the meantime.
+
+        :param origins: ray origins, shape (R, 3)
+        :param directions: ray directions, shape (R, 3)
+        :param max_distance: ray lengths in units of their direction, shape (R,)
+        :param done: boolean mask of rays that no longer need testing, updated by the caller between leaves
+        :return: generator of (primitive indices, ray indices)
+        """
+        with np.errstate(divide='ignore'):
+            inv_directions = 1.0 / directions
+
+        stack = [(0, np.flatnonzero(~done))]
+        while stack:
+            node, rays = stack.pop()
+            rays = rays[~done[rays]]
+            if len(rays) == 0:
+                continue
+
+            rays = rays[slab_test(self.bounds_min[node], self.bounds_max[node],
+                                  origins[rays], inv_directions[rays], max_distance[rays])]
+            if len(rays) == 0:
+                continue
+
+            left = self.child[node]
+            if left == -1:
+                node_start = self.start[node]
+                yield self.order[node_start:node_start + self.count[node]], rays
+            else:
+                stack.append((left + 1, rays))
+                stack.append((left, rays))
+
+
+def slab_distances(box_min, box_max, origins, inv_directions):
+    """Returns where rays enter and exit axis-aligned boxes, in units of their direction.
+
+    :param box_min: minimum corner of the box(es), broadcastable to origins
+    :param box_max: maximum corner of the box(es), broadcastable to origins
+    :param origins: ray origins, shape (R, 3)
+    :param inv_directions: reciprocal of ray directions, shape (R, 3)
+    :return: tuple of entry and exit distances, each of shape (R,). Rays missing a box exit before entering it
+    """
+    with np.errstate(invalid='ignore'):
+        t_near = (box_min - origins) * inv_directions
+        t_far = (box_max - origins) * inv_directions
+
+    # fmin/fmax ignore NaNs from rays lying exactly on a slab
+    t_enter = np.fmax.reduce(np.fmin(t_near, t_far), axis=-1)
+    t_exit = np.fmin.reduce(np.fmax(t_near, t_far), axis=-1)
+    return t_enter, t_exit
+
+
+def slab_test(box_min, box_max, origins, inv_directions, max_distance) -> np.ndarray:
+    """Tests rays against axis-aligned boxes.
+
+    :param box_min: minimum corner of the box(es), broadcastable to origins
+    :param box_max: maximum corner of the box(es), broadcastable to origins
+    :param origins: ray origins, shape (R, 3)
+    :param inv_directions: reciprocal of ray directions, shape (R, 3)
+    :param max_distance: ray lengths, shape (R,)
+    :return: boolean mask of rays entering the box before their max distance
+    """
+    t_enter, t_exit = slab_distances(box_min, box_max, origins, inv_directions)
+    return (t_exit >= np.maximum(t_enter, 0.0)) & (t_enter <= max_distance)
+
+
+def ray_triangle_hits(origins, directions, max_distance, triangles) -> np.ndarray:
+    """Double-sided Möller–Trumbore intersection of every ray against every triangle.
+
+    :param origins: ray origins, shape (R, 3)
+    :param directions: ray directions, shape (R, 3)
+    :param max_distance: ray lengths in units of their direction, shape (R,)
+    :param triangles: triangle corners, shape (T, 3, 3)
+    :return: (R, T) boolean array, True if the ray hits the triangle
+    """
+    v0 = triangles[:, 0].astype(np.float64)
+    edge_1 = triangles[:, 1] - v0
+    edge_2 = triangles[:, 2] - v0
+
+    p = np.cross(directions[:, np.newaxis], edge_2[np.newaxis])
+    determinant = np.einsum('tk,rtk->rt', edge_1, p)
+    valid = np.abs(determinant) > RAY_EPSILON
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inv_determinant = 1.0 / determinant
+
+        s = origins[:, np.newaxis] - v0[np.newaxis]
+        u = np.einsum('rtk,rtk->rt', s, p) * inv_determinant
+        valid &= (u >= 0.0) & (u <= 1.0)
+
+        q = np.cross(s, edge_1[np.newaxis])
+        v = np.einsum('rk,rtk->rt', directions, q) * inv_determinant
+        valid &= (v >= 0.0) & (u + v <= 1.0)
+
+        t = np.einsum('tk,rtk->rt', edge_2, q) * inv_determinant
+        valid &= (t > 0.0) & (t <= max_distance[:, np.newaxis])
+
+    return valid
+
+
+def build_triangle_bvh(triangles: np.ndarray, leaf_size: int = LEAF_SIZE) -> BVH:
+    """Builds a BVH over triangles of shape (T, 3, 3)."""
+    return BVH.build(triangles.min(axis=1), triangles.max(axis=1), leaf_size)
+
+
+def triangles_any_hit(bvh: BVH, triangles: np.ndarray,
+                      origins: np.ndarray, directions: np.ndarray, max_distance: np.ndarray) -> np.ndarray:
+    """Returns which rays hit any triangle, stopping each ray at its first hit.
+
+    :param bvh: BVH built over the triangles
+    :param triangles: triangle corners, shape (T, 3, 3)
+    :param origins: ray origins, shape (R, 3)
+    :param directions: ray directions, shape (R, 3)
+    :param max_distance: ray lengths in units of their direction, shape (R,)
+    :return: boolean array of shape (R,)
+    """
+    hit = np.zeros(len(origins), dtype=bool)
+    for primitives, rays in bvh.traverse(origins, directions, max_distance, hit):
+        hits = ray_triangle_hits(origins[rays], directions[rays], max_distance[rays], triangles[primitives])
+        hit[rays[hits.any(axis=1)]] = True
+
+    return hit
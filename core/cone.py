@@ -0,0 +1,112 @@
+import numpy as np
+
+from .hull import convex_hull_2d
+
+CONTAIN_TOLERANCE = 1e-9
+"""Cosine tolerance, so directions on the boundary of a cone count as inside."""
+
+
+def get_cap_1(a: np.ndarray):
+    return a, 1.0
+
+
+def get_cap_2(a: np.ndarray, b: np.ndarray):
+    """Smallest cone around two directions, halfway between them."""
+    axis = a + b
+    length = np.linalg.norm(axis)
+    if length < CONTAIN_TOLERANCE:
+        raise ValueError('opposite directions')
+    axis /= length
+    return axis, float(axis @ a)
+
+
+def get_cap_3(a: np.ndarray, b: np.ndarray, c: np.ndarray):
+    """Cone with three directions on its boundary, whose axis is the normal of the plane through them."""
+    axis = np.cross(b - a, c - a)
+    length = np.linalg.norm(axis)
+    if length < CONTAIN_TOLERANCE:
+        # on a single great circle, so the widest pair bounds the third
+        pairs = ((a, b), (a, c), (b, c))
+        return min((get_cap_2(*pair) for pair in pairs), key=lambda cap: cap[1])
+    axis /= length
+    if axis @ a < 0.0:
+        axis = -axis
+    return axis, float(axis @ a)
+
+
+def find_outside(directions: np.ndarray, start: int, stop: int, cap) -> int:
+    """Returns the index of the first direction in [start, stop) outside a cone, -1 if none."""
+    axis, cos_angle = cap
+    outside = directions[start:stop] @ axis < cos_angle - CONTAIN_TOLERANCE
+    return start + int(np.argmax(outside)) if outside.any() else -1
+
+
+def get_hull_directions(directions: np.ndarray) -> np.ndarray:
+    """Returns the directions on the boundary of the convex cone around all directions.
+
+    Directions are projected onto the plane tangent to the unit sphere at their average (a gnomonic projection),
+    which maps cones narrower than a hemisphere to convex regions, so only the 2D hull vertices can bound a cone.
+
+    :param directions: normalized directions, shape (N, 3)
+    :return: hull directions, normalized, shape (H, 3), or all directions if some are not in front of their average
+    """
+    average = directions.sum(axis=0)
+    length = np.linalg.norm(average)
+    if length < CONTAIN_TOLERANCE:
+        return directions
+    average /= length
+
+    heights = directions @ average
+    if heights.min() <= CONTAIN_TOLERANCE:
+        return directions
+
+    helper = np.zeros(3)
+    helper[np.argmin(np.abs(average))] = 1.0
+    u = np.cross(average, helper)
+    u /= np.linalg.norm(u)
+    v = np.cross(average, u)
+
+    projected = directions / heights[:, np.newaxis]
+    hull = convex_hull_2d(np.column_stack((projected @ u, projected @ v)))
+    hull_directions = average + hull[:, :1] * u + hull[:, 1:] * v
+    return hull_directions / np.linalg.norm(hull_directions, axis=1)[:, np.newaxis]
+
+
+def min_enclosing_cone(directions: np.ndarray, seed: int = 0):
+    """Finds the narrowest cone around unit directions, with Welzl's randomized incremental algorithm.
+
+    Like the minimum enclosing circle: after shuffling, whenever a direction falls outside the cone so far,
+    the cone is rebuilt with it on its boundary, which is expected to happen only O(log n) times.
+    Directions inside the hull of the others are dropped first, and scans for the next direction outside
+    are vectorized, rather than testing directions one by one.
+
+    :param directions: normalized directions, shape (N, 3)
+    :param seed: seed of the shuffle, so the same directions always give the same cone
+    :exception ValueError: if the directions do not fit in a cone narrower than a hemisphere
+    :return: tuple of (normalized cone axis, half-angle in radians)
+    """
+    directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)
+    if len(directions) == 0:
+        raise ValueError('no directions')
+    directions = get_hull_directions(directions)
+    directions = directions[np.random.default_rng(seed).permutation(len(directions))]
+
+    cap = get_cap_1(directions[0])
+    i = find_outside(directions, 1, len(directions), cap)
+    while i != -1:
+        # rebuild around every direction so far, with direction i on the boundary
+        cap = get_cap_1(directions[i])
+        j = find_outside(directions, 0, i, cap)
+        while j != -1:
+            cap = get_cap_2(directions[i], directions[j])
+            k = find_outside(directions, 0, j, cap)
+            while k != -1:
+                cap = get_cap_3(directions[i], directions[j], directions[k])
+                k = find_outside(directions, k + 1, j, cap)
+            j = find_outside(directions, j + 1, i, cap)
+        i = find_outside(directions, i + 1, len(directions), cap)
+
+    axis, cos_angle = cap
+    if cos_angle <= 0.0 or find_outside(directions, 0, len(directions), cap) != -1:
+        raise ValueError('directions span more than a hemisphere')
+    return axis, float(np.arccos(min(cos_angle, 1.0)))
@@ -0,0 +1,229 @@
+import numpy as np
+
+DEFAULT_RESOLUTION = 256
+"""Texels along each side of a depth map."""
+DEPTH_BIAS_TEXELS = 1.5
+"""Depth bias in texel sizes, so surfaces sloping away from a point within its texel do not shadow it."""
+MIN_EXTENT = 0.001
+"""Smallest side length of a depth map, for strokes that are a single point as seen from the sun."""
+FOOTPRINT_PADDING = 0.25
+"""Fraction of a stroke's largest side added around its footprint, so it can grow before maps are rendered again."""
+CHUNK_SAMPLES = 1 << 22
+"""Texel samples rasterized at once, to bound memory use of large triangles."""
+INSIDE_TOLERANCE = -1e-9
+"""Barycentric tolerance, so texel centers on shared edges are not missed by both triangles."""
+
+
+def get_basis(direction: np.ndarray) -> np.ndarray:
+    """Returns a (3, 3) matrix of rows U, V and the direction, mapping world space into depth map space."""
+    helper = np.zeros(3)
+    helper[np.argmin(np.abs(direction))] = 1.0
+    u = np.cross(direction, helper)
+    u /= np.linalg.norm(u)
+    return np.array((u, np.cross(direction, u), direction))
+
+
+def get_footprint(points: np.ndarray, bounds: np.ndarray = None) -> np.ndarray:
+    """Returns padded bounds around points, for depth maps to cover.
+
+    :param points: points in world space, shape (N, 3)
+    :param bounds: previous footprint to grow, if None then only bounds the points
+    :return: minimum and maximum corners, shape (2, 3)
+    """
+    low, high = points.min(axis=0), points.max(axis=0)
+    if bounds is not None:
+        low, high = np.minimum(low, bounds[0]), np.maximum(high, bounds[1])
+    padding = max(FOOTPRINT_PADDING * (high - low).max(), MIN_EXTENT)
+    return np.array((low - padding, high + padding))
+
+
+def rasterize(triangles: np.ndarray, resolution: int, texels: np.ndarray) -> np.ndarray:
+    """Renders the highest depth of triangles covering the centers of given texels.
+
+    Only texels that are looked up get rendered: for each row of a triangle's bounds,
+    the texels of interest in that row are found by binary search, so cost follows the covered points,
+    not the map resolution. Vertices also mark their own texel, so triangles smaller than a texel are not lost.
+
+    :param triangles: triangles in texel coordinates (texel centers at integers) and depth, shape (T, 3, 3)
+    :param resolution: texels along each side of the map
+    :param texels: sorted unique flat indices (row * resolution + column) of texels to render, shape (K,)
+    :return: depth of each given texel, shape (K,), -inf where empty
+    """
+    depths_out = np.full(len(texels), -np.inf)
+    if len(triangles) == 0:
+        return depths_out
+
+    xs, ys, depths = triangles[:, :, 0], triangles[:, :, 1], triangles[:, :, 2]
+
+    vertex_x, vertex_y = np.rint(xs).astype(np.intp).ravel(), np.rint(ys).astype(np.intp).ravel()
+    in_map = (vertex_x >= 0) & (vertex_x < resolution) & (vertex_y >= 0) & (vertex_y < resolution)
+    vertex_texels = vertex_y[in_map] * resolution + vertex_x[in_map]
+    positions = np.minimum(np.searchsorted(texels, vertex_texels), len(texels) - 1)
+    found = texels[positions] == vertex_texels
+    np.maximum.at(depths_out, positions[found], depths.ravel()[in_map][found])
+
+    (x0, x1, x2), (y0, y1, y2) = xs.T, ys.T
+    area = (x1 - x0) * (y2 - y0) - (x2 - x0) * (y1 - y0)
+    valid = np.abs(area) > 1e-12
+    area = np.where(valid, area, 1.0)
+
+    # barycentric weights of the first two corners and depth are planes over texel coordinates: a*x + b*y + c
+    planes = np.empty((len(triangles), 3, 3))
+    planes[:, 0] = np.stack((y1 - y2, x2 - x1, x1 * y2 - x2 * y1), axis=-1) / area[:, np.newaxis]
+    planes[:, 1] = np.stack((y2 - y0, x0 - x2, x2 * y0 - x0 * y2), axis=-1) / area[:, np.newaxis]
+    weight_2 = np.stack((-planes[:, 0, 0] - planes[:, 1, 0], -planes[:, 0, 1] - planes[:, 1, 1],
+                         1.0 - planes[:, 0, 2] - planes[:, 1, 2]), axis=-1)
+    planes[:, 2] = (planes[:, 0] * depths[:, 0, np.newaxis] + planes[:, 1] * depths[:, 1, np.newaxis] +
+                    weight_2 * depths[:, 2, np.newaxis])
+
+    min_x = np.clip(np.ceil(xs.min(axis=1)), 0, resolution).astype(np.intp)
+    max_x = np.clip(np.floor(xs.max(axis=1)), -1, resolution - 1).astype(np.intp)
+    min_y = np.clip(np.ceil(ys.min(axis=1)), 0, resolution).astype(np.intp)
+    max_y = np.clip(np.floor(ys.max(axis=1)), -1, resolution - 1).astype(np.intp)
+    heights = np.where(valid & (max_x >= min_x), np.maximum(max_y - min_y + 1, 0), 0)
+
+    # one (triangle, row) pair per row of each triangle's bounds
+    row_tris = np.repeat(np.arange(len(triangles)), heights)
+    row_y = min_y[row_tris] + np.arange(len(row_tris)) - np.repeat(np.cumsum(heights) - heights, heights)
+    starts = np.searchsorted(texels, row_y * resolution + min_x[row_tris])
+    lengths = np.searchsorted(texels, row_y * resolution + max_x[row_tris], side='right') - starts
+
+    # split pairs into chunks of roughly CHUNK_SAMPLES texels
+    chunk_ids = np.cumsum(lengths) // CHUNK_SAMPLES
+    for chunk_id in np.unique(chunk_ids[lengths > 0]):
+        chunk = np.flatnonzero((chunk_ids == chunk_id) & (lengths > 0))
+        chunk_lengths = lengths[chunk]
+
+        positions = (np.repeat(starts[chunk] - (np.cumsum(chunk_lengths) - chunk_lengths), chunk_lengths) +
+                     np.arange(chunk_lengths.sum()))
+        tris = np.repeat(row_tris[chunk], chunk_lengths)
+        px = texels[positions] % resolution
+        py = texels[positions] // resolution
+
+        sample_planes = planes[tris]
+        values = sample_planes[:, :, 0] * px[:, np.newaxis] + sample_planes[:, :, 1] * py[:, np.newaxis]
+        values += sample_planes[:, :, 2]
+        w0, w1, sample_depths = values.T
+        inside = (w0 >= INSIDE_TOLERANCE) & (w1 >= INSIDE_TOLERANCE) & (w0 + w1 <= 1.0 - INSIDE_TOLERANCE)
+
+        np.maximum.at(depths_out, positions[inside], sample_depths[inside])
+
+    return depths_out
+
+
+class DepthMaps:
+    """Orthographic depth maps of occluders, rendered once per direction and looked up by any number of points.
+
+    Each map covers a footprint around the stroke, extruded along its direction: texels follow the size
+    of the stroke rather than of the scene, and only triangles in front of the footprint are rendered.
+    Maps do not depend on which points are looked up, so points in other batches get the same results.
+    """
+
+    def __init__(self, triangles: np.ndarray, bounds: np.ndarray, resolution: int = DEFAULT_RESOLUTION,
+                 offset: float = 0.01):
+        """
+        :param triangles: triangles in world space, shape (T, 3, 3)
+        :param bounds: footprint of the points to look up, see :func:`get_footprint`
+        :param resolution: texels along each side of each map
+        :param offset: minimum distance of an occluder along each direction, to prevent self-collisions
+        """
+        self.triangles = np.asarray(triangles, dtype=np.float64).reshape(-1, 3, 3)
+        self.bounds = np.asarray(bounds, dtype=np.float64)
+        self.resolution = resolution
+        self.offset = offset
+        self.maps = dict()
+        """Tuples of (basis, origin, texel size, depth of each texel) by direction."""
+
+    def covers(self, points: np.ndarray) -> bool:
+        """Checks if points all lie within the footprint, so the maps can be looked up for them."""
+        return bool(np.all((points >= self.bounds[0]) & (points <= self.bounds[1])))
+
+    def get_map(self, direction: np.ndarray) -> tuple:
+        """Returns the depth map of a direction, rendering it on first use.
+
+        :param direction: normalized direction in world space, shape (3,)
+        :return: tuple of (basis, see :func:`get_basis`, origin of the map in the basis' plane, texel size,
+            highest depth of each texel, shape (resolution * resolution,), -inf where empty)
+        """
+        key = tuple(direction.tolist())
+        depth_map = self.maps.get(key)
+        if depth_map is not None:
+            return depth_map
+
+        basis = get_basis(direction)
+        corners = np.stack(np.meshgrid(*self.bounds.T, indexing='ij'), axis=-1).reshape(-1, 3) @ basis.T
+        origin = corners[:, :2].min(axis=0)
+        extent = max(np.ptp(corners[:, :2], axis=0).max(), MIN_EXTENT)
+        texel_size = extent / (self.resolution - 1)
+
+        # only triangles overlapping the footprint and in front of some part of it can block its points
+        map_triangles = self.triangles @ basis.T
+        overlaps = np.all((map_triangles[:, :, :2].max(axis=1) >= origin) &
+                          (map_triangles[:, :, :2].min(axis=1) <= origin + extent), axis=1)
+        map_triangles = map_triangles[overlaps & (map_triangles[:, :, 2].max(axis=1) > corners[:, 2].min())]
+        map_triangles[:, :, :2] = (map_triangles[:, :, :2] - origin) / texel_size
+
+        depths = rasterize(map_triangles, self.resolution, np.arange(self.resolution * self.resolution))
+        depth_map = (basis, origin, texel_size, depths.astype(np.float32))
+        self.maps[key] = depth_map
+        return depth_map
+
+    def is_blocked_along(self, points: np.ndarray, direction: np.ndarray) -> np.ndarray:
+        """Checks if points are occluded in one direction.
+
+        :param points: points in world space, shape (N, 3)
+        :param direction: normalized direction in world space, shape (3,)
+        :return: boolean array of shape (N,), True if blocked
+        """
+        basis, origin, texel_size, depths = self.get_map(direction)
+        map_points = points @ basis.T
+        point_texels = np.rint((map_points[:, :2] - origin) / texel_size).astype(np.intp)
+        # points outside the footprint are not covered, see covers
+        in_map = np.all((point_texels >= 0) & (point_texels < self.resolution), axis=1)
+
+        blocked = np.zeros(len(points), dtype=bool)
+        texel_depths = depths[point_texels[in_map, 1] * self.resolution + point_texels[in_map, 0]]
+        bias = self.offset + DEPTH_BIAS_TEXELS * texel_size
+        blocked[in_map] = texel_depths > map_points[in_map, 2] + bias
+        return blocked
+
+    def is_blocked(self, points: np.ndarray, directions: np.ndarray) -> np.ndarray:
+        """Checks if given points are occluded in given directions.
+
+        Rendering a map costs as much as its occluders and resolution, but only happens once per direction:
+        after that, each point is a single texel lookup, so it beats casting a ray per point for long strokes.
+        Occluders thinner than a texel may be missed.
+
+        :param points: points in world space, shape (N, 3)
+        :param directions: normalized directions in world space, shape (D, 3)
+        :return: (N, D) boolean array, True if blocked
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)
+
+        blocked = np.zeros((len(points), len(directions)), dtype=bool)
+        if len(points) == 0 or len(self.triangles) == 0:
+            return blocked
+
+        for column, direction in enumerate(directions):
+            blocked[:, column] = self.is_blocked_along(points, direction)
+
+        return blocked
+
+
+def depth_map_blocked(triangles: np.ndarray, points: np.ndarray, directions: np.ndarray,
+                      resolution: int = DEFAULT_RESOLUTION, offset: float = 0.01) -> np.ndarray:
+    """Checks if given points are occluded in given directions, rendering one depth map per direction.
+
+    To look up more points later without rendering maps again, keep a :class:`DepthMaps` covering them instead.
+
+    :param triangles: triangles in world space, shape (T, 3, 3)
+    :param points: points in world space, shape (N, 3)
+    :param directions: normalized directions in world space, shape (D, 3)
+    :param resolution: texels along each side of each map
+    :param offset: minimum distance of an occluder along each direction, to prevent self-collisions
+    :return: (N, D) boolean array, True if blocked
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    bounds = get_footprint(points) if len(points) else np.zeros((2, 3))
+    return DepthMaps(triangles, bounds, resolution, offset).is_blocked(points, directions)
@@ -0,0 +1,121 @@
+import numpy as np
+
+from .hull import min_area_rect
+
+KHACHIYAN_TOLERANCE = 1e-3
+"""Change of point weights under which Khachiyan's algorithm stops."""
+KHACHIYAN_ITERATIONS = 200
+"""Iteration budget of Khachiyan's algorithm, so fitting stays within an interactive frame."""
+CIRCLE_REBUILDS = 200
+"""Budget of circle rebuilds in Welzl's algorithm, before settling for the circle so far."""
+CONTAIN_TOLERANCE = 1e-9
+"""Distance tolerance, so points on the boundary of a circle count as inside."""
+
+
+def fit_ellipse(hull: np.ndarray, tolerance: float = KHACHIYAN_TOLERANCE, max_iterations: int = KHACHIYAN_ITERATIONS):
+    """Fits the minimum-area ellipse around a convex polygon, with Khachiyan's algorithm.
+
+    Each iteration moves weight to the point farthest outside the current ellipse.
+    Whether it converged or ran out of iterations, the ellipse is then scaled to enclose every point.
+
+    :param hull: hull vertices, see :func:`convex_hull_2d`, shape (H, 2)
+    :param tolerance: change of point weights under which iterations stop
+    :param max_iterations: maximum number of iterations
+    :return: tuple of (ellipse center, shape (2,), rotation angle aligning its major axis to X,
+        diameter along X, diameter along Y)
+    """
+    if len(hull) < 3:
+        return min_area_rect(hull)
+
+    # centered, so the lifted scatter matrix stays well conditioned far from the origin
+    origin = hull.mean(axis=0)
+    hull = hull - origin
+    point_count, dimensions = len(hull), 2
+    lifted = np.column_stack((hull, np.ones(point_count)))
+    weights = np.full(point_count, 1.0 / point_count)
+
+    for _ in range(max_iterations):
+        scatter = lifted.T @ (lifted * weights[:, np.newaxis])
+        distances = np.einsum('ij,jk,ik->i', lifted, np.linalg.inv(scatter), lifted)
+        farthest = np.argmax(distances)
+        step = (distances[farthest] - dimensions - 1) / ((dimensions + 1) * (distances[farthest] - 1))
+        new_weights = (1.0 - step) * weights
+        new_weights[farthest] += step
+        change = np.linalg.norm(new_weights - weights)
+        weights = new_weights
+        if change < tolerance:
+            break
+
+    center = weights @ hull
+    offsets = hull - center
+    shape = np.linalg.inv((offsets * weights[:, np.newaxis]).T @ offsets) / dimensions
+    # grow to the farthest point, as the iterations only approximate the ellipse
+    shape /= np.einsum('ij,jk,ik->i', offsets, shape, offsets).max()
+
+    eigenvalues, eigenvectors = np.linalg.eigh(shape)  # ascending, so the major axis comes first
+    semi_axes = 1.0 / np.sqrt(eigenvalues)
+    major = eigenvectors[:, 0]
+    return (center + origin, -float(np.arctan2(major[1], major[0])),
+            2.0 * float(semi_axes[0]), 2.0 * float(semi_axes[1]))
+
+
+def get_circle_2(a: np.ndarray, b: np.ndarray):
+    return (a + b) * 0.5, float(np.linalg.norm(a - b)) * 0.5
+
+
+def get_circle_3(a: np.ndarray, b: np.ndarray, c: np.ndarray):
+    """Circumcircle of three points, or the circle around the farthest pair if they are collinear."""
+    ab, ac = b - a, c - a
+    denominator = 2.0 * (ab[0] * ac[1] - ab[1] * ac[0])
+    if abs(denominator) < CONTAIN_TOLERANCE:
+        return max((get_circle_2(a, b), get_circle_2(a, c), get_circle_2(b, c)), key=lambda circle: circle[1])
+
+    ab_squared, ac_squared = ab @ ab, ac @ ac
+    center = a + np.array((ac[1] * ab_squared - ab[1] * ac_squared,
+                           ab[0] * ac_squared - ac[0] * ab_squared)) / denominator
+    return center, float(np.linalg.norm(center - a))
+
+
+def find_outside(points: np.ndarray, start: int, stop: int, circle) -> int:
+    """Returns the index of the first point in [start, stop) outside a circle, -1 if none."""
+    center, radius = circle
+    offsets = points[start:stop] - center
+    outside = np.einsum('ij,ij->i', offsets, offsets) > (radius + CONTAIN_TOLERANCE) ** 2
+    return start + int(np.argmax(outside)) if outside.any() else -1
+
+
+def fit_circle(hull: np.ndarray, seed: int = 0, max_rebuilds: int = CIRCLE_REBUILDS):
+    """Fits the minimum enclosing circle around a convex polygon, with Welzl's randomized incremental algorithm.
+
+    If the circle has to be rebuilt more often than the budget allows,
+    the circle so far is grown around its center to enclose every point.
+
+    :param hull: hull vertices, see :func:`convex_hull_2d`, shape (H, 2)
+    :param seed: seed of the shuffle, so the same points always give the same circle
+    :param max_rebuilds: maximum number of times the circle is rebuilt around a point outside it
+    :return: tuple of (circle center, shape (2,), rotation angle (always 0), diameter, diameter)
+    """
+    points = hull[np.random.default_rng(seed).permutation(len(hull))]
+    circle = (points[0], 0.0)
+    rebuilds = 0
+
+    i = find_outside(points, 1, len(points), circle)
+    while i != -1 and rebuilds < max_rebuilds:
+        # rebuild around every point so far, with point i on the boundary
+        circle = (points[i], 0.0)
+        j = find_outside(points, 0, i, circle)
+        while j != -1 and rebuilds < max_rebuilds:
+            circle = get_circle_2(points[i], points[j])
+            k = find_outside(points, 0, j, circle)
+            while k != -1 and rebuilds < max_rebuilds:
+                circle = get_circle_3(points[i], points[j], points[k])
+                k = find_outside(points, k + 1, j, circle)
+                rebuilds += 1
+            j = find_outside(points, j + 1, i, circle)
+            rebuilds += 1
+        i = find_outside(points, i + 1, len(points), circle)
+        rebuilds += 1
+
+    center = circle[0]
+    diameter = 2.0 * float(np.linalg.norm(points - center, axis=1).max())
+    return center, 0.0, diameter, diameter
@@ -0,0 +1,54 @@
+from math import isclose
+
+import numpy as np
+
+SIZED_SHAPES = {'RECTANGLE', 'ELLIPSE'}
+"""Area lamp shapes measured by length and width, the rest only have a size."""
+
+
+def get_light_points(matrix_world: np.ndarray, light_type: str, shape: str = 'SQUARE',
+                     size: float = 0.0, size_y: float = 0.0) -> np.ndarray:
+    """Returns the points a lamp emits from: the four corners of area lamps, otherwise its location.
+
+    :param matrix_world: lamp's (4, 4) world matrix
+    :param light_type: lamp type, such as 'AREA' or 'POINT'
+    :param shape: area lamp shape
+    :param size: area lamp size, or length for rectangles and ellipses
+    :param size_y: area lamp width for rectangles and ellipses
+    :return: points in world space, shape (K, 3)
+    """
+    matrix_world = np.asarray(matrix_world, dtype=np.float64)
+    if light_type != 'AREA':
+        return matrix_world[np.newaxis, :3, 3].copy()
+
+    size_x = size / 2
+    size_y = size_y / 2 if shape in SIZED_SHAPES else size_x
+    corners = np.array([(x, y, 0.0) for x in (size_x, -size_x) for y in (size_y, -size_y)])
+    return corners @ matrix_world[:3, :3].T + matrix_world[:3, 3]
+
+
+def get_lamp_flag_points(vertices: np.ndarray, light_points: np.ndarray, factor: float) -> np.ndarray:
+    """Returns the points of a flag between a lamp and a stroke, whose convex hull shadows the stroke.
+
+    :param vertices: stroke vertices, shape (N, 3)
+    :param light_points: points the lamp emits from, see :func:`get_light_points`, shape (K, 3)
+    :param factor: position between lamp and stroke (0 is at the lamp, 1 is at the stroke)
+    :return: flag points, for each vertex then each light point, shape (N * K, 3)
+    """
+    if isclose(factor, 1.0):
+        return vertices
+    return (light_points[np.newaxis] + (vertices[:, np.newaxis] - light_points[np.newaxis]) * factor).reshape(-1, 3)
+
+
+def get_sun_flag_points(vertices: np.ndarray, matrix_world: np.ndarray, offset: float) -> np.ndarray:
+    """Returns the points of a flag between a sun lamp and a stroke, offset from the stroke towards the sun.
+
+    :param vertices: stroke vertices, shape (N, 3)
+    :param matrix_world: sun lamp's (4, 4) world matrix
+    :param offset: distance between the stroke and the flag
+    :return: flag points, shape (N, 3)
+    """
+    # suns shine down their local -Z axis
+    direction = np.asarray(matrix_world, dtype=np.float64)[:3, 2].copy()
+    direction /= np.linalg.norm(direction)
+    return vertices + direction * offset
@@ -0,0 +1,99 @@
+from math import pi
+
+import numpy as np
+
+AZIMUTH_BINS = 48
+"""Azimuth bins per horizon map, a multiple of the default 12 sampled longitudes."""
+SEARCH_STEPS = 6
+"""Bisection steps per azimuth, for a precision of 90° / 2^6 (about 1.4°)."""
+NO_HORIZON = -1.0
+"""Horizon elevation of an azimuth that is open down to the horizon."""
+FULL_HORIZON = pi / 2
+"""Horizon elevation of an azimuth whose point is covered from above."""
+
+
+def get_azimuth_bins(directions: np.ndarray, bin_count: int) -> np.ndarray:
+    """Returns the nearest azimuth bin of each direction.
+
+    Azimuths follow :func:`geo_to_dir`, starting at +Y and turning towards +X.
+
+    :param directions: normalized directions, shape (D, 3)
+    :param bin_count: number of azimuth bins
+    :return: bin indices, shape (D,)
+    """
+    azimuths = np.arctan2(directions[:, 0], directions[:, 1])
+    return np.rint(azimuths / (2 * pi / bin_count)).astype(np.intp) % bin_count
+
+
+def get_elevations(directions: np.ndarray) -> np.ndarray:
+    """Returns the angle of each direction above the horizon, in radians."""
+    return np.arcsin(np.clip(directions[:, 2], -1.0, 1.0))
+
+
+def to_directions(azimuths: np.ndarray, elevations: np.ndarray) -> np.ndarray:
+    """Returns normalized directions from azimuths and elevations, shape (len, 3)."""
+    cos_elevations = np.cos(elevations)
+    return np.stack((
+        cos_elevations * np.sin(azimuths),
+        cos_elevations * np.cos(azimuths),
+        np.sin(elevations),
+    ), axis=-1)
+
+
+def compute_horizons(points: np.ndarray, cast, bin_count: int = AZIMUTH_BINS,
+                     steps: int = SEARCH_STEPS) -> np.ndarray:
+    """Finds the highest occluded elevation around each point, per azimuth bin.
+
+    Occluders are treated like terrain: below the horizon everything is blocked, above it everything is visible.
+    Azimuths open at the horizon are only tested once, and points covered from above are tested once overall.
+
+    :param points: points in world space, shape (N, 3)
+    :param cast: function taking ray origins (R, 3) and directions (R, 3), returning a (R,) blocked array
+    :param bin_count: number of azimuth bins
+    :param steps: bisection steps for each azimuth blocked at the horizon
+    :return: horizon elevations in radians, shape (N, bin_count).
+        :data:`NO_HORIZON` if open at the horizon, :data:`FULL_HORIZON` if covered
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    point_count = len(points)
+    horizons = np.full(point_count * bin_count, NO_HORIZON)
+    if point_count == 0:
+        return horizons.reshape(0, bin_count)
+
+    azimuths = np.arange(bin_count) * (2 * pi / bin_count)
+    pair_points = np.repeat(np.arange(point_count), bin_count)
+    pair_azimuths = np.tile(azimuths, point_count)
+
+    def cast_pairs(pairs, elevations):
+        return cast(points[pair_points[pairs]], to_directions(pair_azimuths[pairs], elevations))
+
+    pending = np.arange(point_count * bin_count)
+    pending = pending[cast_pairs(pending, np.zeros(len(pending)))]
+
+    zenith = np.broadcast_to((0.0, 0.0, 1.0), (point_count, 3))
+    covered = cast(points, zenith)[pair_points[pending]]
+    horizons[pending[covered]] = FULL_HORIZON
+    pending = pending[~covered]
+
+    # blocked at the bottom, open at the top
+    low = np.zeros(len(pending))
+    high = np.full(len(pending), pi / 2)
+    for _ in range(steps if len(pending) else 0):
+        middle = (low + high) * 0.5
+        hit = cast_pairs(pending, middle)
+        low = np.where(hit, middle, low)
+        high = np.where(hit, high, middle)
+
+    horizons[pending] = low
+    return horizons.reshape(point_count, bin_count)
+
+
+def lookup_blocked(horizons: np.ndarray, directions: np.ndarray) -> np.ndarray:
+    """Checks if points are occluded in given directions, using their horizon maps instead of ray casts.
+
+    :param horizons: horizon elevations of each point, shape (N, bins)
+    :param directions: normalized directions in world space, shape (D, 3)
+    :return: (N, D) boolean array, True if blocked
+    """
+    bins = get_azimuth_bins(directions, horizons.shape[1])
+    return get_elevations(directions)[np.newaxis] <= horizons[:, bins]
@@ -0,0 +1,344 @@
+import numpy as np
+
+HULL_TOLERANCE = 1e-9
+"""Distance below which a point counts as lying on a hull face, relative to the size of the points."""
+HULL_CHUNK = 256
+"""Points tested against the whole 3D hull at once, before inserting the ones outside one by one."""
+
+
+def cross_2d(origins: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Returns the z component of (a - origins) x (b - origins), positive for counter-clockwise turns."""
+    return (a[..., 0] - origins[..., 0]) * (b[..., 1] - origins[..., 1]) - (
+            a[..., 1] - origins[..., 1]) * (b[..., 0] - origins[..., 0])
+
+
+def discard_interior(points: np.ndarray) -> np.ndarray:
+    """Drops points strictly inside the polygon of their extremes along 8 directions (Akl-Toussaint heuristic).
+
+    :param points: 2D points, shape (N, 2)
+    :return: remaining points, which still include every hull vertex, in their original order
+    """
+    x, y = points[:, 0], points[:, 1]
+    extremes = [np.argmin(x), np.argmin(x + y), np.argmin(y), np.argmax(x - y),
+                np.argmax(x), np.argmax(x + y), np.argmax(y), np.argmin(x - y)]
+    # counter-clockwise, without repeated extremes
+    extremes = [index for position, index in enumerate(extremes) if index not in extremes[:position]]
+    if len(extremes) < 3:
+        return points
+
+    polygon = points[extremes]
+    inside = np.ones(len(points), dtype=bool)
+    for start, end in zip(polygon, np.roll(polygon, -1, axis=0)):
+        inside &= cross_2d(start, end, points) > 0.0
+    return points[~inside]
+
+
+def get_chain(points: np.ndarray) -> np.ndarray:
+    """Returns the convex chain of sorted points, keeping only counter-clockwise turns.
+
+    Instead of pushing points one by one, every point turning the wrong way between its current neighbors
+    is dropped at once: such a point lies on the inner side of a chord between two remaining points,
+    so it can never be on the chain. Passes repeat until every turn is counter-clockwise.
+
+    :param points: 2D points sorted along the chain, shape (N, 2)
+    :return: chain vertices, including both ends
+    """
+    while len(points) > 2:
+        keep = np.ones(len(points), dtype=bool)
+        keep[1:-1] = cross_2d(points[:-2], points[1:-1], points[2:]) > 0.0
+        if keep.all():
+            break
+        points = points[keep]
+    return points
+
+
+def convex_hull_2d(points: np.ndarray) -> np.ndarray:
+    """Computes the convex hull of 2D points with Andrew's monotone chain, over NumPy arrays.
+
+    :param points: 2D points, shape (N, 2)
+    :return: hull vertices in counter-clockwise order without collinear points, shape (H, 2).
+        A single point or both ends of a segment if the points are degenerate
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if len(points) >= 3:
+        points = discard_interior(points)
+
+    points = np.unique(points, axis=0)  # sorted by x, then y
+    if len(points) < 3:
+        return points
+
+    lower = get_chain(points)
+    upper = get_chain(points[::-1])
+    hull = np.concatenate((lower[:-1], upper[:-1]))
+    return hull if len(hull) >= 2 else points[[0, -1]]
+
+
+class IncrementalHull:
+    """Convex hull of points that grow over time, such as a stroke being painted, as seen along a direction.
+
+    Appended points are merged with the previous hull vertices only,
+    so updates cost as much as the hull and the new points rather than the whole stroke.
+    The hull is rebuilt from all points whenever the direction changes (e.g. following the average normal
+    of a stroke on a curved surface), as hulls seen along different directions have different vertices.
+    """
+
+    def __init__(self):
+        self.vertices = np.empty((0, 3))
+        self.align_to_z = None
+        self.hull = np.empty((0, 2))
+
+    def update(self, vertices: np.ndarray, align_to_z: np.ndarray) -> np.ndarray:
+        """Returns the 2D hull of given points rotated to a plane,
+        reusing the previous hull if the rotation is the same and the points extend the previous points.
+
+        :param vertices: points, shape (N, 3)
+        :param align_to_z: rotation to the plane seen from above, only X and Y are kept, shape (3, 3)
+        :return: hull vertices in counter-clockwise order, shape (H, 2)
+        """
+        vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+        align_to_z = np.asarray(align_to_z, dtype=np.float64)
+        previous_count = len(self.vertices)
+        if (self.align_to_z is not None and np.array_equal(align_to_z, self.align_to_z)
+                and 0 < previous_count <= len(vertices) and np.array_equal(vertices[:previous_count], self.vertices)):
+            self.hull = convex_hull_2d(np.concatenate((self.hull, vertices[previous_count:] @ align_to_z[:2].T)))
+        else:
+            self.hull = convex_hull_2d(vertices @ align_to_z[:2].T)
+
+        self.vertices = vertices.copy()
+        self.align_to_z = align_to_z.copy()
+        return self.hull
+
+
+def min_area_rect(hull: np.ndarray):
+    """Finds the minimum-area rectangle around a convex polygon with rotating calipers.
+
+    One side of the optimal rectangle lies on a hull edge. For each edge, the farthest vertices
+    along and across it are found by binary search over the (increasing) edge angles, instead of walking calipers.
+
+    :param hull: hull vertices in counter-clockwise order, see :func:`convex_hull_2d`, shape (H, 2)
+    :return: tuple of (rectangle center, shape (2,), rotation angle aligning the rectangle to the X and Y axes
+        (as in :func:`mathutils.geometry.box_fit_2d`), length along X, width along Y)
+    """
+    if len(hull) == 1:
+        return hull[0].copy(), 0.0, 0.0, 0.0
+
+    edges = np.roll(hull, -1, axis=0) - hull
+    angles = np.unwrap(np.arctan2(edges[:, 1], edges[:, 0]))
+    if len(hull) == 2:
+        return (hull[0] + hull[1]) * 0.5, -float(angles[0]), float(np.linalg.norm(edges[0])), 0.0
+
+    def support(directions: np.ndarray) -> np.ndarray:
+        """Index of the hull vertex farthest along each direction angle."""
+        # a vertex is farthest along outward normals between its incoming and outgoing edges
+        edge_angles = angles[0] + np.mod(directions + np.pi / 2 - angles[0], 2 * np.pi)
+        return np.searchsorted(angles, edge_angles) % len(hull)
+
+    cos_angles, sin_angles = np.cos(angles), np.sin(angles)
+
+    def project(indices, axis_x, axis_y):
+        return hull[indices, 0] * axis_x + hull[indices, 1] * axis_y
+
+    starts = np.arange(len(hull))
+    min_u = project(support(angles + np.pi), cos_angles, sin_angles)
+    max_u = project(support(angles), cos_angles, sin_angles)
+    min_v = project(starts, -sin_angles, cos_angles)  # the edge itself, as the hull is on its left
+    max_v = project(support(angles + np.pi / 2), -sin_angles, cos_angles)
+
+    best = np.argmin((max_u - min_u) * (max_v - min_v))
+    u = np.array((cos_angles[best], sin_angles[best]))
+    v = np.array((-sin_angles[best], cos_angles[best]))
+    center = u * (min_u[best] + max_u[best]) * 0.5 + v * (min_v[best] + max_v[best]) * 0.5
+    return center, -float(angles[best]), float(max_u[best] - min_u[best]), float(max_v[best] - min_v[best])
+
+
+def get_face_planes(coords: np.ndarray, faces: np.ndarray):
+    """Returns the outward unit normals and plane offsets of counter-clockwise triangles.
+
+    :param coords: vertex coordinates, shape (V, 3)
+    :param faces: vertex indices of each triangle, shape (F, 3)
+    :return: tuple of (normals, shape (F, 3), offsets along them, shape (F,))
+    """
+    a = coords[faces[:, 0]]
+    ab, ac = coords[faces[:, 1]] - a, coords[faces[:, 2]] - a
+    # cross product by hand, np.cross has a large overhead on the few faces added at a time
+    normals = ab[:, (1, 2, 0)] * ac[:, (2, 0, 1)] - ab[:, (2, 0, 1)] * ac[:, (1, 2, 0)]
+    lengths = np.linalg.norm(normals, axis=1)
+    # slivers get a zero normal: they never see a point, so they are only replaced along with their neighbors
+    normals = np.divide(normals, lengths[:, np.newaxis], out=np.zeros_like(normals),
+                        where=lengths[:, np.newaxis] > 0.0)
+    return normals, np.einsum('ij,ij->i', normals, a)
+
+
+class IncrementalHull3D:
+    """Convex hull of 3D points that grow over time, such as strokes being painted.
+
+    Each appended point is tested against the planes of the hull's faces: points inside are rejected,
+    otherwise the faces it sees are replaced with triangles joining it to their horizon.
+    Points that do not extend the previous ones (e.g. after erasing) rebuild the hull,
+    inserting the previous hull vertices that remain first, so most other points are rejected right away.
+
+    Faces live in slots that are reused once replaced, so patching the hull does not copy every face.
+    Used slots always come first, and the slots each update changed are kept in :attr:`changed_slots`,
+    so a mesh written from the slots can be patched the same way, see :meth:`get_slot_faces`.
+    """
+
+    def __init__(self):
+        self.points = np.empty((0, 3))
+        self.coords = np.empty((0, 3))
+        """Every inserted point, including those that fell inside the hull later on."""
+        self.faces = None
+        """Vertex indices of each counter-clockwise triangle slot, or None if the points are coplanar."""
+        self.normals = np.empty((0, 3))
+        self.offsets = np.empty(0)
+        """Plane offset of each face slot, infinite for unused slots so they never see a point."""
+        self.face_count = 0
+        """Number of used slots, which are the first ones."""
+        self.changed_slots = None
+        """Slots whose face changed in the last update, including new ones, None if the hull was rebuilt."""
+        self.tolerance = 0.0
+        self.result = None
+
+    def update(self, points: np.ndarray):
+        """Returns the hull of given points, patching the previous hull if they extend the previous points.
+
+        :param points: points, shape (N, 3)
+        :return: the same tuple as the previous update if the hull did not change, otherwise a tuple of
+            (vertex coordinates, shape (V, 3), vertex count of each face, shape (F,),
+            vertex indices of every face in order, shape (3 * F,)). None if the points are all coplanar
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        previous_count = len(self.points)
+        if (self.faces is not None and previous_count <= len(points)
+                and np.array_equal(points[:previous_count], self.points)):
+            changed_slots = set()
+            self.changed_slots = changed_slots
+            is_changed = self.add_points(points[previous_count:])
+            # slots past the end were emptied by a later insert
+            self.changed_slots = np.array(sorted(slot for slot in changed_slots if slot < self.face_count),
+                                          dtype=np.intp)
+        else:
+            self.changed_slots = None
+            is_changed = self.build(np.concatenate((self.get_remaining_vertices(points), points)))
+
+        self.points = points.copy()
+        if self.faces is None:
+            self.result = None
+        elif is_changed or self.result is None:
+            used, face_vertices = np.unique(self.get_faces(), return_inverse=True)
+            face_vertices = face_vertices.astype(np.int32).ravel()
+            self.result = (self.coords[used], np.full(len(face_vertices) // 3, 3, dtype=np.int32), face_vertices)
+        return self.result
+
+    def get_faces(self) -> np.ndarray:
+        """Returns the vertex indices of each hull triangle, shape (F, 3)."""
+        return self.faces[:self.face_count]
+
+    def get_slot_faces(self):
+        """Returns the hull's triangles in slot order, indexing every inserted point.
+
+        Unlike :meth:`update`, vertices inside the hull are kept, so that vertices are only ever appended
+        and triangles keep their index until their slot changes.
+
+        :return: tuple of (vertex coordinates, shape (V, 3), vertex indices of each triangle, shape (F, 3))
+        """
+        return self.coords, self.get_faces()
+
+    def get_remaining_vertices(self, points: np.ndarray) -> np.ndarray:
+        """Returns the previous hull vertices that are still among given points."""
+        if self.faces is None or len(points) == 0:
+            return np.empty((0, 3))
+
+        def as_rows(values):
+            return np.ascontiguousarray(values).view(np.dtype((np.void, values.itemsize * 3))).ravel()
+
+        vertices = self.coords[np.unique(self.get_faces())]
+        return vertices[np.isin(as_rows(vertices), as_rows(points))]
+
+    def build(self, points: np.ndarray) -> bool:
+        """Builds the hull from scratch, starting with a tetrahedron of extreme points.
+
+        :return: True, the hull always changes
+        """
+        self.faces = None
+        if len(points) < 4:
+            return True
+
+        self.tolerance = HULL_TOLERANCE * max(float(np.ptp(points, axis=0).max()), 1.0)
+        first = np.argmin(points[:, 0])
+        second = np.argmax(np.linalg.norm(points - points[first], axis=1))
+        axis = points[second] - points[first]
+        third = np.argmax(np.linalg.norm(np.cross(points - points[first], axis), axis=1))
+        normal = np.cross(axis, points[third] - points[first])
+        length = np.linalg.norm(normal)
+        if length <= self.tolerance:
+            return True  # collinear
+        distances = (points - points[first]) @ (normal / length)
+        fourth = np.argmax(np.abs(distances))
+        if abs(distances[fourth]) <= self.tolerance:
+            return True  # coplanar
+
+        self.coords = points[[first, second, third, fourth]]
+        faces = np.array(((0, 1, 2), (0, 3, 1), (1, 3, 2), (2, 3, 0)))
+        if distances[fourth] > 0.0:
+            faces = faces[:, ::-1]  # keep normals pointing away from the fourth point
+        self.faces = faces
+        self.normals, self.offsets = get_face_planes(self.coords, self.faces)
+        self.face_count = len(faces)
+
+        self.add_points(points)
+        return True
+
+    def add_points(self, points: np.ndarray) -> bool:
+        """Inserts points into the hull, testing them by chunks first.
+
+        :return: True if the hull changed
+        """
+        is_changed = False
+        for start in range(0, len(points), HULL_CHUNK):
+            chunk = points[start:start + HULL_CHUNK]
+            outside = np.any(chunk @ self.normals.T - self.offsets > self.tolerance, axis=1)
+            for point in chunk[outside]:
+                is_changed |= self.insert(point)
+        return is_changed
+
+    def insert(self, point: np.ndarray) -> bool:
+        """Inserts a point, replacing the faces it sees with triangles joining it to their horizon.
+
+        :return: True if the point was outside the hull
+        """
+        visible = np.flatnonzero(self.normals @ point - self.offsets > self.tolerance)
+        if len(visible) == 0:
+            return False
+
+        # horizon edges are the visible faces' edges whose reverse does not belong to a visible face
+        edges = set(map(tuple, self.faces[visible][:, ((0, 1), (1, 2), (2, 0))].reshape(-1, 2).tolist()))
+        index = len(self.coords)
+        new_faces = np.array([(start, end, index) for start, end in edges if (end, start) not in edges])
+        self.coords = np.concatenate((self.coords, point[np.newaxis]))
+
+        face_count = self.face_count
+        slots = np.concatenate((visible, np.arange(face_count, face_count + len(new_faces) - len(visible))))
+        if face_count + len(new_faces) - len(visible) > len(self.faces):
+            # grow slots geometrically, so faces are rarely copied
+            count = max(len(new_faces) - len(visible), len(self.faces))
+            self.faces = np.concatenate((self.faces, np.zeros((count, 3), dtype=self.faces.dtype)))
+            self.normals = np.concatenate((self.normals, np.zeros((count, 3))))
+            self.offsets = np.concatenate((self.offsets, np.full(count, np.inf)))
+
+        slots, holes = slots[:len(new_faces)], slots[len(new_faces):]
+        self.faces[slots] = new_faces
+        self.normals[slots], self.offsets[slots] = get_face_planes(self.coords, new_faces)
+        self.face_count += len(new_faces) - len(visible)
+
+        # fewer faces than were replaced (the point enclosed hull vertices): the last faces fill the holes left,
+        # so used slots stay first
+        moved = np.setdiff1d(np.arange(self.face_count, face_count), holes)
+        holes = holes[holes < self.face_count]
+        self.faces[holes], self.normals[holes], self.offsets[holes] = (
+            self.faces[moved], self.normals[moved], self.offsets[moved])
+        self.offsets[self.face_count:face_count] = np.inf
+
+        if self.changed_slots is not None:
+            self.changed_slots.update(slots.tolist())
+            self.changed_slots.update(holes.tolist())
+        return True
@@ -0,0 +1,123 @@
+from collections import OrderedDict
+import hashlib
+import sys
+
+import numpy as np
+
+MEMO_ENTRIES = 16
+"""Results kept per tool, enough to toggle back and forth between every lamp type and axis."""
+MEMO_BYTES = 64 << 20
+"""Bytes of results kept per tool, so large strokes do not pile up their geometry."""
+
+
+def get_nbytes(value) -> int:
+    """Estimates the memory held by a result: NumPy arrays by their buffers, tuples and lists by their items."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(get_nbytes(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class StrokeDigest:
+    """Digest of painted strokes, updated as points are appended to them.
+
+    Each stroke keeps its own running hash, so appending points only hashes the new ones.
+    Strokes are matched by identity: a stroke list that is replaced (e.g. after erasing) is hashed again.
+    """
+
+    def __init__(self):
+        self.strokes = []
+        """Tuples of (stroke list, hashed point count, running hash), one per stroke."""
+
+    def update(self, strokes) -> bytes:
+        """Returns the digest of the strokes' points, hashing only points added since the last update.
+
+        :param strokes: list of strokes, each a list of points, such as (coordinate, normal) pairs
+        :return: 16-byte digest
+        """
+        states = []
+        for idx, stroke in enumerate(strokes):
+            state = self.strokes[idx] if idx < len(self.strokes) else None
+            if state is not None and state[0] is stroke and state[1] <= len(stroke):
+                _, count, hasher = state
+            else:
+                count, hasher = 0, hashlib.blake2b(digest_size=16)
+
+            if count < len(stroke):
+                hasher.update(np.array(stroke[count:], dtype=np.float64).tobytes())
+            states.append((stroke, len(stroke), hasher))
+        self.strokes = states
+
+        # stroke lengths too, so breaking a stroke in two changes the digest
+        total = hashlib.blake2b(digest_size=16)
+        for _, count, hasher in states:
+            total.update(count.to_bytes(8, 'little'))
+            total.update(hasher.digest())
+        return total.digest()
+
+    def get_stroke_digests(self) -> list:
+        """Returns the digest of each stroke's points as of the last update, e.g. to cache results stroke by stroke.
+
+        :return: list of 16-byte digests, one per stroke
+        """
+        return [hasher.digest() for _, _, hasher in self.strokes]
+
+
+class LRUMemo:
+    """Least recently used results of a solver, capped by entry count and estimated size.
+
+    Results must not be modified once stored, as later lookups return the same objects.
+    """
+
+    def __init__(self, max_entries: int = MEMO_ENTRIES, max_bytes: int = MEMO_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        """Tuples of (result, size in bytes) by key, least recently used first."""
+        self.nbytes = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        entry = self.entries.get(key)
+        if entry is None:
+            return default
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value):
+        """Stores a result, evicting the least recently used ones beyond the caps.
+        Results larger than the byte cap are not stored.
+        """
+        nbytes = get_nbytes(value)
+        if key in self.entries:
+            self.nbytes -= self.entries.pop(key)[1]
+        if nbytes > self.max_bytes or self.max_entries <= 0:
+            return
+
+        self.entries[key] = (value, nbytes)
+        self.nbytes += nbytes
+        while len(self.entries) > self.max_entries or self.nbytes > self.max_bytes:
+            self.nbytes -= self.entries.popitem(last=False)[1][1]
+
+    def get_or_compute(self, key, compute):
+        """Returns the stored result for a key, or computes and stores it.
+
+        :param key: hashable key, covering everything the result depends on
+        :param compute: function taking no arguments, returning the result. Errors it raises are not stored
+        :return: result
+        """
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            return entry[0]
+
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
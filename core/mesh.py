@@ -0,0 +1,468 @@
+from itertools import product
+from math import dist, isclose
+
+import numpy as np
+
+from .hull import get_face_planes, HULL_TOLERANCE, IncrementalHull, IncrementalHull3D
+from .placement import get_average_normal, get_rotation_to_z, project_to_farthest_plane
+
+FLAT_NORMAL_TOLERANCE = np.cos(np.radians(1.0))
+"""Cosine of the angle the average normal moves by before a flattened hull is rebuilt along it."""
+CELL_HASH_PRIMES = np.array((73856093, 19349663, 83492791), dtype=np.int64)
+"""Multipliers hashing integer grid cells, colliding cells only cost extra distance checks."""
+
+
+def get_hull_points(vertices: np.ndarray, normals: np.ndarray, flatten: bool) -> np.ndarray:
+    """Returns the points whose convex hull becomes an emissive mesh.
+
+    :param vertices: stroke vertices, shape (N, 3)
+    :param normals: normals corresponding to the vertices, shape (N, 3)
+    :param flatten: if True, flattens the points onto the plane along their average normal
+    :exception ValueError: if flattening and the average normal is a zero vector
+    :return: mesh points, shape (N, 3)
+    """
+    if not flatten:
+        return vertices
+    return project_to_farthest_plane(vertices, get_average_normal(normals))
+
+
+class IncrementalFlatHull:
+    """Convex polygon of points that grow over time, flattened onto the plane along their average normal.
+
+    Appended points are merged into the 2D hull in the plane, see :class:`core.hull.IncrementalHull`.
+    The plane keeps its normal until the average normal moves past :data:`FLAT_NORMAL_TOLERANCE`,
+    so painting on a slightly curved surface still patches the hull instead of rebuilding it every update.
+    """
+
+    def __init__(self):
+        self.hull = IncrementalHull()
+        self.normal = None
+        self.align_to_z = None
+        self.result = None
+
+    def update(self, vertices: np.ndarray, normals: np.ndarray):
+        """Returns the flattened hull of given points, see :func:`get_hull_points`.
+
+        :param vertices: stroke vertices, shape (N, 3)
+        :param normals: normals corresponding to the vertices, shape (N, 3)
+        :exception ValueError: if the average normal is a zero vector
+        :return: the same tuple as the previous update if the hull did not change, otherwise a tuple of
+            (vertex coordinates, shape (V, 3), vertex count of the face, shape (1,),
+            vertex indices of the face in counter-clockwise order around the normal, shape (V,)).
+            None if the points are all collinear
+        """
+        vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+        normal = get_average_normal(normals)
+        if self.normal is None or normal @ self.normal < FLAT_NORMAL_TOLERANCE:
+            self.normal = normal
+            self.align_to_z = get_rotation_to_z(normal)
+
+        hull = self.hull.update(vertices, self.align_to_z)
+        if len(hull) < 3:
+            self.result = None
+            return None
+
+        heights = vertices @ self.normal
+        coords = np.column_stack((hull, np.full(len(hull), heights[np.argmax(heights * heights)]))) @ self.align_to_z
+        if self.result is None or not np.array_equal(coords, self.result[0]):
+            self.result = (coords, np.array((len(coords),), dtype=np.int32), np.arange(len(coords), dtype=np.int32))
+        return self.result
+
+
+def join_hulls(hulls) -> tuple:
+    """Joins hulls into the geometry of a single mesh, each hull becoming an island of it.
+
+    :param hulls: tuples of (vertex coordinates, shape (V, 3), vertex count of each face, shape (F,),
+        vertex indices of every face in order, shape (sum of face sizes,))
+    :return: tuple of the same form, with face vertex indices offset into the joined vertices
+    """
+    if len(hulls) == 0:
+        return np.empty((0, 3)), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+
+    vertex_starts = np.cumsum([0] + [len(vertices) for vertices, _, _ in hulls[:-1]])
+    return (
+        np.concatenate([vertices for vertices, _, _ in hulls]),
+        np.concatenate([face_sizes for _, face_sizes, _ in hulls]).astype(np.int32),
+        np.concatenate([face_vertices + start for (_, _, face_vertices), start in zip(hulls, vertex_starts)]
+                       ).astype(np.int32),
+    )
+
+
+def extract_faces(coords: np.ndarray, normals: np.ndarray, loop_starts: np.ndarray, loop_totals: np.ndarray,
+                  loop_vertices: np.ndarray, face_indices: np.ndarray, matrix_world: np.ndarray, offset: float):
+    """Copies some faces of a mesh into their own geometry, in world space and offset along vertex normals.
+
+    :param coords: mesh vertex coordinates, shape (V, 3)
+    :param normals: mesh vertex normals, shape (V, 3)
+    :param loop_starts: first loop of each mesh face, shape (F,)
+    :param loop_totals: loop count of each mesh face, shape (F,)
+    :param loop_vertices: vertex index of each mesh loop, shape (L,)
+    :param face_indices: indices of faces to copy, shape (K,)
+    :param matrix_world: object's (4, 4) world matrix
+    :param offset: distance faces are moved along their vertex normals, which keeps them connected
+    :return: tuple of (vertex coordinates, shape (V', 3), vertex count of each face, shape (K,),
+        vertex indices of every face in order, shape (sum of face sizes,)), with the faces' original winding
+    """
+    face_sizes = loop_totals[face_indices]
+    face_starts = np.cumsum(face_sizes) - face_sizes
+    loops = np.repeat(loop_starts[face_indices] - face_starts, face_sizes) + np.arange(face_sizes.sum())
+    used, face_vertices = np.unique(loop_vertices[loops], return_inverse=True)
+
+    matrix_world = np.asarray(matrix_world, dtype=np.float64)
+    vertices = coords[used] @ matrix_world[:3, :3].T + matrix_world[:3, 3]
+    if not isclose(offset, 0.0):
+        # normals transform by the inverse transpose, to stay perpendicular under non-uniform scale
+        world_normals = normals[used] @ np.linalg.inv(matrix_world[:3, :3])
+        lengths = np.linalg.norm(world_normals, axis=1)
+        world_normals = np.divide(world_normals, lengths[:, np.newaxis], out=np.zeros_like(world_normals),
+                                  where=lengths[:, np.newaxis] > 0.0)
+        vertices += world_normals * offset
+
+    return vertices, face_sizes.astype(np.int32), face_vertices.astype(np.int32).ravel()
+
+
+def get_pairs_within(vertices: np.ndarray, distance: float):
+    """Returns pairs of distinct vertices at most a distance apart, found by hashing them into a grid.
+
+    :param vertices: vertex coordinates, shape (N, 3)
+    :param distance: max distance between paired vertices, greater than 0
+    :return: tuple of first and second vertex indices, each pair found in both orders
+    """
+    cells = np.floor(vertices / distance).astype(np.int64)
+    keys = np.bitwise_xor.reduce(cells * CELL_HASH_PRIMES, axis=1)
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+
+    firsts, seconds = [], []
+    indices = np.arange(len(vertices))
+    for cell_offset in product((-1, 0, 1), repeat=3):
+        neighbor_keys = np.bitwise_xor.reduce((cells + cell_offset) * CELL_HASH_PRIMES, axis=1)
+        starts = np.searchsorted(sorted_keys, neighbor_keys, side='left')
+        counts = np.searchsorted(sorted_keys, neighbor_keys, side='right') - starts
+        first = np.repeat(indices, counts)
+        second = order[np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())]
+        is_near = (first != second) & (np.linalg.norm(vertices[first] - vertices[second], axis=1) <= distance)
+        firsts.append(first[is_near])
+        seconds.append(second[is_near])
+    return np.concatenate(firsts), np.concatenate(seconds)
+
+
+def merge_by_distance(vertices: np.ndarray, edges: np.ndarray, distance: float):
+    """Merges vertices closer than a distance and remaps edges to them, like Blender's Merge by Distance.
+
+    Vertices are visited by increasing coordinate sum, each one absorbing the unvisited vertices around it
+    and keeping its position, so merging does not chain along densely painted strokes.
+
+    :param vertices: vertex coordinates, shape (N, 3)
+    :param edges: pairs of vertex indices, shape (E, 2)
+    :param distance: max distance between merged vertices
+    :return: tuple of (merged vertices, shape (N', 3), edges without collapsed or repeated ones, shape (E', 2))
+    """
+    edges = np.asarray(edges, dtype=np.intp).reshape(-1, 2)
+    targets = np.arange(len(vertices))
+    if distance > 0.0 and len(vertices) > 1:
+        firsts, seconds = get_pairs_within(vertices, distance)
+        neighbor_order = np.argsort(firsts, kind='stable')
+        neighbors = seconds[neighbor_order]
+        neighbor_ends = np.searchsorted(firsts[neighbor_order], targets, side='right')
+        neighbor_starts = np.concatenate(([0], neighbor_ends[:-1]))
+
+        targets = np.full(len(vertices), -1)
+        for index in np.argsort(vertices.sum(axis=1), kind='stable').tolist():
+            if targets[index] >= 0:
+                continue
+            targets[index] = index
+            near = neighbors[neighbor_starts[index]:neighbor_ends[index]]
+            near = near[targets[near] < 0]
+            targets[near] = index
+
+    kept, new_indices = np.unique(targets, return_inverse=True)
+    edges = new_indices.ravel()[edges]
+    edges = np.sort(edges[edges[:, 0] != edges[:, 1]], axis=1)
+    return vertices[kept], np.unique(edges, axis=0) if len(edges) else edges
+
+
+def get_island_roots(vertex_count: int, edges: np.ndarray) -> np.ndarray:
+    """Returns the first vertex of each island of connected vertices, e.g. as skin modifier roots.
+
+    :param vertex_count: number of vertices
+    :param edges: pairs of vertex indices, shape (E, 2)
+    :return: whether each vertex is the lowest index of its island, shape (vertex_count,)
+    """
+    parents = list(range(vertex_count))
+
+    def find(index):
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    for first, second in np.asarray(edges).tolist():
+        first, second = find(first), find(second)
+        if first != second:
+            # the lower index stays the root, so it is the island's first vertex
+            parents[max(first, second)] = min(first, second)
+
+    return np.array([find(index) == index for index in range(vertex_count)], dtype=bool)
+
+
+def join_wires(wires) -> tuple:
+    """Joins wires into the geometry of a single mesh, like :func:`join_hulls` does for hulls.
+
+    :param wires: tuples of (vertex coordinates, shape (V, 3), pairs of vertex indices, shape (E, 2),
+        whether each vertex is a root, shape (V,))
+    :return: tuple of the same form, with edge vertex indices offset into the joined vertices
+    """
+    if len(wires) == 0:
+        return np.empty((0, 3)), np.empty((0, 2), dtype=np.intp), np.empty(0, dtype=bool)
+
+    vertex_starts = np.cumsum([0] + [len(vertices) for vertices, _, _ in wires[:-1]])
+    return (
+        np.concatenate([vertices for vertices, _, _ in wires]),
+        np.concatenate([edges + start for (_, edges, _), start in zip(wires, vertex_starts)]),
+        np.concatenate([roots for _, _, roots in wires]),
+    )
+
+
+def get_tube_edges(stroke_lengths) -> np.ndarray:
+    """Returns edges joining consecutive points of each stroke, with strokes concatenated in order.
+
+    :param stroke_lengths: number of points of each stroke
+    :return: pairs of point indices, shape (E, 2)
+    """
+    stroke_lengths = np.asarray(stroke_lengths, dtype=np.intp)
+    if len(stroke_lengths) == 0:
+        return np.empty((0, 2), dtype=np.intp)
+
+    starts = np.arange(stroke_lengths.sum())
+    # an edge starts at every point but the last of its stroke
+    is_last = np.zeros(len(starts), dtype=bool)
+    is_last[np.cumsum(stroke_lengths)[stroke_lengths > 0] - 1] = True
+    starts = starts[~is_last]
+    return np.column_stack((starts, starts + 1))
+
+
+def get_polygon_normals(vertices: np.ndarray, face_sizes: np.ndarray, face_vertices: np.ndarray):
+    """Returns the unit normals and areas of polygons, with Newell's method.
+
+    :param vertices: vertex coordinates, shape (V, 3)
+    :param face_sizes: vertex count of each face, shape (F,)
+    :param face_vertices: vertex indices of every face in order, shape (sum of face sizes,)
+    :return: tuple of (normals, shape (F, 3), areas, shape (F,))
+    """
+    face_starts = np.zeros(len(face_sizes), dtype=np.intp)
+    np.cumsum(face_sizes[:-1], out=face_starts[1:])
+    next_loops = np.arange(1, len(face_vertices) + 1)
+    next_loops[face_starts + face_sizes - 1] = face_starts  # last vertex of each face wraps to its first
+
+    crosses = np.cross(vertices[face_vertices], vertices[face_vertices[next_loops]])
+    normals = np.add.reduceat(crosses, face_starts)
+    lengths = np.linalg.norm(normals, axis=1)
+    normals = np.divide(normals, lengths[:, np.newaxis], out=np.zeros_like(normals),
+                        where=lengths[:, np.newaxis] > 0.0)
+    return normals, lengths / 2
+
+
+def get_escape_direction(normals: np.ndarray):
+    """Returns a direction in which the intersection of half-spaces with given outward normals is unbounded.
+
+    :param normals: unit normals of the half-spaces, shape (K, 3)
+    :return: direction facing none of the normals, shape (3,), or None if the half-spaces enclose a bounded shape
+    """
+    hull = IncrementalHull3D().update(normals) if len(normals) >= 4 else None
+    if hull is None:
+        # normals within a plane (or fewer): its own normal faces none of them
+        return np.linalg.svd(np.vstack((normals, np.zeros((3, 3)))))[2][-1]
+
+    vertices, _, face_vertices = hull
+    plane_normals, offsets = get_face_planes(vertices, face_vertices.reshape(-1, 3))
+    closest = np.argmin(offsets)
+    # bounded if the origin is strictly inside the hull of normals
+    return plane_normals[closest] if offsets[closest] <= HULL_TOLERANCE else None
+
+
+def simplify_hull(hull: tuple, max_faces: int) -> tuple:
+    """Reduces a convex hull to at most a number of faces, while still enclosing it.
+
+    The result is the intersection of a subset of the hull's own face planes (a discrete orientation polytope):
+    starting from the largest face, faces are picked by area and by how far their normals are from picked ones.
+    Faces needed to enclose the hull are picked first, which may exceed the budget for tiny budgets.
+
+    :param hull: tuple of (vertex coordinates, shape (V, 3), vertex count of each face, shape (F,),
+        vertex indices of every face in order, shape (sum of face sizes,))
+    :param max_faces: face budget, 0 keeps every face
+    :return: tuple of the same form, the hull itself if it is already within budget
+    """
+    vertices, face_sizes, face_vertices = hull
+    if max_faces <= 0 or len(face_sizes) <= max(max_faces, 4):
+        return hull
+
+    normals, areas = get_polygon_normals(vertices, face_sizes, face_vertices)
+    normals, areas = normals[areas > 0.0], areas[areas > 0.0]  # slivers have no plane to keep
+    picked = [int(np.argmax(areas))]
+    max_dots = normals @ normals[picked[0]]
+    escape = get_escape_direction(normals[picked])
+    while True:
+        if escape is not None:
+            # any face facing the escape direction closes the hull further
+            scores = normals @ escape
+        elif len(picked) < max_faces:
+            scores = areas * (1.0 - max_dots)
+        else:
+            break
+        scores[picked] = -np.inf
+        best = int(np.argmax(scores))
+        picked.append(best)
+        max_dots = np.maximum(max_dots, normals @ normals[best])
+        if escape is not None:  # more faces never unbound the shape, so only checks until bounded
+            escape = get_escape_direction(normals[picked])
+
+    return intersect_half_spaces(normals[picked], vertices)
+
+
+def intersect_half_spaces(normals: np.ndarray, points: np.ndarray) -> tuple:
+    """Returns the polytope bounded by planes with given normals, each touching the points.
+
+    Computed in the dual space: planes become points, whose hull faces are the polytope's vertices.
+
+    :param normals: unit outward normals of the planes, positively spanning every direction, shape (K, 3)
+    :param points: points to enclose, shape (N, 3)
+    :return: tuple of (vertex coordinates, shape (V, 3), vertex count of each face, shape (F,),
+        vertex indices of every face in order, shape (sum of face sizes,)), faces counter-clockwise
+    """
+    center = points.mean(axis=0)
+    offsets = np.max((points - center) @ normals.T, axis=0)
+    duals = normals / offsets[:, np.newaxis]
+
+    dual_hull = IncrementalHull3D().update(duals)
+    dual_vertices, _, dual_faces = dual_hull
+    dual_faces = dual_faces.reshape(-1, 3)
+    plane_normals, plane_offsets = get_face_planes(dual_vertices, dual_faces)
+    corners = plane_normals / plane_offsets[:, np.newaxis]
+
+    # coplanar dual triangles (more than three planes meeting) give the same corner
+    scale = max(float(np.abs(corners).max()), 1.0) * HULL_TOLERANCE * 1e3
+    _, first_corners, corner_ids = np.unique(np.round(corners / scale), axis=0, return_index=True,
+                                             return_inverse=True)
+    corner_ids = corner_ids.ravel()
+
+    face_sizes = []
+    face_vertices = []
+    for dual_index, dual_vertex in enumerate(dual_vertices):
+        ids = np.unique(corner_ids[np.any(dual_faces == dual_index, axis=1)])
+        if len(ids) < 3:
+            continue  # plane only touching an edge or a corner
+
+        normal = dual_vertex / np.linalg.norm(dual_vertex)
+        positions = corners[first_corners[ids]]
+        tangent = np.cross(normal, (1.0, 0.0, 0.0) if abs(normal[0]) < 0.9 else (0.0, 1.0, 0.0))
+        bitangent = np.cross(normal, tangent)
+        relative = positions - positions.mean(axis=0)
+        # counter-clockwise seen from outside, so face normals point outward
+        face_vertices.append(ids[np.argsort(np.arctan2(relative @ bitangent, relative @ tangent))])
+        face_sizes.append(len(ids))
+
+    return (corners[first_corners] + center, np.array(face_sizes, dtype=np.int32),
+            np.concatenate(face_vertices).astype(np.int32))
+
+
+def thin_path(points: np.ndarray, distance: float) -> np.ndarray:
+    """Drops path points closer than a distance to the previous point kept, always keeping both ends.
+
+    :param points: path points in order, shape (N, 3)
+    :param distance: min distance between kept points
+    :return: kept points, shape (N', 3)
+    """
+    if distance <= 0.0 or len(points) < 3:
+        return points
+
+    coords = points.tolist()
+    kept = [0]
+    for index in range(1, len(coords) - 1):
+        if dist(coords[index], coords[kept[-1]]) >= distance:
+            kept.append(index)
+    if len(kept) > 1 and dist(coords[-1], coords[kept[-1]]) < distance:
+        kept.pop()  # the last point replaces a kept point too close to it
+    kept.append(len(coords) - 1)
+    return points[kept]
+
+
+def smooth_path(points: np.ndarray, iterations: int) -> np.ndarray:
+    """Smooths a path by cutting its corners (Chaikin's algorithm), keeping both ends in place.
+
+    :param points: path points in order, shape (N, 3)
+    :param iterations: number of times corners are cut, each nearly doubling the number of points
+    :return: smoothed points, shape (N', 3)
+    """
+    for _ in range(iterations):
+        if len(points) < 3:
+            break
+        quarters = points[:-1] * 0.75 + points[1:] * 0.25
+        three_quarters = points[:-1] * 0.25 + points[1:] * 0.75
+        cut = np.column_stack((quarters, three_quarters)).reshape(-1, 3)
+        points = np.vstack((points[:1], cut[1:-1], points[-1:]))
+    return points
+
+
+def get_path_frames(points: np.ndarray):
+    """Returns rotation-minimizing frames along a path, by parallel transport (the double reflection method).
+
+    :param points: path points in order, at least two and none repeated, shape (N, 3)
+    :return: tuple of unit (tangents, normals), each of shape (N, 3), normals perpendicular to tangents
+    """
+    tangents = np.gradient(points, axis=0)
+    tangents /= np.linalg.norm(tangents, axis=1)[:, np.newaxis]
+
+    # any start perpendicular to the first tangent, the least aligned world axis avoids degenerate ones
+    axis = np.eye(3)[np.argmin(np.abs(tangents[0]))]
+    normal = np.cross(tangents[0], axis)
+    normal /= np.linalg.norm(normal)
+
+    def get_reflections(mirrors):
+        mirrors_sq = np.einsum('ij,ij->i', mirrors, mirrors)
+        scales = np.divide(2.0, mirrors_sq, out=np.zeros_like(mirrors_sq), where=mirrors_sq > 0.0)
+        return np.eye(3) - scales[:, np.newaxis, np.newaxis] * mirrors[:, :, np.newaxis] * mirrors[:, np.newaxis]
+
+    # reflect along each segment, then along the tangents' difference to align with the next tangent
+    segment_reflections = get_reflections(np.diff(points, axis=0))
+    reflected_tangents = np.einsum('ijk,ik->ij', segment_reflections, tangents[:-1])
+    rotations = get_reflections(tangents[1:] - reflected_tangents) @ segment_reflections
+
+    # frames depend on all previous rotations: prefix products, in log2(N) steps rather than a loop over points
+    shift = 1
+    while shift < len(rotations):
+        rotations[shift:] = rotations[shift:] @ rotations[:-shift]
+        shift *= 2
+
+    normals = np.vstack((normal, rotations @ normal))
+    normals /= np.linalg.norm(normals, axis=1)[:, np.newaxis]
+    return tangents, normals
+
+
+def sweep_circle(points: np.ndarray, radius: float, sides: int) -> tuple:
+    """Sweeps a circle along a path into a closed tube, capped at both ends.
+
+    :param points: path points in order, at least two and none repeated, shape (N, 3)
+    :param radius: tube radius
+    :param sides: number of sides of the tube's cross-section, at least 3
+    :return: tuple of (vertex coordinates, shape (N * sides, 3), vertex count of each face,
+        vertex indices of every face in order), side quads first, then the start and end caps
+    """
+    tangents, normals = get_path_frames(points)
+    binormals = np.cross(tangents, normals)
+    angles = np.linspace(0.0, 2.0 * np.pi, sides, endpoint=False)
+    # rings turn counter-clockwise around the tangent, so side faces wind outward
+    offsets = (np.cos(angles)[np.newaxis, :, np.newaxis] * normals[:, np.newaxis]
+               + np.sin(angles)[np.newaxis, :, np.newaxis] * binormals[:, np.newaxis])
+    vertices = (points[:, np.newaxis] + offsets * radius).reshape(-1, 3)
+
+    rings = np.arange(len(points) - 1)[:, np.newaxis] * sides
+    sides_start = np.arange(sides)[np.newaxis]
+    sides_end = (sides_start + 1) % sides
+    quads = np.stack((rings + sides_start, rings + sides_end, rings + sides + sides_end, rings + sides + sides_start),
+                     axis=-1).reshape(-1)
+    start_cap = np.arange(sides)[::-1]  # facing backwards
+    end_cap = np.arange(sides) + (len(points) - 1) * sides
+
+    face_sizes = np.concatenate((np.full(len(quads) // 4, 4), (sides, sides))).astype(np.int32)
+    return vertices, face_sizes, np.concatenate((quads, start_cap, end_cap)).astype(np.int32)
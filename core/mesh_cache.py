@@ -0,0 +1,175 @@
+import hashlib
+import os
+import shutil
+import time
+
+import numpy as np
+
+from .bvh import BVH, build_triangle_bvh
+
+CACHE_VERSION = 3
+"""Bumped whenever cached arrays, mesh keys or the BVH build change, so stale entries are never reused."""
+DEFAULT_MAX_BYTES = 1 << 30
+"""Size of the cache before the least recently used meshes are evicted."""
+TRIANGLES_NAME = 'triangles'
+"""Name of the cached triangle soup of a mesh, next to its BVH arrays."""
+IN_USE_SECONDS = 60.0
+"""Entries used this recently are never evicted, as this or another session may still map their files."""
+
+
+def get_key_digest(key: tuple) -> str:
+    """Returns a digest of a mesh key, used as the name of its cache entry.
+
+    :param key: strings and numbers identifying a mesh's geometry across sessions (e.g. its file, time and name)
+    :return: hexadecimal digest
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((CACHE_VERSION,) + tuple(key)).encode())
+    return digest.hexdigest()
+
+
+def get_entry_size(path: str) -> int:
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+class MeshCache:
+    """Directory of occluder meshes, one subdirectory of ``.npy`` files per mesh key digest.
+
+    Each entry holds a mesh's triangle soup, stored when the mesh is exported,
+    and its BVH, stored once rays are first cast against it.
+    Entries are memory-mapped when loaded, so reusing a heavy mesh only reads the pages rays actually visit.
+    When the cache grows past its maximum size, the least recently used entries are deleted.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        :param directory: cache directory, created on first store
+        :param max_bytes: maximum total size of cached files
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def get_entry_path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest)
+
+    def load_arrays(self, digest: str, names) -> dict:
+        """Memory-maps cached arrays of a mesh.
+
+        :param digest: mesh key digest, see :func:`get_key_digest`
+        :param names: names of the arrays to load
+        :return: dictionary of array names to read-only memory-mapped arrays, or None if any is not cached
+        """
+        path = self.get_entry_path(digest)
+        try:
+            arrays = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r') for name in names}
+            os.utime(path)  # mark as recently used
+        except (OSError, ValueError):
+            return None
+
+        return arrays
+
+    def load_triangles(self, digest: str):
+        """Memory-maps the cached triangle soup of a mesh, shape (T, 3, 3), None if not cached."""
+        arrays = self.load_arrays(digest, (TRIANGLES_NAME,))
+        return None if arrays is None else arrays[TRIANGLES_NAME]
+
+    def load_bvh(self, digest: str):
+        """Memory-maps the cached BVH of a mesh, None if not cached."""
+        arrays = self.load_arrays(digest, BVH.ARRAY_NAMES)
+        return None if arrays is None else BVH.from_arrays(arrays)
+
+    def store(self, digest: str, arrays: dict):
+        """Adds arrays to a mesh's entry, then evicts old entries if the cache is too large.
+
+        Each file is written under a temporary name first and renamed into place,
+        so other sessions never load a partially written array.
+
+        :param digest: mesh key digest, see :func:`get_key_digest`
+        :param arrays: dictionary of array names to arrays
+        """
+        if self.max_bytes <= 0:
+            return
+
+        path = self.get_entry_path(digest)
+        try:
+            os.makedirs(path, exist_ok=True)
+            for name, array in arrays.items():
+                file_path = os.path.join(path, name + '.npy')
+                temp_path = '{}.{}.tmp'.format(file_path, os.getpid())
+                with open(temp_path, 'wb') as f:
+                    np.save(f, np.ascontiguousarray(array))
+                os.replace(temp_path, file_path)
+        except OSError:
+            # e.g. the disk is full, the entry is then incomplete and never loaded
+            return
+
+        self.evict()
+
+    def get_triangles(self, digest: str, export):
+        """Returns the cached triangle soup of a mesh, exporting and storing it first if missing.
+
+        :param digest: mesh key digest, see :func:`get_key_digest`
+        :param export: function returning the mesh's triangles, shape (T, 3, 3), only called if not cached
+        :return: triangles, memory-mapped if cached
+        """
+        triangles = self.load_triangles(digest)
+        if triangles is not None:
+            return triangles
+
+        triangles = export()
+        self.store(digest, {TRIANGLES_NAME: triangles})
+        return triangles
+
+    def get_bvh(self, digest: str, triangles: np.ndarray) -> BVH:
+        """Returns the cached BVH of a mesh, building and storing it first if missing.
+
+        :param digest: mesh key digest, see :func:`get_key_digest`
+        :param triangles: triangle soup, shape (T, 3, 3)
+        :return: BVH of the triangles, memory-mapped if cached
+        """
+        bvh = self.load_bvh(digest)
+        if bvh is not None:
+            return bvh
+
+        bvh = build_triangle_bvh(triangles)
+        self.store(digest, bvh.to_arrays())
+        return bvh
+
+    def get_entries(self) -> list:
+        """Returns (last use time, size, path) of each cached mesh."""
+        if not os.path.isdir(self.directory):
+            return []
+
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_dir():
+                try:
+                    entries.append((entry.stat().st_mtime, get_entry_size(entry.path), entry.path))
+                except OSError:
+                    continue  # evicted by another session in the meantime
+        return entries
+
+    def get_size(self) -> int:
+        """Returns the total size of cached meshes in bytes."""
+        return sum(size for _, size, _ in self.get_entries())
+
+    def evict(self):
+        """Deletes the least recently used meshes until the cache fits its maximum size, sparing ones in use."""
+        entries = sorted(self.get_entries())
+        total = sum(size for _, size, _ in entries)
+        in_use = time.time() - IN_USE_SECONDS
+        for last_use, size, path in entries:
+            if total <= self.max_bytes or last_use >= in_use:
+                break
+            # memory-mapped files stay readable on POSIX, and fail to delete on Windows until unmapped
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        """Deletes every cached mesh."""
+        if not os.path.isdir(self.directory):
+            return
+
+        for entry in os.scandir(self.directory):
+            if entry.is_dir():
+                shutil.rmtree(entry.path, ignore_errors=True)
@@ -0,0 +1,200 @@
+import numpy as np
+
+from .bvh import BVH, build_triangle_bvh, slab_distances, triangles_any_hit
+
+RAY_OFFSET = 0.01
+"""Offset of ray origins along their direction, to prevent self-collisions (matches lamp_util.EPSILON)."""
+
+
+class Occluders:
+    """Scene geometry that can block sun rays, as meshes in local space and their world space instances.
+
+    Each mesh gets its own BVH, and a top-level BVH over instance bounds
+    finds which instances a ray has to be tested against.
+    """
+
+    def __init__(self, meshes: list, instance_meshes: np.ndarray, instance_matrices: np.ndarray,
+                 mesh_bvhs: list = None, mesh_cache=None, mesh_digests: list = None):
+        """
+        :param meshes: list of triangle arrays in local space, each of shape (T, 3, 3)
+        :param instance_meshes: index of the mesh used by each instance, shape (K,)
+        :param instance_matrices: world matrix of each instance, shape (K, 4, 4)
+        :param mesh_bvhs: prebuilt BVH of each mesh, None entries are built when needed
+        :param mesh_cache: cache to load BVHs from or store them to when needed,
+            see :class:`core.mesh_cache.MeshCache`, if None then BVHs are only built
+        :param mesh_digests: cache entry of each mesh, see :func:`core.mesh_cache.get_key_digest`,
+            None entries are only built
+        """
+        self.meshes = meshes
+        self.instance_meshes = np.asarray(instance_meshes, dtype=np.int32)
+        self.instance_matrices = np.asarray(instance_matrices, dtype=np.float64).reshape(-1, 4, 4)
+        self.instance_inverses = np.linalg.inv(self.instance_matrices) if len(self.instance_matrices) else (
+            np.empty((0, 4, 4)))
+
+        self.mesh_bvhs = list(mesh_bvhs) if mesh_bvhs is not None else [None] * len(meshes)
+        self.mesh_cache = mesh_cache
+        self.mesh_digests = list(mesh_digests) if mesh_digests is not None else [None] * len(meshes)
+        self.instance_bvh = None
+        self.world_triangles = None
+        self.instance_min, self.instance_max = self.get_instance_bounds()
+
+    def get_instance_bounds(self):
+        """Returns world space bounds of each instance, by transforming the corners of its local bounds."""
+        local_min = np.array([mesh.min(axis=(0, 1)) if len(mesh) else np.zeros(3) for mesh in self.meshes])
+        local_max = np.array([mesh.max(axis=(0, 1)) if len(mesh) else np.zeros(3) for mesh in self.meshes])
+        if len(self.instance_meshes) == 0:
+            return np.empty((0, 3)), np.empty((0, 3))
+
+        corner_mask = np.array([[(i >> axis) & 1 for axis in range(3)] for i in range(8)], dtype=bool)
+        box_min, box_max = local_min[self.instance_meshes], local_max[self.instance_meshes]
+        corners = np.where(corner_mask[np.newaxis], box_max[:, np.newaxis], box_min[:, np.newaxis])
+
+        rotation, translation = self.instance_matrices[:, :3, :3], self.instance_matrices[:, :3, 3]
+        world_corners = np.einsum('kij,kcj->kci', rotation, corners) + translation[:, np.newaxis]
+        return world_corners.min(axis=1), world_corners.max(axis=1)
+
+    def get_mesh_bvh(self, mesh_index: int) -> BVH:
+        """Returns the BVH of a mesh, loading it from the mesh cache (or building it) on first use."""
+        if self.mesh_bvhs[mesh_index] is None:
+            digest = self.mesh_digests[mesh_index]
+            if self.mesh_cache is not None and digest is not None:
+                self.mesh_bvhs[mesh_index] = self.mesh_cache.get_bvh(digest, self.meshes[mesh_index])
+            else:
+                self.mesh_bvhs[mesh_index] = build_triangle_bvh(self.meshes[mesh_index])
+        return self.mesh_bvhs[mesh_index]
+
+    def load_mesh_bvhs(self):
+        """Loads or builds the BVH of every mesh (e.g. before sharing them with worker processes)."""
+        for mesh_index in range(len(self.meshes)):
+            self.get_mesh_bvh(mesh_index)
+
+    def get_world_triangles(self) -> np.ndarray:
+        """Returns the triangles of every instance in world space, shape (T, 3, 3)."""
+        if self.world_triangles is None:
+            self.world_triangles = np.concatenate([
+                self.meshes[mesh_index] @ matrix[:3, :3].T + matrix[:3, 3]
+                for mesh_index, matrix in zip(self.instance_meshes, self.instance_matrices)
+            ] or [np.empty((0, 3, 3))])
+        return self.world_triangles
+
+    def any_hit(self, origins: np.ndarray, directions: np.ndarray, max_distance: np.ndarray) -> np.ndarray:
+        """Returns which world space rays hit any occluder.
+
+        :param origins: ray origins, shape (R, 3)
+        :param directions: ray directions, shape (R, 3)
+        :param max_distance: ray lengths in units of their direction, shape (R,)
+        :return: boolean array of shape (R,)
+        """
+        hit = np.zeros(len(origins), dtype=bool)
+        if len(self.instance_meshes) == 0:
+            return hit
+
+        if self.instance_bvh is None:
+            self.instance_bvh = BVH.build(self.instance_min, self.instance_max, leaf_size=1)
+
+        for instances, rays in self.instance_bvh.traverse(origins, directions, max_distance, hit):
+            for instance in instances:
+                rays = rays[~hit[rays]]
+                mesh_index = self.instance_meshes[instance]
+                inverse = self.instance_inverses[instance]
+
+                # affine transforms keep the ray parameter, so max distance carries over to local space
+                local_origins = origins[rays] @ inverse[:3, :3].T + inverse[:3, 3]
+                local_directions = directions[rays] @ inverse[:3, :3].T
+                hits = triangles_any_hit(self.get_mesh_bvh(mesh_index), self.meshes[mesh_index],
+                                         local_origins, local_directions, max_distance[rays])
+                hit[rays[hits]] = True
+
+        return hit
+
+    def is_blocked(self, points: np.ndarray, directions: np.ndarray, offset: float = RAY_OFFSET) -> np.ndarray:
+        """Checks if given points are occluded in given directions.
+
+        :param points: points in world space, shape (N, 3)
+        :param directions: normalized directions in world space, shape (D, 3)
+        :param offset: offset of ray origins along their direction, to prevent self-collisions
+        :return: (N, D) boolean array, True if anything is in that direction from that point
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)
+
+        ray_origins = np.broadcast_to(points[:, np.newaxis], (len(points), len(directions), 3)).reshape(-1, 3)
+        ray_directions = np.broadcast_to(directions, (len(points), len(directions), 3)).reshape(-1, 3)
+
+        return self.rays_blocked(ray_origins, ray_directions, offset).reshape(len(points), len(directions))
+
+    def rays_blocked(self, points: np.ndarray, directions: np.ndarray, offset: float = RAY_OFFSET) -> np.ndarray:
+        """Checks if each point is occluded in its own direction.
+
+        :param points: points in world space, shape (R, 3)
+        :param directions: normalized directions in world space, one per point, shape (R, 3)
+        :param offset: offset of ray origins along their direction, to prevent self-collisions
+        :return: boolean array of shape (R,), True if anything is in that direction from that point
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        directions = np.ascontiguousarray(directions, dtype=np.float64).reshape(-1, 3)
+
+        ray_origins = points + directions * offset
+        max_distance = np.full(len(ray_origins), np.inf)
+
+        return self.any_hit(ray_origins, directions, max_distance)
+
+    def to_arrays(self) -> dict:
+        """Flattens occluders into named arrays (e.g. for shared memory), including BVHs built so far."""
+        arrays = {'mesh_{}'.format(idx): mesh for idx, mesh in enumerate(self.meshes)}
+        for idx, bvh in enumerate(self.mesh_bvhs):
+            if bvh is not None:
+                arrays.update(('bvh_{}_{}'.format(idx, name), array) for name, array in bvh.to_arrays().items())
+        arrays['instance_meshes'] = self.instance_meshes
+        arrays['instance_matrices'] = self.instance_matrices
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: dict) -> 'Occluders':
+        mesh_count = sum(1 for name in arrays if name.startswith('mesh_'))
+        meshes = [arrays['mesh_{}'.format(idx)] for idx in range(mesh_count)]
+        mesh_bvhs = [
+            BVH.from_arrays({name: arrays['bvh_{}_{}'.format(idx, name)] for name in BVH.ARRAY_NAMES})
+            if 'bvh_{}_order'.format(idx) in arrays else None
+            for idx in range(mesh_count)
+        ]
+        return cls(meshes, arrays['instance_meshes'], arrays['instance_matrices'], mesh_bvhs)
+
+
+class OccluderBounds:
+    """World space bounds of each occluder, to skip or shorten rays before casting them against the scene."""
+
+    def __init__(self, bounds_min: np.ndarray, bounds_max: np.ndarray):
+        """
+        :param bounds_min: minimum corner of each occluder, shape (K, 3)
+        :param bounds_max: maximum corner of each occluder, shape (K, 3)
+        """
+        self.bounds_min = np.asarray(bounds_min, dtype=np.float64).reshape(-1, 3)
+        self.bounds_max = np.asarray(bounds_max, dtype=np.float64).reshape(-1, 3)
+        self.bvh = BVH.build(self.bounds_min, self.bounds_max, leaf_size=1) if len(self.bounds_min) else None
+
+    def get_ray_lengths(self, origins: np.ndarray, directions: np.ndarray) -> np.ndarray:
+        """Returns how far each ray has to travel to leave the bounds of every occluder it enters.
+
+        :param origins: ray origins, shape (R, 3)
+        :param directions: normalized ray directions, shape (R, 3)
+        :return: ray lengths, shape (R,). 0 for rays that enter no occluder bounds, so can never be blocked
+        """
+        origins = np.asarray(origins, dtype=np.float64).reshape(-1, 3)
+        directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)
+        lengths = np.zeros(len(origins))
+        if self.bvh is None:
+            return lengths
+
+        with np.errstate(divide='ignore'):
+            inv_directions = 1.0 / directions
+
+        never_done = np.zeros(len(origins), dtype=bool)
+        max_distance = np.full(len(origins), np.inf)
+        for primitives, rays in self.bvh.traverse(origins, directions, max_distance, never_done):
+            _, t_exit = slab_distances(self.bounds_min[primitives], self.bounds_max[primitives],
+                                       origins[rays], inv_directions[rays])
+            lengths[rays] = np.maximum(lengths[rays], t_exit)
+
+        # slightly past the bounds, so surfaces lying on them are still hit
+        return np.where(lengths > 0.0, lengths + RAY_OFFSET, 0.0)
@@ -0,0 +1,290 @@
+import importlib
+import mmap
+import multiprocessing
+from multiprocessing import shared_memory
+import os
+import runpy
+import time
+
+import numpy as np
+
+from .occluders import Occluders
+
+BOOTSTRAP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'worker_bootstrap.py')
+WORKER_MODULE_NAME = 'lightpainter_core.occlusion_pool'
+"""Name this module is imported by in workers, see worker_bootstrap.py."""
+ALIGNMENT = 64
+"""Byte alignment of each array packed into shared memory."""
+MIN_POOL_RAYS = 2000
+"""Calls casting fewer rays run in this process, as handing them to workers costs more than splitting them saves.
+tests/bench_occlusion_pool.py measured 1-2 ms per call against about 20 us per ray in-process,
+so two workers would break even around 200 rays, ten times less than this."""
+RATE_SMOOTHING = 0.5
+"""Weight of the latest call when averaging the time per ray in this process and in workers."""
+
+_POOL = None
+"""Warm pool kept across tool invocations, until the add-on is unregistered."""
+
+_WORKER_STATE = {'name': None, 'memory': None, 'occluders': None}
+"""Occluders a worker process has attached to, rebuilt only when a new scene is published."""
+
+
+def get_mapped_file(array: np.ndarray):
+    """Returns the file an array is memory-mapped from (e.g. loaded from the mesh cache), None if it is not.
+
+    :return: tuple of (file path, offset in bytes), or None
+    """
+    if (isinstance(array, np.memmap) and isinstance(array.base, mmap.mmap) and array.filename is not None and
+            array.flags.c_contiguous):
+        return array.filename, array.offset
+    return None
+
+
+def pack_arrays(arrays: dict):
+    """Copies named arrays into a new block of shared memory, except memory-mapped ones, which workers map too.
+
+    :param arrays: dictionary of array names to NumPy arrays
+    :return: tuple of (shared memory, layout of array names to (file path or None, offset, shape, dtype))
+    """
+    layout = dict()
+    packed = dict()
+    size = 0
+    for name, array in arrays.items():
+        mapped_file = get_mapped_file(array)
+        if mapped_file is not None:
+            layout[name] = mapped_file + (array.shape, array.dtype.str)
+            continue
+
+        size = -(-size // ALIGNMENT) * ALIGNMENT
+        layout[name] = (None, size, array.shape, array.dtype.str)
+        packed[name] = array
+        size += array.nbytes
+
+    memory = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    for name, array in packed.items():
+        np.ndarray(array.shape, dtype=array.dtype, buffer=memory.buf, offset=layout[name][1])[...] = array
+
+    return memory, layout
+
+
+def unpack_arrays(memory: shared_memory.SharedMemory, layout: dict) -> dict:
+    """Returns NumPy views of arrays packed into shared memory, or mapped from their files."""
+    return {
+        name: np.ndarray(shape, dtype=dtype, buffer=memory.buf, offset=offset) if path is None else
+        np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape)
+        for name, (path, offset, shape, dtype) in layout.items()
+    }
+
+
+def release_worker_memory():
+    state = _WORKER_STATE
+    memory = state['memory']
+    state.update(name=None, memory=None, occluders=None)
+    if memory is not None:
+        memory.close()
+
+
+def get_worker_occluders(memory_name: str, layout: dict) -> Occluders:
+    """Returns the published occluders in a worker, attaching to them if they are new."""
+    state = _WORKER_STATE
+    if state['name'] != memory_name:
+        release_worker_memory()
+        memory = shared_memory.SharedMemory(name=memory_name)
+        state.update(name=memory_name, memory=memory,
+                     occluders=Occluders.from_arrays(unpack_arrays(memory, layout)))
+
+    return state['occluders']
+
+
+def trace_shard(memory_name: str, layout: dict, points: np.ndarray, directions: np.ndarray) -> np.ndarray:
+    """Worker task: checks if points are occluded in a subset of directions.
+
+    :param memory_name: name of the shared memory holding the published occluders
+    :param layout: layout of the occluder arrays in shared memory
+    :param points: points in world space, shape (N, 3)
+    :param directions: normalized directions in world space, shape (D, 3)
+    :return: (N, D) boolean array, True if blocked
+    """
+    return get_worker_occluders(memory_name, layout).is_blocked(points, directions)
+
+
+def trace_rays_shard(memory_name: str, layout: dict, points: np.ndarray, directions: np.ndarray) -> np.ndarray:
+    """Worker task: checks if a subset of points are occluded, each in its own direction.
+
+    :return: boolean array of shape (R,), True if blocked
+    """
+    return get_worker_occluders(memory_name, layout).rays_blocked(points, directions)
+
+
+def get_cpu_count() -> int:
+    """Returns the number of CPUs this process may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on Windows and macOS
+        return os.cpu_count() or 1
+
+
+def get_worker_module():
+    """Returns this module as imported by workers, so its functions pickle by that name."""
+    runpy.run_path(BOOTSTRAP_PATH)
+    return importlib.import_module(WORKER_MODULE_NAME)
+
+
+class OcclusionPool:
+    """Process pool that shards occlusion tests by direction over occluders in shared memory.
+
+    Workers only pay off when they run in parallel on large enough calls, so each call runs in this process instead
+    if only one CPU is available, if it casts fewer than :data:`MIN_POOL_RAYS` rays, or if workers have been measured
+    to take longer per ray than this process.
+    """
+
+    def __init__(self, processes: int):
+        self.processes = processes
+        self.pool = None
+        self.memory = None
+        self.layout = None
+        self.published = None
+        self.worker_module = None
+        self.ray_times = {False: None, True: None}
+        """Average seconds per ray in this process and in workers (keyed by True), None until measured."""
+        self.is_parallel = min(processes, get_cpu_count()) > 1
+
+    def start(self):
+        """Starts worker processes, if not already running."""
+        if self.pool is None:
+            self.worker_module = get_worker_module()
+            context = multiprocessing.get_context('spawn')
+            self.pool = context.Pool(self.processes, initializer=runpy.run_path, initargs=(BOOTSTRAP_PATH,))
+
+    def publish(self, occluders: Occluders):
+        """Exports occluders to shared memory once, for all workers to attach to.
+
+        Mesh BVHs already built (or loaded from the mesh cache) are shared too, so workers do not rebuild them.
+        Arrays memory-mapped from the mesh cache are not copied: workers map the same files.
+
+        :param occluders: scene occluders, skipped if they are already published
+        """
+        if occluders is self.published:
+            return
+
+        memory, self.layout = pack_arrays(occluders.to_arrays())
+        self.release_memory()
+        self.memory = memory
+        self.published = occluders
+
+    def release_memory(self):
+        if self.memory is not None:
+            self.memory.close()
+            self.memory.unlink()
+        self.memory = None
+        self.published = None
+
+    def use_workers(self, ray_count: int) -> bool:
+        """Checks if a call is expected to finish sooner in workers than in this process."""
+        if not self.is_parallel or ray_count < MIN_POOL_RAYS:
+            return False
+
+        local_time, worker_time = self.ray_times[False], self.ray_times[True]
+        # measure workers first, then this process on the next large call, then keep the faster one
+        return worker_time is None or (local_time is not None and worker_time < local_time)
+
+    def run_timed(self, ray_count: int, run_local, run_workers):
+        """Runs a call in this process or in workers, whichever is faster, and updates the time per ray it took.
+
+        :param ray_count: rays cast by the call
+        :param run_local: function running the call in this process
+        :param run_workers: function running the call in workers
+        :return: result of the call
+        """
+        in_workers = self.use_workers(ray_count)
+        start_time = time.perf_counter()
+        result = run_workers() if in_workers else run_local()
+        ray_time = (time.perf_counter() - start_time) / ray_count
+
+        # only large calls are compared, small ones are dominated by fixed costs
+        if ray_count >= MIN_POOL_RAYS:
+            previous = self.ray_times[in_workers]
+            self.ray_times[in_workers] = ray_time if previous is None else (
+                    previous + (ray_time - previous) * RATE_SMOOTHING)
+        return result
+
+    def is_blocked(self, points: np.ndarray, directions: np.ndarray) -> np.ndarray:
+        """Checks if points are occluded in given directions, split across workers by direction
+        if that is faster, see :class:`OcclusionPool`.
+
+        :param points: points in world space, shape (N, 3)
+        :param directions: normalized directions in world space, shape (D, 3)
+        :return: (N, D) boolean array, True if blocked
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)
+        if len(points) == 0 or len(directions) == 0:
+            return np.zeros((len(points), len(directions)), dtype=bool)
+
+        return self.run_timed(len(points) * len(directions), lambda: self.published.is_blocked(points, directions),
+                              lambda: self.map_is_blocked(points, directions))
+
+    def map_is_blocked(self, points: np.ndarray, directions: np.ndarray) -> np.ndarray:
+        """Checks if points are occluded in given directions in workers, see :meth:`is_blocked`."""
+        self.start()
+        shards = [shard for shard in np.array_split(np.arange(len(directions)), self.processes) if len(shard)]
+        results = self.pool.starmap(
+            self.worker_module.trace_shard,
+            [(self.memory.name, self.layout, points, directions[shard]) for shard in shards]
+        )
+        return np.hstack(results)
+
+    def rays_blocked(self, points: np.ndarray, directions: np.ndarray) -> np.ndarray:
+        """Checks if each point is occluded in its own direction, split across workers by ray
+        if that is faster, see :class:`OcclusionPool`.
+
+        :param points: points in world space, shape (R, 3)
+        :param directions: normalized directions in world space, one per point, shape (R, 3)
+        :return: boolean array of shape (R,), True if blocked
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)
+        if len(points) == 0:
+            return np.zeros(0, dtype=bool)
+
+        return self.run_timed(len(points), lambda: self.published.rays_blocked(points, directions),
+                              lambda: self.map_rays_blocked(points, directions))
+
+    def map_rays_blocked(self, points: np.ndarray, directions: np.ndarray) -> np.ndarray:
+        """Checks if each point is occluded in its own direction in workers, see :meth:`rays_blocked`."""
+        self.start()
+        shards = [shard for shard in np.array_split(np.arange(len(points)), self.processes) if len(shard)]
+        results = self.pool.starmap(
+            self.worker_module.trace_rays_shard,
+            [(self.memory.name, self.layout, points[shard], directions[shard]) for shard in shards]
+        )
+        return np.concatenate(results)
+
+    def shutdown(self):
+        """Stops worker processes and frees shared memory."""
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+        self.release_memory()
+
+
+def get_pool(processes: int) -> OcclusionPool:
+    """Returns the warm occlusion pool, restarting it if the number of processes changed.
+
+    Worker processes are only started once occlusion is first tested.
+    """
+    global _POOL
+    if _POOL is not None and _POOL.processes != processes:
+        shutdown_pool()
+    if _POOL is None:
+        _POOL = OcclusionPool(processes)
+    return _POOL
+
+
+def shutdown_pool():
+    """Stops the occlusion pool (e.g. when unregistering the add-on)."""
+    global _POOL
+    if _POOL is not None:
+        _POOL.shutdown()
+        _POOL = None
@@ -0,0 +1,195 @@
+import numpy as np
+
+from .cone import min_enclosing_cone
+from .ellipse import fit_circle, fit_ellipse
+from .hull import convex_hull_2d, IncrementalHull, min_area_rect
+
+NORMAL_ERROR = 'Average of normals results in a zero vector - unable to calculate average direction!'
+SPOT_ERROR = 'Spot lamp is inside the painted surface - unable to calculate its cone angle!'
+
+SHAPE_FITS = {'ELLIPSE': fit_ellipse, 'DISK': fit_circle}
+"""Fitting of area lamp shapes other than rectangles, see :func:`get_area_lamp_box`."""
+FAST_FIT_POINTS = 20000
+"""Strokes with at least this many points fit rectangles by PCA while painting, see :func:`fit_pca_rect`."""
+PCA_SAMPLES = 4096
+"""Number of points the orientation of PCA rectangles is estimated from."""
+
+
+def get_average_normal(normals: np.ndarray) -> np.ndarray:
+    """Calculates average normal. Handles zero vector edge case as an error.
+
+    :param normals: normal vectors, shape (N, 3)
+    :return: normalized average, shape (3,)
+    """
+    total = np.asarray(normals, dtype=np.float64).reshape(-1, 3).sum(axis=0)
+    length = np.linalg.norm(total)
+    if length == 0.0:
+        raise ValueError(NORMAL_ERROR)
+    return total / length
+
+
+def get_rotation_to_z(normal: np.ndarray) -> np.ndarray:
+    """Returns the shortest rotation from a normal to +Z, as a (3, 3) matrix.
+
+    Like ``normal.rotation_difference(Vector((0, 0, 1))).to_matrix()`` from mathutils.
+    """
+    axis = np.cross(normal, (0.0, 0.0, 1.0))
+    sin_angle = np.linalg.norm(axis)
+    cos_angle = normal[2]
+    if sin_angle < 1e-12:
+        # already aligned, or opposite: turn halfway around X
+        return np.eye(3) if cos_angle > 0.0 else np.diag((1.0, -1.0, -1.0))
+
+    axis /= sin_angle
+    cross = np.array(((0.0, -axis[2], axis[1]), (axis[2], 0.0, -axis[0]), (-axis[1], axis[0], 0.0)))
+    return np.eye(3) + sin_angle * cross + (1.0 - cos_angle) * (cross @ cross)
+
+
+def get_rotation_z(angle: float) -> np.ndarray:
+    """Returns a (3, 3) rotation matrix around Z, like ``Matrix.Rotation(angle, 3, 'Z')``."""
+    cos_angle, sin_angle = np.cos(angle), np.sin(angle)
+    return np.array(((cos_angle, -sin_angle, 0.0), (sin_angle, cos_angle, 0.0), (0.0, 0.0, 1.0)))
+
+
+def project_to_farthest_plane(vertices: np.ndarray, normal: np.ndarray) -> np.ndarray:
+    """Flattens vertices onto the plane along the normal through the vertex farthest along it.
+
+    :param vertices: vertex coordinates, shape (N, 3)
+    :param normal: normalized plane normal, shape (3,)
+    :return: projected vertices, shape (N, 3)
+    """
+    heights = vertices @ normal
+    farthest_height = heights[np.argmax(heights * heights)]
+    return vertices + np.outer(farthest_height - heights, normal)
+
+
+def fit_pca_rect(points: np.ndarray, samples: int = PCA_SAMPLES):
+    """Fits a rectangle around 2D points, aligned with their principal axes.
+
+    The orientation comes from the covariance of evenly strided samples,
+    then a single pass over all points measures the extents, with no hull.
+    It is not the minimum-area rectangle: on elongated strokes (the band in tests/bench_lamp_placement.py)
+    its area is within 2% of the exact fit, but on a uniformly filled square patch,
+    where principal axes are arbitrary, it is up to 60% larger.
+
+    :param points: 2D points, shape (N, 2)
+    :param samples: number of points the orientation is estimated from
+    :return: tuple of (rectangle center, shape (2,), rotation angle aligning the rectangle to the X and Y axes,
+        length along X, width along Y)
+    """
+    sampled = points[::max(len(points) // samples, 1)]
+    offsets = sampled - sampled.mean(axis=0)
+    _, eigenvectors = np.linalg.eigh(offsets.T @ offsets)
+    major = eigenvectors[:, 1]  # ascending eigenvalues, so the largest variance comes last
+    axes = np.array((major, (-major[1], major[0]))).T
+
+    aligned = points @ axes
+    aligned_min, aligned_max = aligned.min(axis=0), aligned.max(axis=0)
+    length, width = aligned_max - aligned_min
+    return axes @ ((aligned_min + aligned_max) * 0.5), -float(np.arctan2(major[1], major[0])), float(length), float(width)
+
+
+def get_plane_box(vertices: np.ndarray, align_to_z: np.ndarray, height: float, hull: IncrementalHull = None,
+                  fit=min_area_rect):
+    """Fits a shape around points on a plane, from their convex hull.
+
+    :param vertices: vertex coordinates in world space, shape (N, 3)
+    :param align_to_z: rotation from world space to the plane, see :func:`get_rotation_to_z`
+    :param height: Z coordinate of the plane after rotation
+    :param hull: hull of the previous update, extended if vertices were only appended since
+    :param fit: function fitting a shape to hull vertices, returning its center, angle, length and width,
+        such as :func:`min_area_rect`. If None, a rectangle is fitted to all points by :func:`fit_pca_rect` instead
+    :return: tuple of (shape center, (3, 3) rotation matrix, shape length, shape width)
+    """
+    if fit is None:
+        center_2d, angle, length, width = fit_pca_rect(vertices @ align_to_z[:2].T)
+    else:
+        hull_points = convex_hull_2d(vertices @ align_to_z[:2].T) if hull is None else hull.update(vertices, align_to_z)
+        center_2d, angle, length, width = fit(hull_points)
+
+    # rotation matrices are orthonormal, so their inverse is their transpose
+    matrix = align_to_z.T @ get_rotation_z(angle).T
+    center = align_to_z.T @ np.append(center_2d, height)
+    return center, matrix, length, width
+
+
+def get_box(vertices: np.ndarray, normal: np.ndarray, hull: IncrementalHull = None):
+    """Given a set of vertices flattened along a plane and their normal, return an aligned rectangle.
+
+    :param vertices: vertex coordinates in world space, shape (N, 3)
+    :param normal: normal of vertices for rectangle to be projected to, shape (3,)
+    :param hull: hull of the previous update, extended if vertices were only appended since
+    :return: tuple of (rect center, (3, 3) rotation matrix, rect length, rect width)
+    """
+    # rotate vertices so normal is pointed up, so we can ignore Z
+    align_to_z = get_rotation_to_z(normal)
+    return get_plane_box(vertices, align_to_z, vertices[0] @ align_to_z[2], hull)
+
+
+def get_point_lamp_center(vertices: np.ndarray, normal: np.ndarray) -> np.ndarray:
+    """Returns the location of a point lamp lighting vertices along a normal.
+
+    :param vertices: stroke vertices, potentially offset from their surface, shape (N, 3)
+    :param normal: normalized lamp direction, shape (3,)
+    :return: lamp location, shape (3,)
+    """
+    return project_to_farthest_plane(vertices, normal).mean(axis=0)
+
+
+def get_spot_lamp_placement(vertices: np.ndarray, orig_vertices: np.ndarray, normal: np.ndarray):
+    """Returns the location, aim and cone angle of a spot lamp lighting vertices along a normal.
+
+    The lamp aims at the narrowest cone around the original vertices, see :func:`min_enclosing_cone`.
+    If they surround the lamp by more than a hemisphere, it aims at their centroid instead.
+
+    :param vertices: stroke vertices, potentially offset from their surface, shape (N, 3)
+    :param orig_vertices: stroke vertices without offset from their surface, shape (M, 3)
+    :param normal: normalized lamp direction, shape (3,)
+    :exception ValueError: if the lamp is at the centroid of the original vertices
+    :return: tuple of (lamp location, normalized aim direction, spot angle in radians)
+    """
+    center = get_point_lamp_center(vertices, normal)
+
+    directions = orig_vertices - center
+    lengths = np.linalg.norm(directions, axis=1)
+    directions = directions[lengths > 0.0] / lengths[lengths > 0.0, np.newaxis]
+
+    try:
+        axis, half_angle = min_enclosing_cone(directions)
+        return center, axis, 2.0 * half_angle
+    except ValueError:
+        pass
+
+    centers_dir = orig_vertices.mean(axis=0) - center
+    centers_length = np.linalg.norm(centers_dir)
+    if centers_length == 0.0:
+        raise ValueError(SPOT_ERROR)
+    centers_dir /= centers_length
+
+    # the widest vertex has the smallest cosine to the cone axis
+    min_cos = np.clip(directions @ centers_dir, -1.0, 1.0).min(initial=1.0)
+    return center, centers_dir, 2.0 * float(np.arccos(min_cos))
+
+
+def get_area_lamp_box(vertices: np.ndarray, normal: np.ndarray, hull: IncrementalHull = None,
+                      shape: str = 'RECTANGLE', fast: bool = False):
+    """Returns the emitter of an area lamp lighting vertices along a normal.
+
+    Vertices are not projected onto the farthest plane first: rotated so the normal points up,
+    the projection only changes their Z coordinate, so their X and Y (and hull) stay the same between updates.
+
+    :param vertices: stroke vertices, potentially offset from their surface, shape (N, 3)
+    :param normal: normalized lamp direction, shape (3,)
+    :param hull: hull of the previous update, extended if vertices were only appended since
+    :param shape: area lamp shape, ellipses and disks are fitted as such rather than as their bounding rectangle
+    :param fast: if the stroke has at least :data:`FAST_FIT_POINTS` points,
+        fit rectangles by PCA rather than exactly (e.g. while painting)
+    :return: tuple of (emitter center, (3, 3) rotation matrix, emitter length, emitter width)
+    """
+    align_to_z = get_rotation_to_z(normal)
+    heights = vertices @ align_to_z[2]
+
+    fit = SHAPE_FITS.get(shape, min_area_rect)
+    if fast and fit is min_area_rect and len(vertices) >= FAST_FIT_POINTS:
+        fit = None
+    return get_plane_box(vertices, align_to_z, heights[np.argmax(heights * heights)], hull, fit)
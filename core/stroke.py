@@ -0,0 +1,69 @@
+from math import isclose
+
+import numpy as np
+
+AXIS_VECTORS = {
+    'X': np.array((1.0, 0.0, 0.0)),
+    'Y': np.array((0.0, 1.0, 0.0)),
+    'Z': np.array((0.0, 0.0, 1.0)),
+}
+"""World axes that stroke normals can be replaced with."""
+
+CAMERA_ERROR = 'Set a camera for your scene to use rim lighting!'
+
+
+def to_points(values) -> np.ndarray:
+    """Converts vectors (e.g. a list of mathutils Vectors) to a float array of shape (N, 3)."""
+    return np.array(values, dtype=np.float64).reshape(-1, 3)
+
+
+def reflect_vectors(directions: np.ndarray, normals: np.ndarray) -> np.ndarray:
+    """Reflects directions on surfaces with given normals.
+
+    :param directions: normalized directions, shape (N, 3)
+    :param normals: normalized surface normals, shape (N, 3)
+    :return: normalized reflected directions, shape (N, 3)
+    """
+    dots = np.einsum('ij,ij->i', directions, normals)
+    reflected = directions - normals * (2.0 * dots)[:, np.newaxis]
+    lengths = np.linalg.norm(reflected, axis=1)
+    return np.divide(reflected, lengths[:, np.newaxis], out=np.zeros_like(reflected),
+                     where=lengths[:, np.newaxis] > 0.0)
+
+
+def prep_stroke(vertices, normals, axis: str, offset: float, camera_origin: np.ndarray = None):
+    """Updates vertices and normals to match the artist's chosen axis.
+
+    :param vertices: stroke vertices, shape (N, 3)
+    :param normals: surface normals at the stroke vertices, shape (N, 3)
+    :param axis: 'NORMAL' to keep the surface normals, 'X', 'Y' or 'Z' to use a world axis,
+        or 'REFLECT' to reflect the camera's view off the surface (for rim lighting)
+    :param offset: distance vertices are moved along their normals.
+        If negative, normals are flipped too
+    :param camera_origin: camera location, shape (3,), only needed when reflecting
+    :exception ValueError: if reflecting without a camera
+    :return: tuple of (offset vertices, normals, original vertices), each of shape (N, 3)
+    """
+    vertices, normals = to_points(vertices), to_points(normals)
+
+    if axis in AXIS_VECTORS:
+        normals = np.broadcast_to(AXIS_VECTORS[axis], vertices.shape).copy()
+    elif axis == 'REFLECT':
+        if camera_origin is None:
+            raise ValueError(CAMERA_ERROR)
+
+        directions = vertices - camera_origin
+        lengths = np.linalg.norm(directions, axis=1)
+        directions = np.divide(directions, lengths[:, np.newaxis], out=np.zeros_like(directions),
+                               where=lengths[:, np.newaxis] > 0.0)
+        normals = reflect_vectors(directions, normals)
+
+    orig_vertices = vertices
+
+    if not isclose(offset, 0.0):
+        vertices = vertices + normals * offset
+
+    if offset < 0.0:
+        normals = -normals
+
+    return vertices, normals, orig_vertices
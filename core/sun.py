@@ -0,0 +1,78 @@
+from math import pi
+
+import numpy as np
+
+PI_OVER_2 = pi / 2
+
+NO_DIRECTION_ERROR = ('No valid directions found '
+                      '(add more samples or increase the elevation clamp!), using average normal')
+
+
+def calc_rank(dot_product, count):
+    """Calculate the "rank" of an occlusion ray test.
+
+    :param dot_product: dot product between the current vector and the ideal normal, a float or an array
+    :param count: number of points that can "see" in that direction, an int or an array
+    :return: a rank for comparison, higher is better
+    """
+    return (dot_product + 1) * count
+
+
+def geo_to_dir(latitude: float, longitude: float) -> np.ndarray:
+    """Returns the (unnormalized) direction at a latitude and longitude, starting at +Y and turning towards +X."""
+    if latitude == PI_OVER_2:
+        return np.array((0.0, 0.0, 1.0))
+    return np.array((np.sin(longitude), np.cos(longitude), np.sin(latitude)))
+
+
+def get_sample_directions(elevation_clamp: float, latitude_samples: int, longitude_samples: int) -> np.ndarray:
+    """Returns the fixed set of candidate sun directions tested for occlusion.
+
+    Vectorized equivalent of calling :func:`geo_to_dir` for every longitude, then every latitude sample.
+
+    :param elevation_clamp: sun's max vertical angle
+    :param latitude_samples: number of samples along the latitudinal axis
+    :param longitude_samples: number of samples along the longitudinal axis
+    :return: array of normalized directions, shape (longitude_samples * 2 * latitude_samples, 3)
+    """
+    latitudes = np.linspace(0, elevation_clamp, latitude_samples)
+
+    # since about half of longitudinal samples will not be viable (ie pointing away from ideal normal),
+    # we will double its sample size.
+    longitudes = np.linspace(0, 2 * np.pi, longitude_samples * 2, endpoint=False)
+
+    longitude_grid, latitude_grid = np.meshgrid(longitudes, latitudes, indexing='ij')
+    directions = np.stack((
+        np.sin(longitude_grid),
+        np.cos(longitude_grid),
+        np.sin(latitude_grid),
+    ), axis=-1).reshape(-1, 3)
+    directions[latitude_grid.ravel() == PI_OVER_2] = (0.0, 0.0, 1.0)
+
+    return directions / np.linalg.norm(directions, axis=1)[:, np.newaxis]
+
+
+def get_candidate_columns(directions: np.ndarray, avg_normal: np.ndarray):
+    """Returns indices of directions facing the average normal, and their dot products with it.
+
+    :exception ValueError: if no sample direction faces the average normal
+    """
+    # skip directions pointing away from the ideal normal (to avoid night)
+    dot_products = directions @ np.asarray(avg_normal, dtype=np.float64)
+    columns = np.flatnonzero(dot_products > 0)
+    if len(columns) == 0:
+        raise ValueError(NO_DIRECTION_ERROR)
+
+    return columns, dot_products[columns]
+
+
+def get_best_column(columns: np.ndarray, dot_products: np.ndarray, blocked: np.ndarray) -> int:
+    """Returns the candidate direction that best points toward the average normal while visible by the most points.
+
+    :param columns: indices of candidate directions, see :func:`get_candidate_columns`
+    :param dot_products: dot products of candidate directions with the average normal
+    :param blocked: for each point and candidate direction, whether the point is occluded, shape (N, len(columns))
+    :return: index of the best direction, ties going to the lowest candidate
+    """
+    visibility_counts = np.count_nonzero(~blocked, axis=0)
+    return int(columns[np.argmax(calc_rank(dot_products, visibility_counts))])
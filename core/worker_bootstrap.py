@@ -0,0 +1,21 @@
+"""Registers this folder as the top-level ``lightpainter_core`` package.
+
+Worker processes cannot import Light Painter's own package, since its ``__init__`` needs Blender.
+The pool runs this file in each worker (and once in Blender) with ``runpy.run_path``,
+so that functions sent to workers are pickled by, and imported from, the same Blender-free name.
+"""
+
+import importlib.util
+import os
+import sys
+
+PACKAGE_NAME = 'lightpainter_core'
+
+if PACKAGE_NAME not in sys.modules:
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    spec = importlib.util.spec_from_file_location(
+        PACKAGE_NAME, os.path.join(package_dir, '__init__.py'), submodule_search_locations=[package_dir]
+    )
+    package = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE_NAME] = package
+    spec.loader.exec_module(package)
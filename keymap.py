@@ -93,6 +93,11 @@ UNIVERSAL_KEYMAP = (
         'value': 'PRESS',
         'shift': 0,
     },
+    {
+        'name': 'SEPARATE_STROKES_TOGGLE',
+        'type': 'S',
+        'value': 'PRESS',
+    },
 
     # AXIS
     {
@@ -4,3 +4,4 @@ from .mesh_tool import LIGHTPAINTER_OT_Mesh, LIGHTPAINTER_OT_Tube_Light
 from .sky_tool import LIGHTPAINTER_OT_Sky, LIGHTPAINTER_OT_Sun
 from .flag_tool import LIGHTPAINTER_OT_Flag
 from .lamp_add_gobos import LIGHTPAINTER_OT_Lamp_Texture, LIGHTPAINTER_OT_Lamp_Texture_Remove
+from .clear_cache import LIGHTPAINTER_OT_Clear_Cache
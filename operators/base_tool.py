@@ -23,6 +23,7 @@ from bpy_extras import view3d_utils
 from mathutils.bvhtree import BVHTree
 
 from .. import __package__ as base_package
+from ..core.memo import LRUMemo, StrokeDigest
 from ..keymap import get_kmi_str, is_event_command, get_matching_event, AXIS_KEYMAP, VISIBILITY_KEYMAP, PREFIX
 from .draw import draw_callback_px
 if bpy.app.version >= (4, 1):
@@ -106,6 +107,9 @@ class BaseLightPaintTool:
     bl_options = {'REGISTER', 'UNDO'}
 
     tool_id = ''
+    property_updates = {}
+    """Properties that only affect one output (e.g. a lamp's power), by the name of the method writing that output.
+    Dragging them calls that method with the context instead of :meth:`update_light`, skipping any solving."""
 
     str_mouse_path: bpy.props.StringProperty(options={'HIDDEN'}, default='')
 
@@ -117,6 +121,8 @@ class BaseLightPaintTool:
         self.convex_bvh = dict()
 
         self.mouse_path = []
+        self.hit_faces = dict()
+        """Object name and face index under painted points by location, for tools copying the surface itself."""
         self.is_painting = False
         self.is_erasing = False
         self.show_eraser = False
@@ -130,9 +136,42 @@ class BaseLightPaintTool:
         self.drag_precise_increment = 0.01
         self.drag_initial_val = 0
 
+        # results of the tool's solver, by digest of the strokes and parameters affecting its geometry
+        self.stroke_digest = StrokeDigest()
+        self.solve_memo = LRUMemo()
+
         # this ensures that the first mouse click/keypress (to run the tool) doesn't accidentally add points
         self.initialized = False
 
+    def get_camera_key(self, context):
+        """Returns the scene camera's location if normals are reflected off the surface, as they depend on it."""
+        camera = context.scene.camera
+        if getattr(self, 'axis', None) == 'REFLECT' and camera is not None:
+            return tuple(camera.matrix_world.translation)
+        return None
+
+    def get_solve_key(self, context, *params) -> tuple:
+        """Returns a key to the tool's solver results, from the painted strokes and given parameters.
+
+        Normals reflected off the surface depend on the scene camera, so its location is included for that axis.
+
+        :param context: Blender context
+        :param params: hashable parameters affecting the solver's result (e.g. axis, offset or lamp type)
+        :return: hashable key
+        """
+        return (self.stroke_digest.update(self.mouse_path), self.get_camera_key(context)) + params
+
+    def get_stroke_solve_keys(self, context, *params) -> list:
+        """Returns a key per stroke, for solvers whose results are cached stroke by stroke, see :meth:`get_solve_key`.
+
+        :param context: Blender context
+        :param params: hashable parameters affecting the solver's result
+        :return: list of hashable keys, one per stroke of the mouse path
+        """
+        self.stroke_digest.update(self.mouse_path)
+        camera_key = self.get_camera_key(context)
+        return [(digest, camera_key) + params for digest in self.stroke_digest.get_stroke_digests()]
+
     def cancel(self, context):
         bpy.types.SpaceView3D.draw_handler_remove(self._handle, 'WINDOW')
         context.window.cursor_set('DEFAULT')
@@ -159,6 +198,10 @@ class BaseLightPaintTool:
         """Callback for extra controls."""
         return False
 
+    def records_hit_faces(self) -> bool:
+        """Checks if the face under each painted point is recorded, for tools copying the surface itself."""
+        return False
+
     def check_axis_event(self, event) -> bool:
         assert hasattr(self, 'axis')
         axis_command = next(
@@ -247,6 +290,10 @@ class BaseLightPaintTool:
         if self.is_erasing:
             context.window.cursor_set('ERASER')
             self.mouse_path = self.erase_from_mouse_path(region, region_x, region_y, rv3d)
+            if self.hit_faces:
+                # only keeps the faces under points that are left
+                locations = {tuple(coord) for stroke in self.mouse_path for coord, _ in stroke}
+                self.hit_faces = {location: hit for location, hit in self.hit_faces.items() if location in locations}
             should_update = True
         elif self.is_painting:
             scene = context.scene
@@ -257,14 +304,17 @@ class BaseLightPaintTool:
             view_vector = view3d_utils.region_2d_to_vector_3d(region, rv3d, coord)
             ray_origin = view3d_utils.region_2d_to_origin_3d(region, rv3d, coord)
 
-            is_hit, hit_location, hit_normal, _, hit_obj, _ = scene.ray_cast(depsgraph, ray_origin, view_vector,
-                                                                             distance=clip_end)
+            is_hit, hit_location, hit_normal, face_index, hit_obj, _ = scene.ray_cast(
+                depsgraph, ray_origin, view_vector, distance=clip_end
+            )
 
             if is_hit:
                 if self.convex_hull and hit_obj.type == 'MESH':
                     hit_location, hit_normal = get_convex_hit(clip_end, depsgraph,
                                                               hit_location, hit_normal, hit_obj,
                                                               ray_origin, view_vector, self.convex_bvh)
+                elif self.records_hit_faces():
+                    self.hit_faces[tuple(hit_location)] = (hit_obj.name, face_index)
                 self.mouse_path[-1].append((hit_location, hit_normal))
                 should_update = True
 
@@ -340,6 +390,8 @@ class BaseLightPaintTool:
         self.update_keymap_text(context)
 
         if modal_status in {'CANCELLED', 'FINISHED'}:
+            if modal_status == 'FINISHED':
+                self.finish_callback(context)
             self.cancel(context)
             if modal_status == 'CANCELLED':
                 self.cancel_callback(context)
@@ -359,11 +411,15 @@ class BaseLightPaintTool:
             drag_val = round(getattr(self, self.drag_attr), -int(floor(log10(abs(snap_increment_val)))))
             setattr(self, self.drag_attr, drag_val)
 
+        drag_attr = self.drag_attr
         if matching_event is not None:
             self.cancel_drag_attr(matching_event == 'CANCEL')
 
         try:
-            self.update_light(context)
+            if drag_attr not in self.property_updates:
+                self.update_light(context)
+            elif any(self.mouse_path):
+                getattr(self, self.property_updates[drag_attr])(context)
         except ValueError as e:
             self.report({'ERROR'}, str(e))
 
@@ -418,6 +474,10 @@ class BaseLightPaintTool:
         """Runs upon cancelling operator - allows to manually handle undo (e.g. removing new objects)."""
         pass
 
+    def finish_callback(self, context):
+        """Runs upon confirming operator, before cleanup - allows finishing any deferred work."""
+        pass
+
     def execute(self, context):
         """Run by Python API. Mainly used for testing."""
         if len(self.str_mouse_path):
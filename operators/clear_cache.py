@@ -0,0 +1,18 @@
+import bpy
+
+from .occlusion import get_cache_directory, MEGABYTE
+from ..core.mesh_cache import MeshCache
+
+
+class LIGHTPAINTER_OT_Clear_Cache(bpy.types.Operator):
+    bl_idname = 'lightpainter.clear_cache'
+    bl_label = 'Clear Light Painter Cache'
+    bl_description = 'Deletes occluder meshes cached on disk, they are exported again the next time they are used'
+    bl_options = {'REGISTER', 'INTERNAL'}
+
+    def execute(self, context):
+        mesh_cache = MeshCache(get_cache_directory())
+        size = mesh_cache.get_size()
+        mesh_cache.clear()
+        self.report({'INFO'}, 'Cleared {:.1f} MB of cached meshes'.format(size / MEGABYTE))
+        return {'FINISHED'}
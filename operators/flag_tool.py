@@ -15,22 +15,24 @@
 #     You should have received a copy of the GNU General Public License
 #     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-import math
+from functools import cache
 
 import bpy
-from mathutils import Vector
+import numpy as np
 
 from .base_tool import BaseLightPaintTool
-from .prop_util import convert_val_to_unit_str, get_drag_mode_header
+from .mesh_util import get_convex_hull, IS_BPY_V3, write_mesh
+from .prop_util import convert_val_to_unit_str, get_drag_mode_header, max_faces_prop
 from .visibility import VisibilitySettings
+from ..core import flag
+from ..core.mesh import simplify_hull
+from ..core.stroke import to_points
 from ..keymap import get_kmi_str, is_event_command
 if bpy.app.version >= (4, 1):
     from bpy.app.translations import pgettext_rpt as rpt_
 else:
     from bpy.app.translations import pgettext_tip as rpt_
 
-IS_BPY_V3 = bpy.app.version < (4, 0, 0)
-
 FLAG_DATA_NAME = 'LightPaint_Flag'
 
 
@@ -78,28 +80,27 @@ def assign_flag_material(obj, color, opacity):
     obj.data.materials.append(material)
 
 
-def get_light_points(light_obj) -> list[Vector]:
-    """Returns a list of points
+def set_flag_opacity(obj, opacity: float):
+    """Updates the opacity of an object's flag material, see :func:`assign_flag_material`."""
+    tree = obj.data.materials[0].node_tree
+    pbr_node = next(node for node in tree.nodes if node.type == 'BSDF_PRINCIPLED')
+    if IS_BPY_V3:
+        pbr_node.inputs[21].default_value = opacity
+    else:
+        pbr_node.inputs[4].default_value = opacity
+
+
+def get_light_points(light_obj) -> np.ndarray:
+    """Returns the points a lamp emits from, see :func:`core.flag.get_light_points`.
 
     :param light_obj: object with light data
-    :return: list of points
+    :return: array of points in world space, shape (K, 3)
     """
-    light_type = light_obj.data.type
-    # if area, add all four corners
-    if light_type == 'AREA':
-        # rectangles and ellipses measure by length and width, the rest measure by area
-        if light_obj.data.shape in ('RECTANGLE', 'ELLIPSE'):
-            size_x = light_obj.data.size / 2
-            size_y = light_obj.data.size_y / 2
-        else:
-            side_len = light_obj.data.size / 2
-            size_x, size_y = side_len, side_len
-
-        corners = [Vector((x, y, 0))
-                   for x in (size_x, size_x * -1)
-                   for y in (size_y, size_y * -1)]
-        return [light_obj.matrix_world @ v for v in corners]
-    return [light_obj.location]
+    light_data = light_obj.data
+    if light_data.type != 'AREA':
+        return flag.get_light_points(light_obj.matrix_world, light_data.type)
+    return flag.get_light_points(light_obj.matrix_world, 'AREA', light_data.shape, light_data.size,
+                                 light_data.size_y)
 
 
 class LIGHTPAINTER_OT_Flag(bpy.types.Operator, BaseLightPaintTool, VisibilitySettings):
@@ -108,7 +109,7 @@ class LIGHTPAINTER_OT_Flag(bpy.types.Operator, BaseLightPaintTool, VisibilitySet
     bl_description = 'Adds mesh flag(s) to shadow surfaces specified by selected lights and annotations'
 
     tool_id = 'view3d.lightpaint_flag'
-    prev_vertices = dict()
+    property_updates = {'opacity': 'update_opacity'}
 
     # FLAG PROPERTIES
     factor: bpy.props.FloatProperty(
@@ -127,6 +128,8 @@ class LIGHTPAINTER_OT_Flag(bpy.types.Operator, BaseLightPaintTool, VisibilitySet
         unit='LENGTH',
     )
 
+    max_faces: max_faces_prop('flag')
+
     shadow_color: bpy.props.FloatVectorProperty(
         name='Color',
         description='Material color of the flag',
@@ -148,6 +151,7 @@ class LIGHTPAINTER_OT_Flag(bpy.types.Operator, BaseLightPaintTool, VisibilitySet
     def __init__(self, *args, **kwargs):
         bpy.types.Operator.__init__(self, *args, **kwargs)
         BaseLightPaintTool.__init__(self)
+        self.prev_hulls = dict()
 
     @classmethod
     def poll(cls, context):
@@ -165,6 +169,7 @@ class LIGHTPAINTER_OT_Flag(bpy.types.Operator, BaseLightPaintTool, VisibilitySet
             layout.prop(self, 'offset', text='Sun Flag Offset')
         if has_other_lamps:
             layout.prop(self, 'factor', text='Lamp Flag Factor')
+        layout.prop(self, 'max_faces')
 
         layout.separator()
 
@@ -222,49 +227,54 @@ class LIGHTPAINTER_OT_Flag(bpy.types.Operator, BaseLightPaintTool, VisibilitySet
             get_kmi_str('VISIBILITY_TOGGLE_DIFFUSE'), rpt_('Diffuse'), rpt_('ON' if self.visible_diffuse else 'OFF'),
             get_kmi_str('VISIBILITY_TOGGLE_SPECULAR'), rpt_('Specular'), rpt_('ON' if self.visible_specular else 'OFF'),
             get_kmi_str('VISIBILITY_TOGGLE_VOLUME'), rpt_('Volume'), rpt_('ON' if self.visible_volume else 'OFF'),
-        )
+        ) + ', {}: {}'.format(rpt_('Faces'), self.get_face_count())
+
+    def add_card_for_lamp(self, context, mesh_obj, light_obj, get_vertices):
+        """Updates the flag of a lamp.
 
-    def add_card_for_lamp(self, context, mesh_obj, light_obj, vertices):
+        :param context: Blender context
+        :param mesh_obj: flag object
+        :param light_obj: lamp object to be flagged
+        :param get_vertices: function returning the stroke vertices, shape (N, 3)
+        """
         mesh = mesh_obj.data
 
-        if light_obj.data.type == 'SUN':
-            direction = (light_obj.matrix_world.to_3x3() @ Vector((0, 0, -1))).normalized()
-            direction.negate()
-            mesh_vertices = tuple(v + direction * self.offset
-                                  for v in vertices)
+        light_data = light_obj.data
+        matrix_world = tuple(map(tuple, light_obj.matrix_world))
+
+        def solve():
+            if light_data.type == 'SUN':
+                return flag.get_sun_flag_points(get_vertices(), matrix_world, self.offset)
+            return flag.get_lamp_flag_points(get_vertices(), get_light_points(light_obj), self.factor)
+
+        # a flag follows its lamp, so the lamp's transform and emitter are part of the key
+        params = (matrix_world, light_data.type)
+        if light_data.type == 'SUN':
+            params += (self.offset,)
         else:
-            factor = self.factor
-            if math.isclose(factor, 1.0):
-                mesh_vertices = vertices
-            else:
-                mesh_vertices = tuple(light_v + (v - light_v) * factor
-                                      for v in vertices
-                                      for light_v in get_light_points(light_obj))
-
-        # only updates geometry if changed
-        # mitigates GH issue #50 in mesh constantly re-evaluating
-        if light_obj.name not in self.prev_vertices or self.prev_vertices[light_obj.name] != str(mesh_vertices):
-            mesh.clear_geometry()
-            mesh.from_pydata(mesh_vertices, [], [])
+            params += (self.factor,)
+            if light_data.type == 'AREA':
+                params += (light_data.shape, light_data.size, light_data.size_y)
+        key = self.get_solve_key(context, light_obj.name, self.max_faces, *params)
+        hull = self.solve_memo.get_or_compute(key, lambda: simplify_hull(get_convex_hull(solve()), self.max_faces))
 
-            # go into edit mode, convex hull, then get out
-            context.view_layer.objects.active = mesh_obj
-            bpy.ops.object.editmode_toggle()
-            bpy.ops.mesh.convex_hull()
-            bpy.ops.object.editmode_toggle()
-            self.prev_vertices[light_obj.name] = str(mesh_vertices)
+        # only updates geometry if changed, stored results are the same objects
+        # mitigates GH issue #50 in mesh constantly re-evaluating
+        if self.prev_hulls.get(light_obj.name) is not hull:
+            write_mesh(mesh, *hull)
+            self.prev_hulls[light_obj.name] = hull
 
         self.set_visibility(mesh_obj)
+        set_flag_opacity(mesh_obj, self.opacity)
 
-        material = mesh_obj.data.materials[0]
-        tree = material.node_tree
+    def get_face_count(self) -> int:
+        """Returns the number of faces of every flag, as last written."""
+        return sum(len(face_sizes) for _, face_sizes, _ in self.prev_hulls.values())
 
-        # find PBR and set color
-        pbr_node = next(node for node in tree.nodes if node.type == 'BSDF_PRINCIPLED')
-        if IS_BPY_V3:
-            pbr_node.inputs[21].default_value = self.opacity
-        else:
-            pbr_node.inputs[4].default_value = self.opacity
+    def update_opacity(self, context):
+        """Writes only the opacity of every flag, e.g. when dragging it."""
+        for mesh_obj in get_selected_by_type(context, 'MESH'):
+            set_flag_opacity(mesh_obj, self.opacity)
 
     def update_light(self, context):
         light_objs = get_selected_by_type(context, 'LIGHT')
@@ -273,15 +283,18 @@ class LIGHTPAINTER_OT_Flag(bpy.types.Operator, BaseLightPaintTool, VisibilitySet
             self.report({'ERROR_INVALID_INPUT'}, 'Select lamp objects to be flagged for shadows!')
             return {'CANCELLED'}
 
-        vertices = [coord for stroke in self.mouse_path for coord, normal in stroke]
-
         # skip if no strokes are currently drawn
-        if len(vertices) == 0:
+        if not any(self.mouse_path):
             return {'CANCELLED'}
 
+        # converted at most once per update, and only if a flag is not stored
+        @cache
+        def get_vertices():
+            return to_points([coord for stroke in self.mouse_path for coord, normal in stroke])
+
         # add new mesh
         for mesh_obj, light_obj in zip(mesh_objs, light_objs):
-            self.add_card_for_lamp(context, mesh_obj, light_obj, vertices)
+            self.add_card_for_lamp(context, mesh_obj, light_obj, get_vertices)
 
         # select them so the panel can detect them correctly
         for light_obj in light_objs:
@@ -15,14 +15,14 @@
 #     You should have received a copy of the GNU General Public License
 #     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-from math import pi, radians
+from math import pi
 
 import bpy
-from mathutils import Vector
 
 from .base_tool import BaseLightPaintTool
 from ..keymap import get_kmi_str, is_event_command
-from .lamp_util import get_average_normal, get_occlusion_based_normal, LampUtils, PI_OVER_2
+from .lamp_util import get_average_normal, LampUtils
+from .occlusion import aim_sun_lamp, DEPTH_MAP_METHODS, OcclusionSettings
 from .prop_util import axis_prop, convert_val_to_unit_str, get_drag_mode_header
 from ..axis import prep_stroke
 if bpy.app.version >= (4, 1):
@@ -31,54 +31,21 @@ else:
     from bpy.app.translations import pgettext_tip as rpt_
 
 
-class LIGHTPAINTER_OT_Lamp_Adjust(bpy.types.Operator, BaseLightPaintTool, LampUtils):
+class LIGHTPAINTER_OT_Lamp_Adjust(bpy.types.Operator, BaseLightPaintTool, LampUtils, OcclusionSettings):
     bl_idname = 'lightpainter.lamp_adjust'
     bl_label = 'Adjust Lamp'
     bl_description = 'Adjusts active lamp\'s position and rotation to light surfaces specified by annotations'
 
     tool_id = 'view3d.lightpaint_lamp_adjust'
+    property_updates = {
+        'power': 'update_lamp_power',
+        'radius': 'update_lamp_radius',
+    }
 
     axis: axis_prop('lamp')
 
     # SUN ONLY METHODS
 
-    normal_method: bpy.props.EnumProperty(
-        name='Method',
-        description='Method to determine sun direction',
-        items=(
-            ('AVERAGE', 'Average', 'Uses average of normals'),
-            ('OCCLUSION', 'Occlusion', 'Casts rays to determine occlusion and optimal direction for visibility'),
-        ),
-        default='OCCLUSION'
-    )
-
-    longitude_samples: bpy.props.IntProperty(
-        name='Azimuth Samples',
-        description='Samples of normals around the azimuth. '
-                    'Increasing samples improves precision at the cost of processing time',
-        min=4,
-        default=6,
-    )
-
-    latitude_samples: bpy.props.IntProperty(
-        name='Elevation Samples',
-        description='Samples of normals from the horizon to the maximum elevation. '
-                    'Increasing samples improves precision at the cost of processing time',
-        min=3,
-        default=6,
-    )
-
-    elevation_clamp: bpy.props.FloatProperty(
-        name='Max Sun Elevation',
-        description='Tested normals will be scaled to at most this elevation.'
-                    'Forces the sun closer to the horizon, allowing more dynamic lighting.',
-        min=0.0, soft_min=0.0,
-        max=PI_OVER_2, soft_max=PI_OVER_2,
-        default=radians(60),
-        step=10,
-        subtype='ANGLE'
-    )
-
     angle: bpy.props.FloatProperty(
         name='Angle',
         description='Angular diameter of the Sun as seen from the Earth',
@@ -99,6 +66,8 @@ class LIGHTPAINTER_OT_Lamp_Adjust(bpy.types.Operator, BaseLightPaintTool, LampUt
     def __init__(self, *args, **kwargs):
         bpy.types.Operator.__init__(self, *args, **kwargs)
         BaseLightPaintTool.__init__(self)
+        LampUtils.__init__(self)
+        OcclusionSettings.__init__(self)
 
     @classmethod
     def poll(cls, context):
@@ -116,9 +85,13 @@ class LIGHTPAINTER_OT_Lamp_Adjust(bpy.types.Operator, BaseLightPaintTool, LampUt
             layout.prop(self, 'normal_method', expand=True)
 
             col = layout.column()
-            col.active = self.normal_method == 'OCCLUSION'
+            col.active = self.normal_method != 'AVERAGE'
             col.prop(self, 'longitude_samples')
             col.prop(self, 'latitude_samples')
+            row = col.row()
+            row.active = self.normal_method in DEPTH_MAP_METHODS
+            row.prop(self, 'depth_map_resolution')
+            self.draw_occluder_props(col)
             layout.prop(self, 'elevation_clamp', slider=True)
 
             layout.separator()
@@ -159,39 +132,36 @@ class LIGHTPAINTER_OT_Lamp_Adjust(bpy.types.Operator, BaseLightPaintTool, LampUt
 
         self.draw_visibility_props(layout)
 
-    def adjust_sun_lamp(self, context, lamp, stroke):
-        vertices, normals = stroke
-
-        try:
-            avg_normal = get_average_normal(normals)
-        except ValueError as e:
-            self.report({'ERROR'}, str(e))
-            return {'CANCELLED'}
-
-        if self.normal_method == 'OCCLUSION':
-            try:
-                sun_normal = get_occlusion_based_normal(
-                    context, vertices, avg_normal,
-                    self.elevation_clamp, self.latitude_samples, self.longitude_samples
-                )
-            except ValueError:
-                self.report({'ERROR'}, 'No valid directions found '
-                                       '(add more samples or increase the elevation clamp!), using average normal')
-                sun_normal = Vector(avg_normal)
-        else:
-            sun_normal = Vector(avg_normal)
+    def adjust_sun_lamp(self, context, lamp):
+        # suns are aimed by occlusion, which keeps its own caches across updates
+        stroke_vertices = [coord for stroke in self.mouse_path for coord, normal in stroke]
+        stroke_normals = [normal for stroke in self.mouse_path for coord, normal in stroke]
+        vertices, normals, _ = prep_stroke(
+            context, stroke_vertices, stroke_normals,
+            self.axis, self.offset
+        )
 
-        sun_normal.negate()
+        # raises ValueError for strokes without a usable normal, reported by update_light
+        avg_normal = get_average_normal(normals)
 
-        # Sun only rotates, no location change
-        rotation = Vector((0.0, 0.0, -1.0)).rotation_difference(sun_normal).to_euler()
-        lamp.rotation_euler = rotation
+        sun_normal = self.get_sun_normal(context, vertices, avg_normal,
+                                         apply=lambda normal: aim_sun_lamp(lamp, normal))
+        aim_sun_lamp(lamp, sun_normal)
 
         # set light data properties
         lamp.data.energy = self.sun_power
         lamp.data.angle = self.angle
         self.set_visibility(lamp)
 
+    def update_lamp_power(self, context):
+        """Writes only the active lamp's power, e.g. when dragging it. Suns keep their own power."""
+        lamp = context.active_object
+        lamp.data.energy = self.sun_power if lamp.data.type == 'SUN' else self.get_power()
+
+    def update_lamp_radius(self, context):
+        """Writes only the active lamp's radius, e.g. when dragging it. Suns use their angle instead."""
+        if context.active_object.data.type != 'SUN':
+            super().update_lamp_radius(context)
 
     def get_header_text(self):
         if self.drag_attr == 'offset':
@@ -253,15 +223,8 @@ class LIGHTPAINTER_OT_Lamp_Adjust(bpy.types.Operator, BaseLightPaintTool, LampUt
         return True
 
     def update_light(self, context):
-        stroke_vertices = [coord for stroke in self.mouse_path for coord, normal in stroke]
-        stroke_normals = [normal for stroke in self.mouse_path for coord, normal in stroke]
-        vertices, normals, orig_vertices = prep_stroke(
-            context, stroke_vertices, stroke_normals,
-            self.axis, self.offset
-        )
-
         # skip if no strokes are currently drawn
-        if len(stroke_vertices) == 0:
+        if not any(self.mouse_path):
             return {'CANCELLED'}
 
         lamp = context.active_object
@@ -272,13 +235,15 @@ class LIGHTPAINTER_OT_Lamp_Adjust(bpy.types.Operator, BaseLightPaintTool, LampUt
 
         lamp_update_funcs = {
             'AREA': self.update_area_lamp,
-            'SPOT': lambda spot_lamp, stroke: self.update_spot_lamp(spot_lamp, orig_vertices, stroke),
+            'SPOT': self.update_spot_lamp,
             'POINT': self.update_point_lamp,
-            'SUN': lambda sun_lamp, stroke: self.adjust_sun_lamp(context, sun_lamp, stroke),
         }
 
         try:
-            lamp_update_funcs[lamp_type](lamp, (vertices, normals))
+            if lamp_type == 'SUN':
+                self.adjust_sun_lamp(context, lamp)
+            else:
+                lamp_update_funcs[lamp_type](lamp, self.get_lamp_placement(context, lamp_type))
         except ValueError as e:
             self.report({'ERROR'}, str(e))
             return {'CANCELLED'}
@@ -314,7 +279,22 @@ class LIGHTPAINTER_OT_Lamp_Adjust(bpy.types.Operator, BaseLightPaintTool, LampUt
             self.radius = lamp_data.shadow_soft_size
             self.prev_radius = self.radius
 
-        return super().invoke(context, event)
+        result = super().invoke(context, event)
+        self.is_fast_fit = 'RUNNING_MODAL' in result
+        if lamp_type == 'SUN' and 'RUNNING_MODAL' in result:
+            self.start_occlusion_updates()
+        return result
+
+    def cancel(self, context):
+        super().cancel(context)
+        self.stop_occlusion_updates()
+
+    def finish_callback(self, context):
+        # refit exactly, in case the lamp was approximated while painting
+        if self.is_fast_fit:
+            self.is_fast_fit = False
+            self.update_light(context)
+        self.flush_occlusion_job()
 
     def cancel_callback(self, context):
         """Resets lamp properties."""
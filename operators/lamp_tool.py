@@ -20,7 +20,6 @@ import bpy
 from .base_tool import BaseLightPaintTool
 from .lamp_util import LampUtils
 from .prop_util import axis_prop, convert_val_to_unit_str, get_drag_mode_header
-from ..axis import prep_stroke
 from ..keymap import get_kmi_str, is_event_command
 if bpy.app.version >= (4, 1):
     from bpy.app.translations import pgettext_rpt as rpt_
@@ -36,6 +35,10 @@ class LIGHTPAINTER_OT_Lamp(bpy.types.Operator, BaseLightPaintTool, LampUtils):
     bl_description = 'Adds lamp to light surfaces specified by annotations'
 
     tool_id = 'view3d.lightpaint_lamp'
+    property_updates = {
+        'power': 'update_lamp_power',
+        'radius': 'update_lamp_radius',
+    }
 
     lamp_type: bpy.props.EnumProperty(
         name='Lamp Type',
@@ -52,6 +55,7 @@ class LIGHTPAINTER_OT_Lamp(bpy.types.Operator, BaseLightPaintTool, LampUtils):
     def __init__(self, *args, **kwargs):
         bpy.types.Operator.__init__(self, *args, **kwargs)
         BaseLightPaintTool.__init__(self)
+        LampUtils.__init__(self)
 
     def draw(self, _context):
         layout = self.layout
@@ -153,15 +157,8 @@ class LIGHTPAINTER_OT_Lamp(bpy.types.Operator, BaseLightPaintTool, LampUtils):
         return True
 
     def update_light(self, context):
-        stroke_vertices = [coord for stroke in self.mouse_path for coord, normal in stroke]
-        stroke_normals = [normal for stroke in self.mouse_path for coord, normal in stroke]
-        vertices, normals, orig_vertices = prep_stroke(
-            context, stroke_vertices, stroke_normals,
-            self.axis, self.offset
-        )
-
         # skip if no strokes are currently drawn
-        if len(stroke_vertices) == 0:
+        if not any(self.mouse_path):
             return {'CANCELLED'}
 
         lamp_type = self.lamp_type
@@ -170,18 +167,29 @@ class LIGHTPAINTER_OT_Lamp(bpy.types.Operator, BaseLightPaintTool, LampUtils):
 
         lamp_update_funcs = {
             'AREA': self.update_area_lamp,
-            'SPOT': lambda spot_lamp, stroke: self.update_spot_lamp(spot_lamp, orig_vertices, stroke),
+            'SPOT': self.update_spot_lamp,
             'POINT': self.update_point_lamp,
         }
 
         try:
-            lamp_update_funcs[lamp_type](lamp_obj, (vertices, normals))
+            lamp_update_funcs[lamp_type](lamp_obj, self.get_lamp_placement(context, lamp_type))
         except ValueError as e:
             self.report({'ERROR'}, str(e))
             return {'CANCELLED'}
 
         return {'FINISHED'}
 
+    def invoke(self, context, event):
+        result = super().invoke(context, event)
+        self.is_fast_fit = 'RUNNING_MODAL' in result
+        return result
+
+    def finish_callback(self, context):
+        """Refits the lamp exactly, in case it was approximated while painting."""
+        if self.is_fast_fit:
+            self.is_fast_fit = False
+            self.update_light(context)
+
     def startup_callback(self, context):
         bpy.ops.object.light_add(type=self.lamp_type, align='WORLD')
 
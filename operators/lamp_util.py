@@ -1,18 +1,17 @@
 import bpy
 import math
-from math import cos, pi, sin
 from mathutils import Matrix, Vector
-from mathutils.geometry import box_fit_2d
+
 import numpy as np
-from typing import Iterable
 
 from .prop_util import offset_prop
 from .visibility import VisibilitySettings
+from ..axis import prep_stroke
+from ..core import placement, sun
+from ..core.hull import IncrementalHull
+from ..core.stroke import to_points
 
 EPSILON = 0.01
-PI_OVER_2 = pi / 2
-
-NORMAL_ERROR = 'Average of normals results in a zero vector - unable to calculate average direction!'
 
 
 def calc_power(power: float, distance: float) -> float:
@@ -26,21 +25,17 @@ def calc_power(power: float, distance: float) -> float:
     return power * (distance * distance)
 
 
-def get_average_normal(normals: Iterable[Vector]) -> Vector:
+def get_average_normal(normals) -> Vector:
     """Calculates average normal. Handles zero vector edge case as an error.
 
-    :param normals: list of normal vectors
+    :param normals: list of normal vectors, or an array of shape (N, 3)
     :return: single normalized Vector representing the average
     """
-    avg_normal = sum(normals, start=Vector())
-    avg_normal.normalize()
-    if avg_normal == Vector((0, 0, 0)):
-        raise ValueError(NORMAL_ERROR)
+    return Vector(placement.get_average_normal(to_points(normals)))
 
-    return avg_normal
 
-
-def is_blocked(scene, depsgraph, origin: Vector, direction: Vector, max_distance=1.70141e+38) -> bool:
+def is_blocked(scene, depsgraph, origin: Vector, direction: Vector, max_distance=1.70141e+38,
+               is_occluder=None) -> bool:
     """Check if a given point is occluded in a given direction.
 
     :param scene: scene
@@ -48,12 +43,21 @@ def is_blocked(scene, depsgraph, origin: Vector, direction: Vector, max_distance
     :param origin: given point in world space as a Vector
     :param direction: given direction in world space as a Vector
     :param max_distance: maximum distance for raycast to check
+    :param is_occluder: function checking if a hit object blocks the ray, if None then every object does
     :return: True if anything is in that direction from that point, False otherwise
     """
     offset_origin = origin + direction * EPSILON
-    is_hit, _, _, _, _, _ = scene.ray_cast(depsgraph, offset_origin, direction, distance=max_distance)
+    while True:
+        is_hit, location, _, _, hit_obj, _ = scene.ray_cast(depsgraph, offset_origin, direction,
+                                                           distance=max_distance)
+        if not is_hit or is_occluder is None or is_occluder(hit_obj):
+            return is_hit
 
-    return is_hit
+        # continue past objects that do not block
+        max_distance -= (location - offset_origin).length + EPSILON
+        if max_distance <= 0.0:
+            return False
+        offset_origin = location + direction * EPSILON
 
 
 def get_box(vertices, normal):
@@ -63,96 +67,13 @@ def get_box(vertices, normal):
     :param normal: normal of vertices for rectangle to be projected to
     :return: tuple of (coordinate of rect center, matrix for rotation, rect length, and rect width
     """
-    # rotate hull so normal is pointed up, so we can ignore Z
-    # find angle of fitted box
-    align_to_z = normal.rotation_difference(Vector((0.0, 0.0, 1.0))).to_matrix()
-    flattened_2d = [align_to_z @ v for v in vertices]
-
-    # rotate hull by angle
-    # get length and width
-    angle = box_fit_2d([(v[0], v[1]) for v in flattened_2d])
-    box_mat = Matrix.Rotation(angle, 3, 'Z')
-    aligned_2d = [(box_mat @ Vector((co[0], co[1], 0))) for co in flattened_2d]
-    xs = tuple(co[0] for co in aligned_2d)
-    ys = tuple(co[1] for co in aligned_2d)
-
-    x_min, x_max = min(xs), max(xs)
-    y_min, y_max = min(ys), max(ys)
-
-    length = x_max - x_min
-    width = y_max - y_min
-
-    center = align_to_z.inverted_safe() @ box_mat.inverted_safe() @ Vector((x_min + (length / 2),
-                                                                            y_min + (width / 2),
-                                                                            flattened_2d[0][2]))
-
-    # return matrix, length and width of box
-    return center, align_to_z.inverted_safe() @ box_mat.inverted_safe(), length, width
-
-
-def calc_rank(dot_product: float, count: int) -> float:
-    """Calculate the "rank" of an occlusion ray test.
-
-    :param dot_product: dot product between the current vector and the ideal normal
-    :param count: number of points that can "see" in that direction
-    :return: a rank for comparison, higher is better
-    """
-    return (dot_product + 1) * count
+    center, matrix, length, width = placement.get_box(to_points(vertices),
+                                                      np.array(normal, dtype=np.float64))
+    return Vector(center), Matrix(matrix), length, width
 
 
 def geo_to_dir(latitude, longitude) -> Vector:
-    if latitude == pi/2:
-        return Vector((0, 0, 1))
-    x = sin(longitude)
-    y = cos(longitude)
-    z = sin(latitude)
-    return Vector((x, y, z))
-
-
-def get_occlusion_based_normal(
-        context, vertices: Iterable, avg_normal: Vector,
-        elevation_clamp: float, latitude_samples: int, longitude_samples: int
-) -> Vector:
-    """Find a normal that best points toward a given normal that's visible by the most points.
-
-    :param context: Blender context
-    :param vertices: list of points in world space as Vectors
-    :param avg_normal: average normal as the preferred direction towards the sun lamp
-    :param elevation_clamp: sun's max vertical angle
-    :param latitude_samples: number of samples for occlusion testing along the latitudinal axis
-    :param longitude_samples: number of samples for occlusion testing along the longitudinal axis
-    :return: world space Vector pointing towards the sun
-    """
-    max_sun_elevation = elevation_clamp
-    latitude_sample_size = latitude_samples
-    latitude_samples = np.linspace(0, max_sun_elevation, latitude_sample_size)
-
-    # since about half of longitudinal samples will not be viable (ie pointing away from ideal normal),
-    # we will double its sample size.
-    longitude_sample_size = longitude_samples * 2
-    longitude_samples = np.linspace(0, 2 * pi, longitude_sample_size, endpoint=False)
-
-    # iterate over each axis
-    # if the resulting vector is all zeroes or the dot product of it and Z axis is too high, skip
-    # if the dot product of it and Z axis is less than zero, skip (to avoid night)
-    scene = context.scene
-    depsgraph = context.evaluated_depsgraph_get()
-
-    samples_loop = (geo_to_dir(lat, long).normalized()
-                    for long in longitude_samples
-                    for lat in latitude_samples
-                    if geo_to_dir(lat, long).normalized().dot(avg_normal) > 0)
-
-    def normal_rank(normal):
-        vertex_visibility_count = sum(1 for v in vertices
-                                      if not is_blocked(scene, depsgraph, v, normal))
-
-        curr_rank = calc_rank(normal.dot(avg_normal), vertex_visibility_count)
-        return curr_rank, normal
-
-    sun_normal = max(normal_rank(normal) for normal in samples_loop)[1]
-
-    return sun_normal
+    return Vector(sun.geo_to_dir(latitude, longitude))
 
 
 class LampUtils(VisibilitySettings):
@@ -233,34 +154,83 @@ class LampUtils(VisibilitySettings):
         subtype='ANGLE'
     )
 
-    def update_area_lamp(self, lamp, stroke):
-        """Adds an area lamp.
+    def __init__(self):
+        self.area_hull = IncrementalHull()
+        # approximate area lamp boxes of huge strokes while the modal runs, refitted exactly on finish
+        self.is_fast_fit = False
 
-        :param lamp: area lamp object
-        :param stroke: tuple of vertices and normals
+    def solve_lamp(self, lamp_type: str, vertices, normals, orig_vertices):
+        """Places a lamp lighting a prepared stroke, see :mod:`core.placement`.
+
+        :param lamp_type: 'AREA', 'SPOT' or 'POINT'
+        :param vertices: stroke vertices, potentially offset from their surface, shape (N, 3)
+        :param normals: stroke normals, shape (N, 3)
+        :param orig_vertices: stroke vertices without offset from their surface, shape (N, 3)
 
         :exception ValueError: if calculating the normal average fails
 
-        :return: Blender lamp object
+        :return: area lamp box, spot lamp location, aim and angle, or point lamp location
         """
-
-        vertices, normals = stroke
         # get average, negated normal, THROWS ValueError if average is zero vector
-        avg_normal = get_average_normal(normals)
-        avg_normal.negate()
+        avg_normal = -placement.get_average_normal(normals)
+
+        if lamp_type == 'AREA':
+            return placement.get_area_lamp_box(vertices, avg_normal, self.area_hull, self.shape, self.is_fast_fit)
+        elif lamp_type == 'SPOT':
+            return placement.get_spot_lamp_placement(vertices, orig_vertices, avg_normal)
+        return placement.get_point_lamp_center(vertices, avg_normal)
+
+    def get_lamp_placement(self, context, lamp_type: str):
+        """Returns the placement of a lamp lighting the painted strokes, reusing a stored one if any.
+
+        :param context: Blender context
+        :param lamp_type: 'AREA', 'SPOT' or 'POINT'
 
-        farthest_point = max((v.project(avg_normal).length_squared, v) for v in vertices)[1]
+        :exception ValueError: if preparing the stroke or calculating the normal average fails
 
-        projected_vertices = tuple(v + (farthest_point - v).project(avg_normal) for v in vertices)
+        :return: placement, see :meth:`solve_lamp`
+        """
+        params = (lamp_type, self.axis, self.offset)
+        if lamp_type == 'AREA':
+            params += (self.shape, self.is_fast_fit)
+
+        def solve():
+            stroke_vertices = [coord for stroke in self.mouse_path for coord, normal in stroke]
+            stroke_normals = [normal for stroke in self.mouse_path for coord, normal in stroke]
+            vertices, normals, orig_vertices = prep_stroke(
+                context, stroke_vertices, stroke_normals,
+                self.axis, self.offset
+            )
+            return self.solve_lamp(lamp_type, vertices, normals, orig_vertices)
+
+        return self.solve_memo.get_or_compute(self.get_solve_key(context, *params), solve)
+
+    def get_power(self) -> float:
+        """Returns the lamp power, relative to the stroke offset if chosen."""
+        return calc_power(self.power, self.offset) if self.is_power_relative else self.power
+
+    def update_lamp_power(self, context):
+        """Writes only the active lamp's power, e.g. when dragging it."""
+        context.active_object.data.energy = self.get_power()
+
+    def update_lamp_radius(self, context):
+        """Writes only the active lamp's radius, e.g. when dragging it."""
+        context.active_object.data.shadow_soft_size = self.radius
+
+    def update_area_lamp(self, lamp, box):
+        """Updates area lamp.
 
-        center, mat, x_size, y_size = get_box(projected_vertices, avg_normal)
-        rotation = mat.to_euler()
+        :param lamp: area lamp object
+        :param box: tuple of emitter center, rotation matrix, length and width, see :meth:`solve_lamp`
+        """
+        center, mat, x_size, y_size = box
+        rotation = Matrix(mat).to_euler()
         rotation.rotate_axis('X', math.radians(180.0))
 
         # set light data properties
         lamp.location = center
         lamp.rotation_euler = rotation
-        lamp.data.energy = calc_power(self.power, self.offset) if self.is_power_relative else self.power
+        lamp.data.energy = self.get_power()
         lamp.data.shape = self.shape
         lamp.data.spread = self.spread
         if self.shape in {'RECTANGLE', 'ELLIPSE'}:
@@ -272,68 +242,32 @@ class LampUtils(VisibilitySettings):
 
         self.set_visibility(lamp)
 
-    def update_point_lamp(self, lamp, stroke):
+    def update_point_lamp(self, lamp, center):
         """Updates point lamp.
 
         :param lamp: Blender lamp object
-        :param stroke: tuple of vertices and strokes
-
-        :exception ValueError: if calculating the normal average fails
-
-        :return: Blender lamp object
+        :param center: lamp location, see :meth:`solve_lamp`
         """
-        vertices, normals = stroke
-
-        # get average, negated normal, THROWS ValueError if average is zero vector
-        avg_normal = get_average_normal(normals)
-        avg_normal.negate()
-
-        farthest_point = max((v.project(avg_normal).length_squared, v) for v in vertices)[1]
-
-        projected_vertices = tuple(v + (farthest_point - v).project(avg_normal) for v in vertices)
-
-        center = sum(projected_vertices, start=Vector()) / len(projected_vertices)
-
         # set light data properties
         lamp.location = center
         lamp.data.shadow_soft_size = self.radius
-        lamp.data.energy = calc_power(self.power, self.offset) if self.is_power_relative else self.power
+        lamp.data.energy = self.get_power()
         self.set_visibility(lamp)
 
-    def update_spot_lamp(self, lamp, orig_vertices, stroke):
-        """Adds a spot lamp.
+    def update_spot_lamp(self, lamp, spot):
+        """Updates spot lamp.
 
         :param lamp: Blender lamp object
-        :param orig_vertices: stroke vertices without offset from their surface
-        :param stroke: tuple of vertices and normals, potentially offset from their surface
-
-        :exception ValueError: if calculating the normal average fails
-
-        :return: Blender lamp object
+        :param spot: tuple of lamp location, aim direction and spot angle, see :meth:`solve_lamp`
         """
-        vertices, normals = stroke
-
-        # THROWS ValueError if average is zero vector
-        avg_normal = get_average_normal(normals)
-        avg_normal.negate()
-
-        farthest_point = max((v.project(avg_normal).length_squared, v) for v in vertices)[1]
-
-        projected_vertices = tuple(v + (farthest_point - v).project(avg_normal) for v in vertices)
-
-        center = sum(projected_vertices, start=Vector()) / len(projected_vertices)
-        rotation = Vector((0.0, 0.0, -1.0)).rotation_difference(avg_normal).to_euler()
-
-        orig_center = sum(orig_vertices, start=Vector()) / len(orig_vertices)
-        centers_dir = (orig_center - center).normalized()
-        spot_angle = 2 * max((v - center).normalized().angle(centers_dir)
-                             for v in orig_vertices)
+        center, aim, spot_angle = spot
+        rotation = Vector((0.0, 0.0, -1.0)).rotation_difference(Vector(aim)).to_euler()
 
         # set light data properties
         lamp.location = center
         lamp.rotation_euler = rotation
         lamp.data.spot_size = spot_angle
-        lamp.data.energy = calc_power(self.power, self.offset) if self.is_power_relative else self.power
+        lamp.data.energy = self.get_power()
         lamp.data.shadow_soft_size = self.radius
         lamp.data.spot_blend = self.spot_blend
         self.set_visibility(lamp)
@@ -1,10 +1,15 @@
 import bpy
+from mathutils import Vector
+import numpy as np
 
 from .base_tool import BaseLightPaintTool
-from .lamp_util import get_average_normal
-from .prop_util import axis_prop, convert_val_to_unit_str, get_drag_mode_header, offset_prop
+from .mesh_util import get_convex_hull, patch_triangles, SurfacePatch, write_edges, write_mesh, write_splines
+from .prop_util import axis_prop, convert_val_to_unit_str, get_drag_mode_header, max_faces_prop, offset_prop
 from .visibility import VisibilitySettings
 from ..axis import prep_stroke
+from ..core.hull import IncrementalHull3D
+from ..core.mesh import (get_hull_points, get_island_roots, get_tube_edges, IncrementalFlatHull, join_hulls,
+                         join_wires, merge_by_distance, simplify_hull, smooth_path, sweep_circle, thin_path)
 from ..keymap import get_kmi_str, is_event_command
 if bpy.app.version >= (4, 1):
     from bpy.app.translations import pgettext_rpt as rpt_
@@ -12,6 +17,8 @@ else:
     from bpy.app.translations import pgettext_tip as rpt_
 
 EMISSIVE_MAT_NAME = 'LightPaint_Emissive'
+SURFACE_RAY_OFFSET = 1e-4
+"""Distance above a stroke point from which its surface is found again, if it was not recorded while painting."""
 MESH_DATA_NAME = 'LightPaint_Convex'
 TUBE_DATA_NAME = 'LightPaint_Tube'
 
@@ -46,25 +53,111 @@ def assign_emissive_material(obj, color, emit_value: float):
         obj.data.materials[0] = material
 
 
+def set_emit_value(obj, emit_value: float):
+    """Updates the emission value of an object's emissive material, see :func:`assign_emissive_material`."""
+    tree = obj.data.materials[0].node_tree
+    emissive_node = next(node for node in tree.nodes if node.bl_idname == 'ShaderNodeEmission')
+    emissive_node.inputs[1].default_value = emit_value
+
+
+def set_skin_roots(obj, roots: np.ndarray):
+    """Marks the root vertices of a mesh object's skin vertex data, see :func:`set_skin_modifiers`.
+
+    :param obj: mesh object, with skin vertex data
+    :param roots: whether each vertex is a root, one per island, see :func:`core.mesh.get_island_roots`
+    """
+    obj.data.skin_vertices[0].data.foreach_set('use_root', roots)
+
+
+def set_skin_radius(obj, radius: float):
+    """Sets the skin radius of every vertex of a mesh object, if it has skin vertex data."""
+    if len(obj.data.skin_vertices) == 0:
+        return
+    skin_data = obj.data.skin_vertices[0].data
+    skin_data.foreach_set('radius', np.full(len(skin_data) * 2, radius, dtype=np.float32))
+
+
+def set_skin_modifiers(obj, is_skin: bool, is_smooth: bool, pre_subdiv: int, post_subdiv: int):
+    """Adds the path subdivision, skin and surface subdivision modifiers to a mesh object, or removes them.
+
+    Skin vertex data (radii and roots) is a mesh layer, which the API cannot add directly:
+    adding a Skin modifier adds it, but clearing the mesh's geometry frees it again.
+    So if the layer is missing, the Skin modifier and the one after it are added again.
+
+    :param obj: mesh object
+    :param is_skin: if True, modifiers are added if missing and set up, otherwise they are removed
+    :param is_smooth: if True, the skin modifier sets smooth faces
+    :param pre_subdiv: subdivision level of the wire path
+    :param post_subdiv: subdivision level of the wire's surface
+    """
+    if not is_skin:
+        for mod in obj.modifiers[:]:
+            obj.modifiers.remove(mod)
+        return
+
+    if len(obj.data.skin_vertices) == 0:
+        for mod in obj.modifiers[1:]:
+            obj.modifiers.remove(mod)
+
+    if len(obj.modifiers) == 0:
+        obj.modifiers.new('Subdivision', 'SUBSURF')
+    if len(obj.modifiers) == 1:
+        obj.modifiers.new('Skin', 'SKIN')
+        obj.modifiers.new('Subdivision.001', 'SUBSURF')
+
+    subdiv_1, skin_mod, subdiv_2 = obj.modifiers
+    skin_mod.use_smooth_shade = is_smooth
+    subdiv_1.levels = pre_subdiv
+    subdiv_1.render_levels = pre_subdiv
+    subdiv_2.levels = post_subdiv
+    subdiv_2.render_levels = post_subdiv
+
+
 class LIGHTPAINTER_OT_Mesh(bpy.types.Operator, BaseLightPaintTool, VisibilitySettings):
     bl_idname = 'lightpainter.mesh'
     bl_label = 'Paint Mesh Light'
     bl_description = 'Adds mesh light to light surfaces specified by annotations'
 
     tool_id = 'view3d.lightpaint_mesh'
-    prev_vertices = ''
+    property_updates = {'emit_value': 'update_emit_value'}
     prev_selected = []
 
+    mesh_type: bpy.props.EnumProperty(
+        name='Mesh Type',
+        description='Shape of the mesh light',
+        items=(
+            ('HULL', 'Convex Hull', 'Convex hull around the strokes'),
+            ('SURFACE', 'Surface', 'Copy of the faces around the strokes, offset along their normals'),
+        ),
+        default='HULL'
+    )
+
     axis: axis_prop('mesh')
 
     offset: offset_prop('mesh')
 
+    surface_radius: bpy.props.FloatProperty(
+        name='Radius',
+        description='Faces within this distance of the strokes are copied',
+        min=0.0,
+        default=0.1,
+        unit='LENGTH'
+    )
+
     flatten: bpy.props.BoolProperty(
         name='Flatten',
         description='If checked, projected vertices will be flattened before processing the convex hull',
         default=True
     )
 
+    separate_strokes: bpy.props.BoolProperty(
+        name='Separate Strokes',
+        description='If checked, each stroke becomes its own convex hull, instead of one hull around all strokes',
+        default=False
+    )
+
+    max_faces: max_faces_prop('mesh light')
+
     light_color: bpy.props.FloatVectorProperty(
         name='Color',
         size=4,
@@ -84,20 +177,40 @@ class LIGHTPAINTER_OT_Mesh(bpy.types.Operator, BaseLightPaintTool, VisibilitySet
     def __init__(self, *args, **kwargs):
         bpy.types.Operator.__init__(self, *args, **kwargs)
         BaseLightPaintTool.__init__(self)
+        self.prev_hull = None
+        self.painted_hull = IncrementalHull3D()
+        self.painted_flat_hull = IncrementalFlatHull()
+        self.is_slot_mesh = False
+        """True while the mesh holds the painted hull's triangles in slot order, so it can be patched."""
+        self.is_incremental = False
+        self.stroke_hulls = dict()
+        self.painted_simplified = (None, 0, None)
+        self.surface_patches = dict()
+        self.prev_surface = ((), None)
+        self.face_count = 0
 
     def draw(self, _context):
         layout = self.layout
         layout.use_property_split = True
         layout.use_property_decorate = False  # No animation
 
-        col = layout.column(heading='Mesh')
-        col.prop(self, 'flatten')
+        layout.prop(self, 'mesh_type')
 
-        layout.separator()
+        if self.mesh_type == 'SURFACE':
+            col = layout.column(align=True)
+            col.prop(self, 'surface_radius')
+            col.prop(self, 'offset')
+        else:
+            col = layout.column(heading='Mesh')
+            col.prop(self, 'flatten')
+            col.prop(self, 'separate_strokes')
+            col.prop(self, 'max_faces')
 
-        col = layout.column(align=True)
-        col.prop(self, 'axis')
-        col.prop(self, 'offset', text='Amount')
+            layout.separator()
+
+            col = layout.column(align=True)
+            col.prop(self, 'axis')
+            col.prop(self, 'offset', text='Amount')
 
         layout.separator()
 
@@ -111,7 +224,10 @@ class LIGHTPAINTER_OT_Mesh(bpy.types.Operator, BaseLightPaintTool, VisibilitySet
     def extra_paint_controls(self, context, event):
         mouse_x = event.mouse_x
 
-        if is_event_command(event, 'OFFSET_MODE'):
+        if is_event_command(event, 'TYPE_TOGGLE'):
+            self.mesh_type = 'SURFACE' if self.mesh_type == 'HULL' else 'HULL'
+
+        elif is_event_command(event, 'OFFSET_MODE'):
             self.set_drag_attr('offset', mouse_x)
 
         elif is_event_command(event, 'POWER_MODE'):
@@ -120,6 +236,9 @@ class LIGHTPAINTER_OT_Mesh(bpy.types.Operator, BaseLightPaintTool, VisibilitySet
         elif is_event_command(event, 'FLATTEN_TOGGLE'):
             self.flatten = not self.flatten
 
+        elif is_event_command(event, 'SEPARATE_STROKES_TOGGLE'):
+            self.separate_strokes = not self.separate_strokes
+
         elif self.check_axis_event(event):
             pass  # if True, event is handled
         elif self.check_visibility_event(event):
@@ -139,6 +258,8 @@ class LIGHTPAINTER_OT_Mesh(bpy.types.Operator, BaseLightPaintTool, VisibilitySet
             return '{}: {}'.format(rpt_('Power'),self.emit_value) + get_drag_mode_header()
 
         return super().get_header_text() + (
+            '{}: {} ({}), '
+            '{}: {} ({}), '
             '{}: {} ({}), '
             '{}: {}, '
             '{}: {}, '
@@ -148,7 +269,9 @@ class LIGHTPAINTER_OT_Mesh(bpy.types.Operator, BaseLightPaintTool, VisibilitySet
             '{}: {} ({}), '  # Specular mode, visibility status
             '{}: {} ({})'  # Volume mode, visibility status
         ).format(
+            get_kmi_str('TYPE_TOGGLE'), rpt_('mesh type'), self.mesh_type,
             get_kmi_str('FLATTEN_TOGGLE'), rpt_('flatten'), 'ON' if self.flatten else 'OFF',
+            get_kmi_str('SEPARATE_STROKES_TOGGLE'), rpt_('separate strokes'), 'ON' if self.separate_strokes else 'OFF',
             get_kmi_str('OFFSET_MODE'), rpt_('offset mode'),
             get_kmi_str('POWER_MODE'), rpt_('power mode'),
             get_kmi_str('AXIS_X'), get_kmi_str('AXIS_Y'), get_kmi_str('AXIS_Z'), get_kmi_str('AXIS_REFLECT'), rpt_('axis'), self.axis,
@@ -156,64 +279,48 @@ class LIGHTPAINTER_OT_Mesh(bpy.types.Operator, BaseLightPaintTool, VisibilitySet
             get_kmi_str('VISIBILITY_TOGGLE_DIFFUSE'), rpt_('Diffuse'), rpt_('ON' if self.visible_diffuse else 'OFF'),
             get_kmi_str('VISIBILITY_TOGGLE_SPECULAR'), rpt_('Specular'), rpt_('ON' if self.visible_specular else 'OFF'),
             get_kmi_str('VISIBILITY_TOGGLE_VOLUME'), rpt_('Volume'), rpt_('ON' if self.visible_volume else 'OFF'),
-        )
+        ) + ', {}: {}'.format(rpt_('Faces'), self.face_count)
 
     @staticmethod
     def generate_mesh(vertices, normals, flatten: bool):
-        """Generates a mesh point cloud.
+        """Generates a mesh point cloud, see :func:`core.mesh.get_hull_points`.
 
-        :param vertices: list of points in world space
-        :param normals: list of normals corresponding to the vertices
+        :param vertices: array of points in world space, shape (N, 3)
+        :param normals: array of normals corresponding to the vertices, shape (N, 3)
         :param flatten: if True, flattens the mesh into a plane
 
         :exception ValueError: if calculating the normal average fails
 
-        :return: Blender mesh data
+        :return: array of mesh vertex coordinates, shape (N, 3)
         """
+        return get_hull_points(vertices, normals, flatten)
 
-        if not flatten:
-            mesh_vertices = vertices
-        else:
-            # get average, negated normal (throws ValueError if average is zero vector)
-            avg_normal = get_average_normal(normals)
-
-            farthest_point = max((v.project(avg_normal).length_squared, v) for v in vertices)[1]
-
-            mesh_vertices = tuple(v + (farthest_point - v).project(avg_normal) for v in vertices)
-
-        return mesh_vertices
-
-    def add_mesh_light(self, context, vertices, normals):
+    def add_mesh_light(self, context, hull):
         """Adds an emissive convex hull mesh.
 
         :param context: Blender context
-        :param vertices: a list of points in world space
-        :param normals: a corresponding list of normals
-
-        :return: Blender mesh object
+        :param hull: tuple of hull vertices, face sizes and face vertex indices, see :func:`get_convex_hull`
         """
-        mesh_vertices = self.generate_mesh(vertices, normals, self.flatten)
         mesh_obj = context.active_object
-        mesh = mesh_obj.data
 
-        # only updates geometry if changed
+        # only updates geometry if changed, stored results are the same objects
         # mitigates GH issue #50 in mesh constantly re-evaluating
-        if str(mesh_vertices) != self.prev_vertices:
-            mesh.clear_geometry()
-            mesh.from_pydata(mesh_vertices, [], [])
-
-            # go into edit mode, convex hull, cleanup, then get out
-            bpy.ops.object.editmode_toggle()
-            bpy.ops.mesh.convex_hull()
-            bpy.ops.object.editmode_toggle()
-
-            self.prev_vertices = str(mesh_vertices)
-
-        # get emissive material, update emission value
-        material = mesh_obj.data.materials[0]
-        tree = material.node_tree
-        emissive_node = next(node for node in tree.nodes if node.bl_idname == 'ShaderNodeEmission')
-        emissive_node.inputs[1].default_value = self.emit_value
+        if hull is not self.prev_hull:
+            if hull is self.painted_hull.result:
+                # written in slot order, so appended points only write the faces they changed
+                vertices, triangles = self.painted_hull.get_slot_faces()
+                changed = self.painted_hull.changed_slots
+                if not (self.is_slot_mesh and changed is not None and
+                        patch_triangles(mesh_obj.data, vertices, triangles, changed)):
+                    write_mesh(mesh_obj.data, vertices, np.full(len(triangles), 3, dtype=np.int32), triangles.ravel())
+                self.is_slot_mesh = True
+            else:
+                write_mesh(mesh_obj.data, *hull)
+                self.is_slot_mesh = False
+            self.prev_hull = hull
+            self.face_count = len(hull[1])
+
+        set_emit_value(mesh_obj, self.emit_value)
 
         self.set_visibility(mesh_obj)
 
@@ -222,20 +329,142 @@ class LIGHTPAINTER_OT_Mesh(bpy.types.Operator, BaseLightPaintTool, VisibilitySet
         if len(self.mouse_path) == 0:
             return
 
-        stroke_vertices = [coord for stroke in self.mouse_path for coord, normal in stroke]
-        stroke_normals = [normal for stroke in self.mouse_path for coord, normal in stroke]
-        offset_vertices, offset_normals, _ = prep_stroke(
-            context, stroke_vertices, stroke_normals,
-            self.axis, self.offset
-        )
+        def solve():
+            if self.mesh_type == 'SURFACE':
+                return self.get_surface_patches(context)
+            if self.separate_strokes:
+                return self.get_stroke_hulls(context)
+
+            stroke_vertices = [coord for stroke in self.mouse_path for coord, normal in stroke]
+            stroke_normals = [normal for stroke in self.mouse_path for coord, normal in stroke]
+            offset_vertices, offset_normals, _ = prep_stroke(
+                context, stroke_vertices, stroke_normals,
+                self.axis, self.offset
+            )
+            if self.is_incremental:
+                # patched as points are painted, then rebuilt with quads in finish_callback
+                if self.flatten:
+                    hull = self.painted_flat_hull.update(offset_vertices, offset_normals)
+                else:
+                    hull = self.painted_hull.update(offset_vertices)
+                if hull is not None:
+                    # an unchanged hull keeps the same simplified result, so it is not written again
+                    prev_hull, prev_max_faces, _ = self.painted_simplified
+                    if hull is not prev_hull or self.max_faces != prev_max_faces:
+                        self.painted_simplified = (hull, self.max_faces, simplify_hull(hull, self.max_faces))
+                    return self.painted_simplified[2]
+            hull = get_convex_hull(self.generate_mesh(offset_vertices, offset_normals, self.flatten))
+            return simplify_hull(hull, self.max_faces)
 
         try:
-            self.add_mesh_light(context, offset_vertices, offset_normals)
+            if self.mesh_type == 'SURFACE':
+                key = self.get_solve_key(context, self.mesh_type, self.offset, self.surface_radius)
+            else:
+                key = self.get_solve_key(context, self.mesh_type, self.axis, self.offset, self.flatten,
+                                         self.separate_strokes, self.max_faces, self.is_incremental)
+            self.add_mesh_light(context, self.solve_memo.get_or_compute(key, solve))
         except ValueError as e:
             self.report({'ERROR'}, str(e))
 
         return {'FINISHED'}
 
+    def get_surface_patches(self, context):
+        """Returns copies of the faces around the strokes, joined into one mesh.
+
+        Only faces around points painted or erased since the last update are searched.
+
+        :param context: Blender context
+        :return: tuple of joined vertices, face sizes and face vertex indices, see :func:`core.mesh.join_hulls`
+        """
+        depsgraph = context.evaluated_depsgraph_get()
+        emitter_name = context.active_object.name
+
+        hit_faces_by_object = dict()
+        for stroke in self.mouse_path:
+            for coord, normal in stroke:
+                location = tuple(coord)
+                if location not in self.hit_faces:
+                    self.hit_faces[location] = self.find_hit_face(context, depsgraph, coord, normal)
+                hit = self.hit_faces[location]
+                # strokes painted over the mesh light itself have no surface to copy
+                if hit is not None and hit[0] != emitter_name:
+                    hit_faces_by_object.setdefault(hit[0], dict())[location] = hit[1]
+
+        patches = []
+        for name in sorted(hit_faces_by_object.keys() | self.surface_patches.keys()):
+            if name not in self.surface_patches:
+                obj = context.scene.objects.get(name)
+                if obj is None or obj.type != 'MESH':
+                    continue
+                # kept for the whole session, as reading a large mesh again is costly
+                self.surface_patches[name] = SurfacePatch(obj, depsgraph)
+            patch = self.surface_patches[name].update(hit_faces_by_object.get(name, dict()), self.surface_radius,
+                                                      self.offset)
+            if len(patch[1]):
+                patches.append(patch)
+
+        # unchanged patches keep the same joined result, so it is not written again
+        prev_patches, _ = self.prev_surface
+        if len(patches) != len(prev_patches) or any(a is not b for a, b in zip(patches, prev_patches)):
+            self.prev_surface = (patches, join_hulls(patches))
+        return self.prev_surface[1]
+
+    def records_hit_faces(self) -> bool:
+        return self.mesh_type == 'SURFACE'
+
+    @staticmethod
+    def find_hit_face(context, depsgraph, coord, normal):
+        """Finds the object and face under a point that was not recorded while painting (e.g. from the Python API).
+
+        :return: tuple of object name and face index, or None if there is no surface under the point
+        """
+        normal = Vector(normal)
+        origin = Vector(coord) + normal * SURFACE_RAY_OFFSET
+        is_hit, _, _, face_index, obj, _ = context.scene.ray_cast(depsgraph, origin, -normal)
+        return (obj.name, face_index) if is_hit else None
+
+    def get_stroke_hulls(self, context):
+        """Returns the hull of each stroke joined into one mesh, only solving strokes that changed.
+
+        :param context: Blender context
+        :exception ValueError: if flattening a stroke whose average normal is a zero vector
+        :return: tuple of joined hull vertices, face sizes and face vertex indices, see :func:`core.mesh.join_hulls`
+        """
+        keys = self.get_stroke_solve_keys(context, self.axis, self.offset, self.flatten, self.max_faces)
+        stroke_hulls = dict()
+        for key, stroke in zip(keys, self.mouse_path):
+            if len(stroke) == 0:
+                continue
+
+            hull = self.stroke_hulls.get(key)
+            if hull is None:
+                offset_vertices, offset_normals, _ = prep_stroke(
+                    context, [coord for coord, _ in stroke], [normal for _, normal in stroke],
+                    self.axis, self.offset
+                )
+                hull = get_convex_hull(self.generate_mesh(offset_vertices, offset_normals, self.flatten))
+                hull = simplify_hull(hull, self.max_faces)
+            stroke_hulls[key] = hull
+
+        # only keeps the current strokes' hulls, so erased strokes are not kept around
+        self.stroke_hulls = stroke_hulls
+        return join_hulls(list(stroke_hulls.values()))
+
+    def update_emit_value(self, context):
+        """Writes only the emission value, e.g. when dragging it."""
+        set_emit_value(context.active_object, self.emit_value)
+
+    def invoke(self, context, event):
+        result = super().invoke(context, event)
+        self.is_incremental = 'RUNNING_MODAL' in result
+        return result
+
+    def finish_callback(self, context):
+        """Rebuilds the hull with quads, as it is only triangulated while painting."""
+        if self.is_incremental:
+            self.is_incremental = False
+            self.update_light(context)
+
     def startup_callback(self, context):
         # deselect meshes to prevent manipulation by bpy.ops
         for obj in context.selected_objects[:]:
@@ -267,10 +496,23 @@ class LIGHTPAINTER_OT_Tube_Light(bpy.types.Operator, BaseLightPaintTool, Visibil
     bl_description = 'Adds or repositions mesh tube to light surfaces specified by annotations'
 
     tool_id = 'view3d.lightpaint_tube_light'
-    prev_edges = ''
-    prev_vertices = ''
+    property_updates = {
+        'emit_value': 'update_emit_value',
+        'skin_radius': 'update_skin_radius',
+    }
     prev_selected = []
 
+    tube_type: bpy.props.EnumProperty(
+        name='Tube Type',
+        description='How the tube\'s surface is made from the wire path',
+        items=(
+            ('SKIN', 'Skin', 'Skin and subdivision modifiers around the wire path'),
+            ('SWEEP', 'Sweep', 'Circle swept along the smoothed wire path, written as mesh without modifiers'),
+            ('CURVE', 'Curve', 'Curve object with a bevel along the wire path, light to store and edit'),
+        ),
+        default='SKIN'
+    )
+
     axis: axis_prop('light tube')
 
     offset: offset_prop('light tube')
@@ -292,10 +534,26 @@ class LIGHTPAINTER_OT_Tube_Light(bpy.types.Operator, BaseLightPaintTool, Visibil
 
     is_smooth: bpy.props.BoolProperty(
         name='Smooth shading',
-        description='If checked, skin modifier will set smooth faces',
+        description='If checked, the tube\'s sides are smooth shaded',
         default=True
     )
 
+    sides: bpy.props.IntProperty(
+        name='Sides',
+        description='Number of sides around the swept tube, fewer makes lighter meshes',
+        min=3,
+        default=8,
+        soft_max=32,
+    )
+
+    curve_resolution: bpy.props.IntProperty(
+        name='Resolution',
+        description='Curve resolution along and around the wire path',
+        min=1,
+        default=4,
+        soft_max=16,
+    )
+
     pre_subdiv: bpy.props.IntProperty(
         name='Wire path Subdivision',
         description='Subdivision level to smooth the wire path',
@@ -331,12 +589,16 @@ class LIGHTPAINTER_OT_Tube_Light(bpy.types.Operator, BaseLightPaintTool, Visibil
     def __init__(self, *args, **kwargs):
         bpy.types.Operator.__init__(self, *args, **kwargs)
         BaseLightPaintTool.__init__(self)
+        self.prev_tube = None
+        self.stroke_tubes = dict()
+        """Geometry of each stroke by stroke key, so only strokes being painted or erased are solved again."""
 
     def draw(self, _context):
         layout = self.layout
         layout.use_property_split = True
         layout.use_property_decorate = False  # No animation
 
+        layout.prop(self, 'tube_type')
         layout.prop(self, 'merge_distance')
         layout.prop(self, 'skin_radius')
         layout.prop(self, 'is_smooth')
@@ -344,8 +606,14 @@ class LIGHTPAINTER_OT_Tube_Light(bpy.types.Operator, BaseLightPaintTool, Visibil
         layout.separator()
 
         col = layout.column(align=True)
-        col.prop(self, 'pre_subdiv', text='Subdivisions Path')
-        col.prop(self, 'post_subdiv', text='Surface')
+        if self.tube_type == 'CURVE':
+            col.prop(self, 'curve_resolution')
+        else:
+            col.prop(self, 'pre_subdiv', text='Subdivisions Path')
+            if self.tube_type == 'SWEEP':
+                col.prop(self, 'sides')
+            else:
+                col.prop(self, 'post_subdiv', text='Surface')
 
         layout.separator()
 
@@ -365,7 +633,10 @@ class LIGHTPAINTER_OT_Tube_Light(bpy.types.Operator, BaseLightPaintTool, Visibil
     def extra_paint_controls(self, context, event):
         mouse_x = event.mouse_x
 
-        if is_event_command(event, 'OFFSET_MODE'):
+        if is_event_command(event, 'TYPE_TOGGLE'):
+            self.tube_type = {'SKIN': 'SWEEP', 'SWEEP': 'CURVE', 'CURVE': 'SKIN'}[self.tube_type]
+
+        elif is_event_command(event, 'OFFSET_MODE'):
             self.set_drag_attr('offset', mouse_x)
 
         elif is_event_command(event, 'SIZE_MODE'):
@@ -397,6 +668,7 @@ class LIGHTPAINTER_OT_Tube_Light(bpy.types.Operator, BaseLightPaintTool, Visibil
             return '{}: {}'.format(rpt_('Power'),self.emit_value) + get_drag_mode_header()
 
         return super().get_header_text() + (
+            '{}: {} ({}), '
             '{}: {}, '
             '{}: {}, '
             '{}: {}, '
@@ -406,6 +678,7 @@ class LIGHTPAINTER_OT_Tube_Light(bpy.types.Operator, BaseLightPaintTool, Visibil
             '{}: {} ({}), '  # Specular mode, visibility status
             '{}: {} ({})'  # Volume mode, visibility status
         ).format(
+            get_kmi_str('TYPE_TOGGLE'), rpt_('tube type'), self.tube_type,
             get_kmi_str('OFFSET_MODE'), rpt_('offset mode'),
             get_kmi_str('SIZE_MODE'), rpt_('tube radius mode'),
             get_kmi_str('POWER_MODE'), rpt_('power mode'),
@@ -420,81 +693,208 @@ class LIGHTPAINTER_OT_Tube_Light(bpy.types.Operator, BaseLightPaintTool, Visibil
         if len(self.mouse_path) == 0:
             return {'CANCELLED'}
 
-        vertices = []
-        edge_idx = []
-        for stroke in self.mouse_path:
-            stroke_vertices = [coord for coord, normal in stroke]
-            stroke_normals = [normal for coord, normal in stroke]
-            offset_vertices, _, _ = prep_stroke(
-                context, stroke_vertices, stroke_normals,
-                self.axis, self.offset
-            )
+        if (context.active_object.type == 'CURVE') != (self.tube_type == 'CURVE'):
+            self.replace_tube_object(context)
 
-            vertices += offset_vertices
-            offset = 0 if len(edge_idx) == 0 else edge_idx[-1][-1] + 1
-            edge_idx += [(start_idx + offset, end_idx + offset)
-                         for start_idx, end_idx in zip(range(len(stroke) - 1),
-                                                       range(1, len(stroke)))]
+        if self.tube_type == 'SWEEP':
+            return self.update_sweep(context)
+        elif self.tube_type == 'CURVE':
+            return self.update_curve(context)
+
+        def solve_stroke(path):
+            vertices, edges = merge_by_distance(path, get_tube_edges([len(path)]), self.merge_distance)
+            return vertices, edges, get_island_roots(len(vertices), edges)
+
+        def solve():
+            return join_wires(self.get_stroke_tubes(context, solve_stroke, self.merge_distance))
+
+        tube = self.solve_memo.get_or_compute(
+            self.get_solve_key(context, self.axis, self.offset, self.merge_distance), solve)
 
         mesh_obj = context.active_object
-        mesh = mesh_obj.data
 
-        # only updates geometry if changed
+        # only updates geometry if changed, stored results are the same objects
         # mitigates GH issue #50 in mesh constantly re-evaluating
-        if str(edge_idx) != self.prev_edges or str(vertices) != self.prev_vertices:
-            mesh.clear_geometry()
-            mesh.from_pydata(vertices, edge_idx, [])
+        if tube is not self.prev_tube:
+            vertices, edges, roots = tube
+            write_edges(mesh_obj.data, vertices, edges)
+            # only adds modifiers back if the skin vertex data was freed (e.g. erasing) or after a swept tube
+            set_skin_modifiers(mesh_obj, True, self.is_smooth, self.pre_subdiv, self.post_subdiv)
+            if len(vertices):
+                set_skin_roots(mesh_obj, roots)
+                # new skin vertices start with the default radius
+                set_skin_radius(mesh_obj, self.skin_radius)
+            self.prev_tube = tube
+
+        set_emit_value(mesh_obj, self.emit_value)
+
+        self.set_visibility(mesh_obj)
+
+        return {'FINISHED'}
+
+    def update_sweep(self, context):
+        """Sweeps a circle along each stroke's smoothed path, written as mesh faces without modifiers."""
+        def solve_stroke(path):
+            path = smooth_path(thin_path(path, self.merge_distance), self.pre_subdiv)
+            return sweep_circle(path, self.skin_radius, self.sides) if len(path) > 1 else None
 
-            bpy.ops.mesh.customdata_skin_add()  # forces skin modifier data to exist/update
+        def solve():
+            tubes = [tube for tube in self.get_stroke_tubes(context, solve_stroke, self.merge_distance,
+                                                            self.pre_subdiv, self.skin_radius, self.sides)
+                     if tube is not None]
 
-            bpy.ops.object.editmode_toggle()
-            bpy.ops.mesh.remove_doubles(threshold=self.merge_distance)
-            bpy.ops.object.skin_root_mark()
-            bpy.ops.object.editmode_toggle()
+            # side quads are smooth shaded, each tube's two caps come last and stay flat
+            smooth_faces = np.concatenate([np.arange(len(face_sizes)) < len(face_sizes) - 2
+                                           for _, face_sizes, _ in tubes] or [np.empty(0, dtype=bool)])
+            return join_hulls(tubes), smooth_faces & self.is_smooth
 
-            self.prev_vertices = vertices
-            self.prev_edges = edge_idx
+        tube = self.solve_memo.get_or_compute(
+            self.get_solve_key(context, self.tube_type, self.axis, self.offset, self.merge_distance,
+                               self.pre_subdiv, self.skin_radius, self.sides, self.is_smooth), solve)
 
-        for v in mesh_obj.data.skin_vertices[0].data:
-            v.radius = [self.skin_radius, self.skin_radius]
+        mesh_obj = context.active_object
+        if len(mesh_obj.modifiers):  # switched from a skinned tube
+            set_skin_modifiers(mesh_obj, False, self.is_smooth, self.pre_subdiv, self.post_subdiv)
+
+        if tube is not self.prev_tube:
+            mesh = mesh_obj.data
+            (vertices, face_sizes, face_vertices), smooth_faces = tube
+            write_mesh(mesh, vertices, face_sizes, face_vertices)
+            mesh.polygons.foreach_set('use_smooth', smooth_faces)
+            mesh.update()
+            self.prev_tube = tube
 
-        # get emissive material, update emission value
-        material = mesh_obj.data.materials[0]
-        tree = material.node_tree
-        emissive_node = next(node for node in tree.nodes if node.bl_idname == 'ShaderNodeEmission')
-        emissive_node.inputs[1].default_value = self.emit_value
+        set_emit_value(mesh_obj, self.emit_value)
 
         self.set_visibility(mesh_obj)
 
         return {'FINISHED'}
 
-    def startup_callback(self, context):
-        # deselect meshes to prevent manipulation by bpy.ops
-        for obj in context.selected_objects[:]:
-            obj.select_set(False)
-            self.prev_selected.append(obj.name)
+    def update_curve(self, context):
+        """Writes each stroke's path as a spline of a beveled curve, without rebuilding any mesh."""
+        def solve():
+            paths = self.get_stroke_tubes(context, lambda path: thin_path(path, self.merge_distance),
+                                          self.merge_distance)
+            return [path for path in paths if len(path) > 1]
 
-        mesh = bpy.data.meshes.new(TUBE_DATA_NAME)
-        mesh_obj = bpy.data.objects.new(mesh.name, mesh)
+        tube = self.solve_memo.get_or_compute(
+            self.get_solve_key(context, self.tube_type, self.axis, self.offset, self.merge_distance), solve)
+
+        curve_obj = context.active_object
+        curve = curve_obj.data
+
+        if tube is not self.prev_tube:
+            write_splines(curve, tube, self.prev_tube or ())
+            for spline in curve.splines:
+                spline.use_smooth = self.is_smooth
+            self.prev_tube = tube
+
+        set_emit_value(curve_obj, self.emit_value)
+
+        self.set_visibility(curve_obj)
+
+        return {'FINISHED'}
+
+    def get_stroke_tubes(self, context, solve_stroke, *params) -> list:
+        """Returns the geometry of each stroke, only solving strokes that changed, e.g. the one being painted.
+
+        :param context: Blender context
+        :param solve_stroke: function taking a stroke's offset points, shape (N, 3), returning its geometry
+        :param params: hashable parameters affecting the geometry, besides the tube type, axis and offset
+        :return: list of each non-empty stroke's geometry, in stroke order
+        """
+        keys = self.get_stroke_solve_keys(context, self.tube_type, self.axis, self.offset, *params)
+        stroke_tubes = dict()
+        tubes = []
+        for key, stroke in zip(keys, self.mouse_path):
+            if len(stroke) == 0:
+                continue
+
+            tube = stroke_tubes.get(key, self.stroke_tubes.get(key))
+            if tube is None:
+                offset_vertices, _, _ = prep_stroke(
+                    context, [coord for coord, _ in stroke], [normal for _, normal in stroke],
+                    self.axis, self.offset
+                )
+                tube = solve_stroke(offset_vertices)
+            stroke_tubes[key] = tube
+            tubes.append(tube)
+
+        # only keeps the current strokes' geometry, so erased strokes are not kept around
+        self.stroke_tubes = stroke_tubes
+        return tubes
+
+    def update_emit_value(self, context):
+        """Writes only the emission value, e.g. when dragging it."""
+        set_emit_value(context.active_object, self.emit_value)
+
+    def update_skin_radius(self, context):
+        """Writes only the skin radius, e.g. when dragging it.
+        Curves only change their bevel, swept tubes are swept again instead.
+        """
+        if self.tube_type == 'SWEEP':
+            self.update_light(context)
+        elif self.tube_type == 'CURVE':
+            context.active_object.data.bevel_depth = self.skin_radius
+        else:
+            set_skin_radius(context.active_object, self.skin_radius)
+
+    def add_tube_object(self, context, material=None):
+        """Adds, selects and activates a new tube object, a curve for the curve tube type, else a mesh.
+
+        :param context: Blender context
+        :param material: emissive material to reuse, if None then a new one is made
+        :return: new object
+        """
+        if self.tube_type == 'CURVE':
+            data = bpy.data.curves.new(TUBE_DATA_NAME, 'CURVE')
+            data.dimensions = '3D'
+            data.bevel_depth = self.skin_radius
+            data.bevel_resolution = self.curve_resolution
+            data.resolution_u = self.curve_resolution
+            data.use_fill_caps = True
+        else:
+            data = bpy.data.meshes.new(TUBE_DATA_NAME)
+
+        tube_obj = bpy.data.objects.new(data.name, data)
         col = context.collection
-        col.objects.link(mesh_obj)
-        mesh_obj.select_set(True)
-        context.view_layer.objects.active = mesh_obj
+        col.objects.link(tube_obj)
+        tube_obj.select_set(True)
+        context.view_layer.objects.active = tube_obj
 
-        bpy.ops.object.modifier_add(type='SUBSURF')
-        bpy.ops.object.modifier_add(type='SKIN')
-        bpy.ops.object.modifier_add(type='SUBSURF')
+        if self.tube_type != 'CURVE':
+            set_skin_modifiers(tube_obj, self.tube_type == 'SKIN', self.is_smooth, self.pre_subdiv,
+                               self.post_subdiv)
 
-        skin_mod = next(mod for mod in mesh_obj.modifiers if mod.type == 'SKIN')
-        subdiv_1, subdiv_2 = [mod for mod in mesh_obj.modifiers if mod.type == 'SUBSURF']
+        if material is None:
+            assign_emissive_material(tube_obj, self.light_color, self.emit_value)
+        else:
+            data.materials.append(material)
+        return tube_obj
 
-        skin_mod.use_smooth_shade = self.is_smooth
-        subdiv_1.levels = self.pre_subdiv
-        subdiv_1.render_levels = self.pre_subdiv
-        subdiv_2.levels = self.post_subdiv
-        subdiv_2.render_levels = self.post_subdiv
+    def replace_tube_object(self, context):
+        """Replaces the active tube object with a new one, e.g. a mesh with a curve, as object types are fixed.
 
-        assign_emissive_material(mesh_obj, self.light_color, self.emit_value)
+        The emissive material carries over, and the previous data is removed once nothing else uses it.
+        """
+        prev_obj = context.active_object
+        prev_data = prev_obj.data
+        prev_data_blocks = bpy.data.curves if prev_obj.type == 'CURVE' else bpy.data.meshes
+        material = prev_data.materials[0] if len(prev_data.materials) else None
+
+        self.add_tube_object(context, material)
+        bpy.data.objects.remove(prev_obj, do_unlink=True)
+        if prev_data.users == 0:
+            prev_data_blocks.remove(prev_data)
+        self.prev_tube = None
+
+    def startup_callback(self, context):
+        # deselect objects, leaving only our new one selected
+        for obj in context.selected_objects[:]:
+            obj.select_set(False)
+            self.prev_selected.append(obj.name)
+
+        self.add_tube_object(context)
 
     def cancel(self, context):
         super().cancel(context)
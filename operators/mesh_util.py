@@ -0,0 +1,283 @@
+from math import radians
+
+import bmesh
+import bpy
+from mathutils.bvhtree import BVHTree
+import numpy as np
+
+from ..core.mesh import extract_faces
+
+IS_BPY_V3 = bpy.app.version < (4, 0, 0)
+
+HULL_DATA_NAME = 'LightPaint_Hull'
+"""Name of the temporary mesh convex hulls are passed through, removed once they are computed."""
+JOIN_ANGLE = radians(40.0)
+"""Face and shape angle thresholds for joining hull triangles into quads, the Convex Hull operator's defaults."""
+SURFACE_CELL_FRACTION = 0.25
+"""Edge length of the grid cells surface patches group painted points in, relative to the surface radius.
+Points in a cell share one search for faces around it, which may also copy faces up to half a cell diagonal
+(about 0.22 times the radius) farther than the radius."""
+HALF_CELL_DIAGONAL = 3 ** 0.5 / 2
+"""Distance from the center of a grid cell to its corners, relative to its edge length."""
+
+
+def get_convex_hull(points: np.ndarray):
+    """Computes the convex hull of points in a standalone BMesh, without entering edit mode.
+
+    Like the Convex Hull operator, points inside the hull are dropped and triangles are joined into quads.
+    Like it too, points that are all coplanar (or fewer than four) are kept as they are, with no faces.
+    Points are passed to and read back from the BMesh through a temporary mesh, with bulk array copies.
+
+    :param points: points in world space, shape (N, 3)
+    :return: tuple of (vertex coordinates, shape (V, 3), vertex count of each face, shape (F,),
+        vertex indices of every face in order, shape (sum of face sizes,))
+    """
+    no_faces = points, np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+    mesh = bpy.data.meshes.new(HULL_DATA_NAME)
+    bm = bmesh.new()
+    try:
+        mesh.vertices.add(len(points))
+        mesh.vertices.foreach_set('co', np.asarray(points, dtype=np.float32).ravel())
+        bm.from_mesh(mesh)
+
+        try:
+            result = bmesh.ops.convex_hull(bm, input=bm.verts, use_existing_faces=False)
+        except RuntimeError:  # fewer than four points
+            return no_faces
+        if not any(isinstance(face, bmesh.types.BMFace) for face in result['geom']):  # coplanar points
+            return no_faces
+
+        unused = [vert for vert in result['geom_interior'] + result['geom_unused']
+                  if isinstance(vert, bmesh.types.BMVert)]
+        bmesh.ops.delete(bm, geom=unused, context='VERTS')
+        bmesh.ops.join_triangles(bm, faces=bm.faces[:], angle_face_threshold=JOIN_ANGLE,
+                                 angle_shape_threshold=JOIN_ANGLE)
+
+        bm.to_mesh(mesh)
+        vertices = get_mesh_array(mesh.vertices, 'co', np.float32, 3).astype(np.float64)
+        face_sizes = get_mesh_array(mesh.polygons, 'loop_total', np.int32)
+        face_vertices = get_mesh_array(mesh.loops, 'vertex_index', np.int32)
+        return vertices, face_sizes, face_vertices
+    finally:
+        bm.free()
+        bpy.data.meshes.remove(mesh)
+
+
+def write_mesh(mesh, vertices: np.ndarray, face_sizes: np.ndarray, face_vertices: np.ndarray):
+    """Replaces a mesh's geometry with bulk array writes, instead of per-element Python objects.
+
+    :param mesh: Blender mesh data
+    :param vertices: vertex coordinates, shape (V, 3)
+    :param face_sizes: vertex count of each face, shape (F,)
+    :param face_vertices: vertex indices of every face in order, shape (sum of face sizes,)
+    """
+    mesh.clear_geometry()
+
+    mesh.vertices.add(len(vertices))
+    mesh.vertices.foreach_set('co', np.asarray(vertices, dtype=np.float32).ravel())
+
+    mesh.loops.add(len(face_vertices))
+    mesh.loops.foreach_set('vertex_index', np.asarray(face_vertices, dtype=np.int32))
+
+    mesh.polygons.add(len(face_sizes))
+    loop_starts = np.zeros(len(face_sizes), dtype=np.int32)
+    np.cumsum(face_sizes[:-1], out=loop_starts[1:])
+    mesh.polygons.foreach_set('loop_start', loop_starts)
+    if IS_BPY_V3:  # computed from loop starts since Blender 4.0
+        mesh.polygons.foreach_set('loop_total', np.asarray(face_sizes, dtype=np.int32))
+
+    mesh.update(calc_edges=True)
+
+
+def patch_triangles(mesh, vertices: np.ndarray, triangles: np.ndarray, changed: np.ndarray) -> bool:
+    """Updates a triangle mesh in place, only writing new vertices and new or changed triangles.
+
+    Replaced triangles leave their edges loose, until there are as many loose edges as used ones
+    and the mesh has to be written in full again.
+
+    :param mesh: Blender mesh data, written by :func:`write_mesh` from a prefix of the vertices and triangles
+    :param vertices: vertex coordinates, shape (V, 3), starting with the mesh's vertices
+    :param triangles: vertex indices of each triangle, shape (F, 3)
+    :param changed: indices of the mesh's triangles that changed since it was written
+    :return: False if the mesh cannot be patched (e.g. it lost vertices or triangles), and must be written in full
+    """
+    vertex_count, face_count = len(mesh.vertices), len(mesh.polygons)
+    if (len(vertices) < vertex_count or len(triangles) < face_count or len(mesh.loops) != face_count * 3
+            or len(mesh.edges) > len(triangles) * 3):  # closed triangle meshes have 1.5 edges per face
+        return False
+
+    mesh.vertices.add(len(vertices) - vertex_count)
+    for index in range(vertex_count, len(vertices)):
+        mesh.vertices[index].co = vertices[index]
+
+    mesh.loops.add((len(triangles) - face_count) * 3)
+    mesh.polygons.add(len(triangles) - face_count)
+    for index in range(face_count, len(triangles)):
+        polygon = mesh.polygons[index]
+        polygon.loop_start = index * 3
+        if IS_BPY_V3:
+            polygon.loop_total = 3
+
+    loops = mesh.loops
+    for index in np.union1d(changed, np.arange(face_count, len(triangles))).tolist():
+        for corner, vertex in enumerate(triangles[index].tolist()):
+            loops[index * 3 + corner].vertex_index = vertex
+
+    mesh.update(calc_edges=True)
+    return True
+
+
+def write_edges(mesh, vertices: np.ndarray, edges: np.ndarray):
+    """Replaces a mesh's geometry with loose edges, with bulk array writes.
+
+    Vertices and edges are added in place, which keeps vertex layers such as skin data.
+    Meshes can only lose vertices, edges or faces by clearing their geometry,
+    which frees those layers too (see mesh_tool's set_skin_modifiers).
+
+    :param mesh: Blender mesh data
+    :param vertices: vertex coordinates, shape (V, 3)
+    :param edges: pairs of vertex indices, shape (E, 2)
+    """
+    if len(vertices) < len(mesh.vertices) or len(edges) < len(mesh.edges) or len(mesh.polygons):
+        mesh.clear_geometry()
+
+    mesh.vertices.add(len(vertices) - len(mesh.vertices))
+    mesh.vertices.foreach_set('co', np.asarray(vertices, dtype=np.float32).ravel())
+
+    mesh.edges.add(len(edges) - len(mesh.edges))
+    mesh.edges.foreach_set('vertices', np.asarray(edges, dtype=np.int32).ravel())
+
+    mesh.update()
+
+
+def write_splines(curve, paths, prev_paths=()):
+    """Writes paths as NURBS splines of a curve, with one bulk coordinate write per spline.
+
+    Splines are only rebuilt if paths were removed or shortened, e.g. by erasing:
+    otherwise existing splines get the points appended to their paths.
+
+    :param curve: Blender curve data
+    :param paths: path points of each spline, each of shape (N, 3) with at least two points
+    :param prev_paths: paths written last time, splines of the same path objects are not written again
+    """
+    splines = curve.splines
+    if len(splines) > len(paths) or any(len(spline.points) > len(path) for spline, path in zip(splines, paths)):
+        splines.clear()
+        prev_paths = ()
+
+    for idx, path in enumerate(paths):
+        if idx < len(prev_paths) and path is prev_paths[idx]:
+            continue
+
+        spline = splines[idx] if idx < len(splines) else splines.new('NURBS')
+        spline.points.add(len(path) - len(spline.points))
+
+        coords = np.ones((len(path), 4), dtype=np.float32)  # homogeneous coordinates, with unit weights
+        coords[:, :3] = path
+        spline.points.foreach_set('co', coords.ravel())
+        spline.order_u = min(4, len(path))
+        spline.use_endpoint_u = True  # reaches both ends of the stroke
+
+
+def get_mesh_array(collection, attr: str, dtype, width: int = 1) -> np.ndarray:
+    """Reads an attribute of every item of a mesh collection (e.g. vertices) with a single foreach_get."""
+    values = np.empty(len(collection) * width, dtype=dtype)
+    collection.foreach_get(attr, values)
+    return values.reshape(-1, width) if width > 1 else values
+
+
+class SurfacePatch:
+    """Faces of an object around painted points, kept up to date as points are painted or erased.
+
+    The object's geometry is read once with foreach_get, so later updates only cost as much as the points
+    painted or erased since, and the faces around them.
+    Points are grouped in grid cells, see :data:`SURFACE_CELL_FRACTION`: faces around a cell are only searched
+    for the first point painted in it, and reused by every other point in it, even across updates.
+    """
+
+    def __init__(self, obj, depsgraph):
+        obj_eval = obj.evaluated_get(depsgraph)
+        mesh = obj_eval.data
+        self.matrix_world = np.array(obj_eval.matrix_world, dtype=np.float64)
+        self.matrix_inverse = np.linalg.inv(self.matrix_world)
+        # face indices of ray casts and of this tree both refer to the evaluated mesh
+        self.bvh = BVHTree.FromObject(obj, depsgraph)
+
+        self.coords = get_mesh_array(mesh.vertices, 'co', np.float32, 3).astype(np.float64)
+        self.normals = get_mesh_array(mesh.vertices, 'normal', np.float32, 3).astype(np.float64)
+        self.loop_starts = get_mesh_array(mesh.polygons, 'loop_start', np.int32)
+        self.loop_totals = get_mesh_array(mesh.polygons, 'loop_total', np.int32)
+        self.loop_vertices = get_mesh_array(mesh.loops, 'vertex_index', np.int32)
+
+        self.face_counts = np.zeros(len(self.loop_starts), dtype=np.int32)
+        """Number of painted points around each face."""
+        self.point_faces = dict()
+        """Indices of faces around each painted point, by point location."""
+        self.cell_faces = dict()
+        """Indices of faces around each grid cell holding painted points, by cell coordinates."""
+        self.radius = 0.0
+        self.offset = 0.0
+        self.result = None
+
+    def update(self, hit_faces: dict, radius: float, offset: float):
+        """Returns the faces around given points, only searching around points painted since the last update.
+
+        :param hit_faces: index of the face under each point, by point location in world space
+        :param radius: distance from points within which faces are copied, in world space
+        :param offset: distance faces are moved along their vertex normals
+        :return: tuple of (vertex coordinates, face sizes, face vertex indices), see :func:`core.mesh.extract_faces`.
+            The same tuple as the previous update if nothing changed
+        """
+        if radius != self.radius:
+            self.face_counts[:] = 0
+            self.point_faces.clear()
+            self.cell_faces.clear()
+            self.radius = radius
+
+        is_changed = self.result is None or offset != self.offset
+        self.offset = offset
+
+        for location in self.point_faces.keys() - hit_faces.keys():
+            faces = self.point_faces.pop(location)
+            self.face_counts[faces] -= 1
+            is_changed |= not np.all(self.face_counts[faces])
+
+        new_locations = [location for location in hit_faces if location not in self.point_faces]
+        if new_locations:
+            local_points = np.array(new_locations) @ self.matrix_inverse[:3, :3].T + self.matrix_inverse[:3, 3]
+            # the tree is in local space, so the radius is scaled on average
+            local_radius = radius * 3 / np.linalg.norm(self.matrix_world[:3, :3], axis=0).sum()
+            cell_size = local_radius * SURFACE_CELL_FRACTION
+            cells = (np.floor(local_points / cell_size) if cell_size > 0.0 else np.zeros_like(local_points)).astype(
+                np.int64)
+            for location, cell in zip(new_locations, map(tuple, cells.tolist())):
+                cell_faces = self.cell_faces.get(cell)
+                if cell_faces is None:
+                    # without a radius, only the face under each point is copied
+                    cell_faces = (self.find_cell_faces(cell, cell_size, local_radius) if cell_size > 0.0 else
+                                  np.empty(0, dtype=np.intp))
+                    self.cell_faces[cell] = cell_faces
+                faces = np.union1d(cell_faces, (hit_faces[location],))
+                is_changed |= not np.all(self.face_counts[faces])
+                self.face_counts[faces] += 1
+                self.point_faces[location] = faces
+
+        if is_changed:
+            self.result = extract_faces(self.coords, self.normals, self.loop_starts, self.loop_totals,
+                                        self.loop_vertices, np.flatnonzero(self.face_counts), self.matrix_world,
+                                        offset)
+        return self.result
+
+    def find_cell_faces(self, cell: tuple, cell_size: float, local_radius: float) -> np.ndarray:
+        """Returns the faces within a radius of any point of a grid cell, in local space.
+
+        :param cell: integer cell coordinates
+        :param cell_size: edge length of cells
+        :param local_radius: distance from points within which faces are copied
+        :return: face indices
+        """
+        center = ((np.array(cell) + 0.5) * cell_size).tolist()
+        # from the cell's center, every point of the cell is within half its diagonal
+        nearest = self.bvh.find_nearest_range(center, local_radius + cell_size * HALF_CELL_DIAGONAL)
+        faces = {index for _, _, index, _ in nearest}
+        return np.fromiter(faces, dtype=np.intp, count=len(faces))
@@ -0,0 +1,1007 @@
+from math import radians
+import os
+import time
+
+import bpy
+from mathutils import Vector
+import numpy as np
+
+from .lamp_util import EPSILON, is_blocked
+from .. import __package__ as base_package
+from ..core.depth_map import DEFAULT_RESOLUTION, DepthMaps, get_footprint
+from ..core.horizon import AZIMUTH_BINS, compute_horizons, lookup_blocked
+from ..core.mesh_cache import get_key_digest, MeshCache
+from ..core.occluders import OccluderBounds, Occluders
+from ..core.occlusion_pool import get_pool
+from ..core.sun import (calc_rank, get_best_column, get_candidate_columns, get_sample_directions, NO_DIRECTION_ERROR,
+                        PI_OVER_2)
+from ..core.stroke import to_points
+
+OCCLUDER_TYPES = {'MESH', 'CURVE', 'SURFACE', 'META', 'FONT'}
+"""Object types exported as occluders for worker processes."""
+GENERATED_PREFIX = 'LightPaint_'
+"""Name prefix of objects and data made by Light Painter (e.g. flags, emissive hulls and tubes)."""
+NON_OCCLUDING_TYPES = {'LIGHT', 'CAMERA', 'SPEAKER', 'LIGHT_PROBE', 'LIGHTPROBE'}
+"""Object types that never block a ray cast, so their updates never invalidate a visibility cache."""
+
+OCCLUSION_METHODS = {'OCCLUSION', 'DEPTH_MAP', 'AUTO'}
+"""Methods that test every sample direction, by ray casting or depth maps."""
+DEPTH_MAP_METHODS = {'DEPTH_MAP', 'AUTO'}
+AUTO_DEPTH_MAP_POINTS = 2000
+"""Strokes with at least this many points use depth maps instead of rays when the method is automatic."""
+
+MAX_RAY_DISTANCE = 1.70141e+38
+"""Length of rays cast without occluder bounds."""
+
+MESH_CACHE_DIR = 'mesh_cache'
+MEGABYTE = 1 << 20
+
+SLICE_TIME_BUDGET = 0.008
+"""Seconds of occlusion testing per timer slice while painting, to keep the viewport responsive."""
+MIN_TRACE_CHUNK = 64
+"""Points in the first chunk a progressive occlusion job traces, before it has timed any tracing."""
+
+
+def scene_blocked_tracer(scene, depsgraph, is_occluder=None, bounds: OccluderBounds = None):
+    """Returns a tracer that tests occlusion with the scene's own ray casting.
+
+    :param scene: scene
+    :param depsgraph: the scene dependency graph
+    :param is_occluder: function checking if a hit object blocks rays, if None then every object does
+    :param bounds: occluder bounds to skip and shorten rays with, if None then rays are unbounded
+    :return: function taking points (N, 3) and directions (D, 3), returning a (N, D) array, True if blocked
+    """
+    cast = scene_ray_tracer(scene, depsgraph, is_occluder, bounds)
+
+    def trace(points: np.ndarray, directions: np.ndarray) -> np.ndarray:
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)
+        return cast(np.repeat(points, len(directions), axis=0), np.tile(directions, (len(points), 1))).reshape(
+            len(points), len(directions))
+
+    return trace
+
+
+def scene_ray_tracer(scene, depsgraph, is_occluder=None, bounds: OccluderBounds = None):
+    """Returns a ray caster that tests occlusion with the scene's own ray casting.
+
+    Rays that enter no occluder's bounds are never cast, the others only as far as the bounds they enter.
+
+    :param scene: scene
+    :param depsgraph: the scene dependency graph
+    :param is_occluder: function checking if a hit object blocks rays, if None then every object does
+    :param bounds: occluder bounds to skip and shorten rays with, if None then rays are unbounded
+    :return: function taking points (R, 3) and directions (R, 3), returning a (R,) array, True if blocked
+    """
+    def cast(points: np.ndarray, directions: np.ndarray) -> np.ndarray:
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)
+        blocked = np.zeros(len(points), dtype=bool)
+
+        if bounds is None:
+            ray_lengths = np.full(len(points), MAX_RAY_DISTANCE)
+        else:
+            ray_lengths = bounds.get_ray_lengths(points + directions * EPSILON, directions)
+
+        for idx in np.flatnonzero(ray_lengths > 0.0):
+            blocked[idx] = is_blocked(scene, depsgraph, Vector(points[idx]), Vector(directions[idx]),
+                                      max_distance=ray_lengths[idx], is_occluder=is_occluder)
+        return blocked
+
+    return cast
+
+
+def is_generated(obj) -> bool:
+    """Checks if an object was made by Light Painter."""
+    return obj.name.startswith(GENERATED_PREFIX) or (
+            obj.data is not None and obj.data.name.startswith(GENERATED_PREFIX))
+
+
+def iter_occluder_instances(depsgraph, is_occluder=None):
+    """Yields each visible instance of geometry that can block rays.
+
+    :param depsgraph: the scene dependency graph
+    :param is_occluder: function checking if an object blocks rays, if None then every object does
+    :return: generator of (evaluated object, world matrix as a NumPy array)
+    """
+    for instance in depsgraph.object_instances:
+        obj = instance.object
+        if obj.type in OCCLUDER_TYPES and (is_occluder is None or is_occluder(obj)):
+            yield obj, np.array(instance.matrix_world)
+
+
+def get_occluder_bounds(depsgraph, is_occluder=None) -> OccluderBounds:
+    """Returns world space bounds of each instance of geometry that can block rays.
+
+    :param depsgraph: the scene dependency graph
+    :param is_occluder: function checking if an object blocks rays, if None then every object does
+    """
+    corners = np.array([
+        np.array(obj.bound_box) @ matrix[:3, :3].T + matrix[:3, 3]
+        for obj, matrix in iter_occluder_instances(depsgraph, is_occluder)
+    ]).reshape(-1, 8, 3)
+    return OccluderBounds(corners.min(axis=1), corners.max(axis=1))
+
+
+def get_object_geometry(obj):
+    """Returns vertices and triangles of an evaluated object in local space.
+
+    :param obj: evaluated object
+    :return: tuple of vertex coordinates, shape (V, 3), and vertex indices of each triangle, shape (T, 3)
+    """
+    mesh = obj.to_mesh()
+    try:
+        mesh.calc_loop_triangles()
+        vertices = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+        mesh.vertices.foreach_get('co', vertices)
+        triangles = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int32)
+        mesh.loop_triangles.foreach_get('vertices', triangles)
+    finally:
+        obj.to_mesh_clear()
+
+    return vertices.reshape(-1, 3), triangles.reshape(-1, 3)
+
+
+def get_object_triangles(obj) -> np.ndarray:
+    """Returns the triangle soup of an evaluated object in local space, shape (T, 3, 3)."""
+    vertices, triangles = get_object_geometry(obj)
+    return vertices[triangles]
+
+
+class OccluderMeshes:
+    """Triangles exported from each occluder object, reused until the object's geometry changes.
+
+    Geometry updates are counted per object since the file was loaded. Objects not updated since then
+    still match their file on disk, so they are also keyed for the mesh cache, which reuses their triangles
+    and BVHs across sessions without exporting them again.
+    """
+
+    def __init__(self):
+        self.generations = dict()
+        """Geometry updates of each object since the file was loaded, by full name."""
+        self.meshes = dict()
+        """Generation, triangles and mesh cache digest last exported from each object, by full name."""
+        self.is_tracked = False
+        """True once every update since the file was loaded is counted (i.e. not registered mid-session)."""
+        self.skip_update = False
+
+    def clear(self):
+        self.generations.clear()
+        self.meshes.clear()
+
+    def on_load(self):
+        self.clear()
+        self.is_tracked = True
+        # the first evaluation after loading reports every object as updated
+        self.skip_update = True
+
+    def on_depsgraph_update(self, depsgraph):
+        if self.skip_update:
+            self.skip_update = False
+            return
+
+        for update in depsgraph.updates:
+            if isinstance(update.id, bpy.types.Object) and update.is_updated_geometry:
+                name = update.id.original.name_full
+                self.generations[name] = self.generations.get(name, 0) + 1
+
+    def get_persistent_key(self, obj, generation: int):
+        """Returns a key identifying an object's geometry across sessions, None if it may differ from its file.
+
+        :param obj: original object
+        :param generation: geometry updates of the object since the file was loaded
+        :return: tuple of the file's path and modification time, and the object's full name
+        """
+        if generation:
+            return None
+
+        library = obj.library
+        if library is not None:
+            filepath = bpy.path.abspath(library.filepath, library=library.library)
+        elif self.is_tracked or not bpy.data.is_dirty:
+            filepath = bpy.data.filepath
+        else:
+            return None
+
+        if not filepath:
+            return None  # never saved
+        try:
+            mtime = os.path.getmtime(filepath)
+        except OSError:
+            return None
+        return os.path.normcase(os.path.abspath(filepath)), mtime, obj.name_full
+
+    def get_triangles(self, obj, mesh_cache: MeshCache = None) -> tuple:
+        """Returns an evaluated object's triangles, exported once until its geometry changes.
+
+        :param obj: evaluated object
+        :param mesh_cache: cache to load the triangles from, or store them to once exported
+        :return: tuple of triangles in local space, shape (T, 3, 3),
+            and the object's mesh cache digest, None if it is not cached
+        """
+        original = obj.original
+        name = original.name_full
+        generation = self.generations.get(name, 0)
+
+        mesh = self.meshes.get(name)
+        if mesh is None or mesh[0] != generation:
+            key = self.get_persistent_key(original, generation)
+            digest = None if key is None else get_key_digest(key)
+            if mesh_cache is None or digest is None:
+                triangles = get_object_triangles(obj)
+            else:
+                triangles = mesh_cache.get_triangles(digest, lambda: get_object_triangles(obj))
+            mesh = (generation, triangles, digest)
+            self.meshes[name] = mesh
+
+        return mesh[1], mesh[2]
+
+
+OCCLUDER_MESHES = OccluderMeshes()
+"""Occluder triangles shared by all tools, so scene updates only export the objects that changed."""
+
+
+def get_mesh_cache(context):
+    """Returns the on-disk cache of occluder meshes and their BVHs, None if disabled in the preferences."""
+    cache_size = context.preferences.addons[base_package].preferences.mesh_cache_size
+    if cache_size == 0:
+        return None
+    return MeshCache(get_cache_directory(), cache_size * MEGABYTE)
+
+
+def get_cache_directory() -> str:
+    """Returns the directory of the mesh cache, in the add-on's user directory so it persists across sessions."""
+    try:
+        return bpy.utils.extension_path_user(base_package, path=MESH_CACHE_DIR, create=True)
+    except (AttributeError, ValueError):
+        # legacy add-on, or Blender versions before extensions
+        return bpy.utils.user_resource('DATAFILES', path=os.path.join('light_painter', MESH_CACHE_DIR), create=True)
+
+
+def export_occluders(depsgraph, is_occluder=None, mesh_cache: MeshCache = None) -> Occluders:
+    """Exports all visible geometry as occluders, meshes are shared between instances of the same object.
+
+    Objects are only exported again once their geometry changes, see :class:`OccluderMeshes`.
+    Mesh BVHs are left to whoever casts rays against them, see :meth:`OcclusionSettings.get_occlusion_pool`.
+
+    :param depsgraph: the scene dependency graph
+    :param is_occluder: function checking if an object blocks rays, if None then every object does
+    :param mesh_cache: cache of meshes and their BVHs across sessions, if None then meshes are only kept in memory
+    :return: occluders for depth maps, ray casting or worker processes
+    """
+    mesh_indices = dict()
+    meshes = []
+    mesh_digests = []
+    instance_meshes = []
+    instance_matrices = []
+
+    for obj, matrix in iter_occluder_instances(depsgraph, is_occluder):
+        if obj.name not in mesh_indices:
+            triangles, digest = OCCLUDER_MESHES.get_triangles(obj, mesh_cache)
+            mesh_indices[obj.name] = len(meshes) if len(triangles) else None
+            if len(triangles):
+                meshes.append(triangles)
+                mesh_digests.append(digest)
+
+        mesh_index = mesh_indices[obj.name]
+        if mesh_index is not None:
+            instance_meshes.append(mesh_index)
+            instance_matrices.append(matrix)
+
+    return Occluders(meshes, np.array(instance_meshes), np.array(instance_matrices).reshape(-1, 4, 4),
+                     mesh_cache=mesh_cache, mesh_digests=mesh_digests)
+
+
+def has_occluder_updates(depsgraph) -> bool:
+    """Checks if a depsgraph update moved or changed any geometry that could block rays."""
+    # lamps and worlds (such as the ones edited by our tools) do not block rays
+    return any(
+        isinstance(update.id, bpy.types.Object) and update.id.type not in NON_OCCLUDING_TYPES and
+        (update.is_updated_geometry or update.is_updated_transform)
+        for update in depsgraph.updates
+    )
+
+
+class PointCache:
+    """Base for caches holding a row of results per stroke point.
+
+    Rows are keyed by point coordinates, so each point is only computed once,
+    no matter how many times the stroke is updated. Erased points are dropped,
+    and any update to occluding geometry clears the cache.
+    """
+
+    row_arrays = ()
+    """Names of the arrays holding one row per point."""
+
+    def __init__(self):
+        self.occluder_key = None
+        self.invalidate()
+
+    def invalidate(self):
+        """Forgets all points and exported occluders (e.g. when the scene geometry changes)."""
+        self.occluders = None
+        self.bounds = None
+        self.depth_maps = None
+        self.clear()
+
+    def set_occluder_key(self, occluder_key):
+        """Sets which objects block rays, invalidating the cache if they changed."""
+        if occluder_key != self.occluder_key:
+            self.occluder_key = occluder_key
+            self.invalidate()
+
+    def clear(self):
+        """Forgets all points."""
+        self.rows = dict()
+        self.points = None
+        for name in self.row_arrays:
+            setattr(self, name, self.new_rows(name, 0))
+
+    def new_rows(self, name: str, count: int) -> np.ndarray:
+        """Returns rows for new points of a given array, not yet computed."""
+        raise NotImplementedError
+
+    def get_rows(self, vertices) -> np.ndarray:
+        """Maps vertices to cache rows, adding new points and dropping erased ones.
+
+        :param vertices: list of points in world space
+        :return: array of row indices, one per vertex
+        """
+        keys = [tuple(v) for v in vertices]
+        unique_keys = dict.fromkeys(keys)
+
+        kept_keys = [key for key in self.rows if key in unique_keys]
+        if len(kept_keys) != len(self.rows):
+            kept_rows = [self.rows[key] for key in kept_keys]
+            for name in self.row_arrays:
+                setattr(self, name, getattr(self, name)[kept_rows])
+            self.rows = {key: row for row, key in enumerate(kept_keys)}
+            self.points = None
+
+        new_keys = [key for key in unique_keys if key not in self.rows]
+        if new_keys:
+            self.rows.update((key, row) for row, key in enumerate(new_keys, start=len(self.rows)))
+            self.points = None
+            for name in self.row_arrays:
+                setattr(self, name, np.concatenate((getattr(self, name), self.new_rows(name, len(new_keys)))))
+
+        return np.fromiter((self.rows[key] for key in keys), dtype=np.intp, count=len(keys))
+
+    def get_points(self) -> np.ndarray:
+        """Returns cached points in row order, shape (N, 3), converted once until points are added or dropped."""
+        if self.points is None:
+            self.points = np.array(list(self.rows), dtype=float).reshape(-1, 3)
+        return self.points
+
+    def watch(self):
+        """Starts invalidating the cache whenever occluding geometry changes."""
+        handlers = bpy.app.handlers.depsgraph_update_post
+        if self.on_depsgraph_update not in handlers:
+            handlers.append(self.on_depsgraph_update)
+
+    def unwatch(self):
+        """Stops listening to scene updates."""
+        handlers = bpy.app.handlers.depsgraph_update_post
+        if self.on_depsgraph_update in handlers:
+            handlers.remove(self.on_depsgraph_update)
+
+    def on_depsgraph_update(self, _scene, depsgraph):
+        if has_occluder_updates(depsgraph):
+            self.invalidate()
+
+
+class VisibilityCache(PointCache):
+    """Caches which stroke points are blocked in which sample directions.
+
+    Columns follow the fixed direction set, so each point is only traced once per direction.
+    """
+
+    row_arrays = ('blocked', 'traced')
+
+    def __init__(self):
+        self.directions_key = None
+        self.directions = np.empty((0, 3))
+        self.tracer_key = None
+        super().__init__()
+
+    def new_rows(self, _name: str, count: int) -> np.ndarray:
+        return np.zeros((count, len(self.directions)), dtype=bool)
+
+    def set_directions(self, elevation_clamp: float, latitude_samples: int, longitude_samples: int) -> np.ndarray:
+        """Sets the direction set, clearing traced points if it changed.
+
+        :return: array of sample directions
+        """
+        directions_key = (elevation_clamp, latitude_samples, longitude_samples)
+        if directions_key != self.directions_key:
+            self.directions_key = directions_key
+            self.directions = get_sample_directions(elevation_clamp, latitude_samples, longitude_samples)
+            self.clear()
+
+        return self.directions
+
+    def set_tracer_key(self, tracer_key):
+        """Sets how points are traced (e.g. rays, or depth maps of a given resolution and footprint),
+        clearing traced points if it changed, so results of different tracers are never mixed.
+        """
+        if tracer_key != self.tracer_key:
+            self.tracer_key = tracer_key
+            self.clear()
+
+    def trace_missing(self, rows: np.ndarray, columns: np.ndarray, trace):
+        """Traces any (row, direction) pair not yet in the cache.
+
+        :param rows: row indices to check
+        :param columns: direction indices to check
+        :param trace: function taking points (N, 3) and directions (D, 3), returning a (N, D) blocked array
+        """
+        points = self.get_points()
+
+        # first directions no point has seen yet (e.g. the preferred normal moved),
+        # then points that have not seen the remaining directions (e.g. newly painted)
+        missing = ~self.traced[np.ix_(rows, columns)]
+        new_columns = columns[missing.all(axis=0)]
+        if len(new_columns):
+            self._trace_block(points, rows, new_columns, trace)
+
+        missing = ~self.traced[np.ix_(rows, columns)]
+        missing_rows = rows[missing.any(axis=1)]
+        missing_columns = columns[missing.any(axis=0)]
+        if len(missing_rows):
+            self._trace_block(points, missing_rows, missing_columns, trace)
+
+    def _trace_block(self, points, rows, columns, trace):
+        block = np.ix_(rows, columns)
+        self.blocked[block] = trace(points[rows], self.directions[columns])
+        self.traced[block] = True
+
+    def get_blocked(self, vertices, columns: np.ndarray, trace) -> np.ndarray:
+        """Returns occlusion of each vertex for each given direction, tracing only what is not cached.
+
+        :param vertices: list of points in world space
+        :param columns: direction indices to check
+        :param trace: function taking points (N, 3) and directions (D, 3), returning a (N, D) blocked array
+        :return: (len(vertices), len(columns)) array, True if blocked
+        """
+        rows = self.get_rows(vertices)
+        unique_rows = np.unique(rows)
+        self.trace_missing(unique_rows, columns, trace)
+        return self.blocked[np.ix_(rows, columns)]
+
+
+class HorizonMapCache(PointCache):
+    """Caches the horizon map of each stroke point: the highest occluded elevation per azimuth bin.
+
+    Unlike :class:`VisibilityCache`, maps do not depend on the sample settings or average normal,
+    so any of them can change without casting new rays.
+    """
+
+    row_arrays = ('horizons',)
+
+    def new_rows(self, _name: str, count: int) -> np.ndarray:
+        return np.full((count, AZIMUTH_BINS), np.nan)
+
+    def get_horizons(self, vertices, cast) -> np.ndarray:
+        """Returns the horizon map of each vertex, computing only those not cached.
+
+        :param vertices: list of points in world space
+        :param cast: function taking points (R, 3) and directions (R, 3), returning a (R,) blocked array
+        :return: horizon elevations, shape (len(vertices), AZIMUTH_BINS)
+        """
+        rows = self.get_rows(vertices)
+        missing_rows = np.flatnonzero(np.isnan(self.horizons[:, 0]))
+        if len(missing_rows):
+            self.horizons[missing_rows] = compute_horizons(self.get_points()[missing_rows], cast)
+        return self.horizons[rows]
+
+
+HORIZON_MAPS = HorizonMapCache()
+"""Horizon maps shared by all tools, kept across operator runs so redo panel changes are instant."""
+
+
+@bpy.app.handlers.persistent
+def invalidate_horizon_maps(_scene, depsgraph):
+    OCCLUDER_MESHES.on_depsgraph_update(depsgraph)
+    if has_occluder_updates(depsgraph):
+        HORIZON_MAPS.invalidate()
+
+
+@bpy.app.handlers.persistent
+def clear_horizon_maps(*_args):
+    OCCLUDER_MESHES.on_load()
+    HORIZON_MAPS.invalidate()
+
+
+def get_horizon_handlers():
+    return ((bpy.app.handlers.depsgraph_update_post, invalidate_horizon_maps),
+            (bpy.app.handlers.load_post, clear_horizon_maps))
+
+
+def register_horizon_handlers():
+    """Starts invalidating shared horizon maps and occluder meshes on geometry changes and file loads."""
+    for handlers, handler in get_horizon_handlers():
+        if handler not in handlers:
+            handlers.append(handler)
+
+
+def unregister_horizon_handlers():
+    for handlers, handler in get_horizon_handlers():
+        if handler in handlers:
+            handlers.remove(handler)
+    HORIZON_MAPS.invalidate()
+    OCCLUDER_MESHES.clear()
+
+
+def get_occlusion_based_normal(
+        context, vertices, avg_normal: Vector,
+        elevation_clamp: float, latitude_samples: int, longitude_samples: int,
+        cache: VisibilityCache = None, trace=None
+) -> Vector:
+    """Find a normal that best points toward a given normal that's visible by the most points.
+
+    :param context: Blender context
+    :param vertices: list of points in world space as Vectors
+    :param avg_normal: average normal as the preferred direction towards the sun lamp
+    :param elevation_clamp: sun's max vertical angle
+    :param latitude_samples: number of samples for occlusion testing along the latitudinal axis
+    :param longitude_samples: number of samples for occlusion testing along the longitudinal axis
+    :param cache: visibility cache reused across updates, only new points and directions are traced
+    :param trace: function taking points (N, 3) and directions (D, 3), returning a (N, D) blocked array.
+        Defaults to the scene's ray casting
+    :exception ValueError: if no sample direction faces the average normal
+    :return: world space Vector pointing towards the sun
+    """
+    if cache is None:
+        cache = VisibilityCache()
+
+    directions = cache.set_directions(elevation_clamp, latitude_samples, longitude_samples)
+    columns, dot_products = get_candidate_columns(directions, avg_normal)
+
+    if trace is None:
+        trace = scene_blocked_tracer(context.scene, context.evaluated_depsgraph_get())
+    blocked = cache.get_blocked(vertices, columns, trace)
+    return Vector(directions[get_best_column(columns, dot_products, blocked)])
+
+
+def get_horizon_based_normal(
+        vertices, avg_normal: Vector,
+        elevation_clamp: float, latitude_samples: int, longitude_samples: int,
+        cache: HorizonMapCache, cast
+) -> Vector:
+    """Find a normal that best points toward a given normal that's visible by the most points,
+    looking up occlusion in horizon maps instead of casting a ray per sample direction.
+
+    :param vertices: list of points in world space as Vectors
+    :param avg_normal: average normal as the preferred direction towards the sun lamp
+    :param elevation_clamp: sun's max vertical angle
+    :param latitude_samples: number of samples for occlusion testing along the latitudinal axis
+    :param longitude_samples: number of samples for occlusion testing along the longitudinal axis
+    :param cache: horizon maps, only computed for new points
+    :param cast: function taking points (R, 3) and directions (R, 3), returning a (R,) blocked array
+    :exception ValueError: if no sample direction faces the average normal
+    :return: world space Vector pointing towards the sun
+    """
+    directions = get_sample_directions(elevation_clamp, latitude_samples, longitude_samples)
+    columns, dot_products = get_candidate_columns(directions, avg_normal)
+
+    blocked = lookup_blocked(cache.get_horizons(vertices, cast), directions[columns])
+    return Vector(directions[get_best_column(columns, dot_products, blocked)])
+
+
+def aim_sun_lamp(lamp, sun_normal: Vector):
+    """Rotates a sun lamp to shine from a direction (suns only rotate, no location change).
+
+    :param lamp: sun lamp object
+    :param sun_normal: world space Vector pointing towards the sun
+    """
+    lamp.rotation_euler = Vector((0.0, 0.0, -1.0)).rotation_difference(-sun_normal).to_euler()
+
+
+class OcclusionJob:
+    """Finds the occlusion-based sun direction over several timer slices, so painting never waits on it.
+
+    Candidate directions are tested closest to the average normal first, and the job ends early
+    once no remaining direction could outrank the best one, even if visible from every point.
+    Results match :func:`get_occlusion_based_normal`.
+    """
+
+    def __init__(self, cache: VisibilityCache, vertices, avg_normal: Vector, get_trace, apply, batch_size: int = 1):
+        """
+        :param cache: visibility cache, its directions must already be set
+        :param vertices: list of points in world space as Vectors
+        :param avg_normal: average normal as the preferred direction towards the sun lamp
+        :param get_trace: function returning the occlusion tracer, called once per slice
+        :param apply: callback taking the sun direction, called whenever a better direction is found
+        :param batch_size: directions traced per step (e.g. one per worker process)
+        :exception ValueError: if no sample direction faces the average normal
+        """
+        columns, dot_products = get_candidate_columns(cache.directions, avg_normal)
+        order = np.argsort(-dot_products, kind='stable')
+        self.columns = columns[order]
+        self.dot_products = dot_products[order]
+
+        self.cache = cache
+        self.vertices = vertices
+        self.get_trace = get_trace
+        self.apply = apply
+        self.batch_size = batch_size
+
+        self.cache_rows = None
+        self.rows = None
+        self.trace_time = 0.0
+        self.traced_points = 0
+        """Seconds spent and points traced in batches of directions so far, to size chunks to the time left."""
+        self.restart()
+
+        # keep one bound method, timers are matched by identity
+        self.timer = self.step
+
+    def restart(self):
+        """Starts over from the first candidate direction."""
+        self.next_index = 0
+        self.best_rank = -np.inf
+        self.best_column = None
+
+    @property
+    def is_done(self) -> bool:
+        return self.next_index >= len(self.columns)
+
+    @property
+    def best_direction(self):
+        """Best sun direction found so far as a Vector, None if none have been tested yet."""
+        if self.best_column is None:
+            return None
+        return Vector(self.cache.directions[self.best_column])
+
+    def run(self, time_budget: float = None) -> bool:
+        """Tests candidate directions until the job is done or the time budget runs out.
+
+        :param time_budget: seconds to run for, if None then runs until done
+        :return: True if a better direction was found
+        """
+        start_time = time.perf_counter()
+        deadline = None if time_budget is None else start_time + time_budget
+        cache = self.cache
+
+        # first, as changing tracers clears the cache
+        trace = self.get_trace()
+        if cache.rows is not self.cache_rows:
+            # cache was cleared by a scene update, so earlier ranks may be stale
+            if self.cache_rows is not None:
+                self.restart()
+            self.rows = cache.get_rows(self.vertices)
+            self.cache_rows = cache.rows
+
+        unique_rows = np.unique(self.rows)
+        max_count = len(self.vertices)
+        improved = False
+
+        while not self.is_done:
+            if calc_rank(self.dot_products[self.next_index], max_count) < self.best_rank:
+                self.next_index = len(self.columns)
+                break
+
+            batch = slice(self.next_index, self.next_index + self.batch_size)
+            columns = self.columns[batch]
+            if not self.trace_batch(unique_rows, columns, trace, deadline):
+                break  # traced points are kept in the cache, the next slice resumes the batch
+            visibility_counts = np.count_nonzero(~cache.blocked[np.ix_(self.rows, columns)], axis=0)
+
+            # ties go to the lowest direction index, same as argmax
+            for column, rank in zip(columns, calc_rank(self.dot_products[batch], visibility_counts)):
+                if rank > self.best_rank or (rank == self.best_rank and column < self.best_column):
+                    self.best_rank = rank
+                    self.best_column = column
+                    improved = True
+
+            self.next_index += len(columns)
+            if time_budget is not None and time.perf_counter() - start_time >= time_budget:
+                break
+
+        return improved
+
+    def trace_batch(self, rows: np.ndarray, columns: np.ndarray, trace, deadline: float = None) -> bool:
+        """Traces points missing a batch of directions, in chunks sized to fit the time left before a deadline.
+
+        A single direction over a long stroke can take far longer than a slice (e.g. casting rays in Blender),
+        so chunks are sized from the time measured per point so far.
+
+        :param rows: cache rows of the stroke's points
+        :param columns: direction indices of the batch
+        :param trace: occlusion tracer, see :meth:`VisibilityCache.trace_missing`
+        :param deadline: time (as in :func:`time.perf_counter`) to stop at, if None then traces every point
+        :return: True if every point was traced in every direction of the batch
+        """
+        cache = self.cache
+        is_traced = False
+        while True:
+            missing_rows = rows[~cache.traced[np.ix_(rows, columns)].all(axis=1)]
+            if len(missing_rows) == 0:
+                return True
+
+            if deadline is not None:
+                # at least one chunk per call, so slices always make progress
+                time_left = deadline - time.perf_counter()
+                if is_traced and time_left <= 0.0:
+                    return False
+                if self.trace_time > 0.0:
+                    count = int(max(time_left, 0.0) * self.traced_points / self.trace_time)
+                    missing_rows = missing_rows[:max(count, 1)]
+                else:
+                    missing_rows = missing_rows[:MIN_TRACE_CHUNK]
+
+            start_time = time.perf_counter()
+            cache.trace_missing(missing_rows, columns, trace)
+            self.trace_time += time.perf_counter() - start_time
+            self.traced_points += len(missing_rows)
+            is_traced = True
+
+    def step(self):
+        """Timer callback, runs one slice and applies any better direction."""
+        try:
+            if self.run(SLICE_TIME_BUDGET):
+                self.apply(self.best_direction)
+        except ReferenceError:  # painted objects were removed
+            return None
+
+        return None if self.is_done else 0.0
+
+    def start(self):
+        """Runs the remaining slices in timers."""
+        if not self.is_done and not bpy.app.timers.is_registered(self.timer):
+            bpy.app.timers.register(self.timer)
+
+    def stop(self):
+        """Stops running in timers, keeping the best direction so far."""
+        if bpy.app.timers.is_registered(self.timer):
+            bpy.app.timers.unregister(self.timer)
+
+    def flush(self):
+        """Stops running in timers and finishes the job immediately."""
+        self.stop()
+        if self.run():
+            self.apply(self.best_direction)
+
+
+class OcclusionSettings:
+    """Settings and helpers shared by tools that aim a sun at painted strokes.
+
+    While painting, occlusion is refined progressively in timers instead of blocking each update.
+    """
+
+    normal_method: bpy.props.EnumProperty(
+        name='Method',
+        description='Method to determine sun direction',
+        items=(
+            ('AVERAGE', 'Average', 'Uses average of normals'),
+            ('OCCLUSION', 'Occlusion', 'Casts rays to determine occlusion and optimal direction for visibility'),
+            ('HORIZON', 'Horizon Maps', 'Approximates occlusion with the horizon around each point. '
+                                        'Samples, elevation and axis can then change without casting new rays'),
+            ('DEPTH_MAP', 'Depth Maps', 'Renders a depth map of the scene per sample direction to determine occlusion. '
+                                        'Faster than casting rays for strokes with many points'),
+            ('AUTO', 'Automatic', 'Uses depth maps for strokes with many points, casts rays otherwise'),
+        ),
+        default='OCCLUSION'
+    )
+
+    longitude_samples: bpy.props.IntProperty(
+        name='Azimuth Samples',
+        description='Samples of normals around the azimuth. '
+                    'Increasing samples improves precision at the cost of processing time',
+        min=4,
+        default=6,
+    )
+
+    latitude_samples: bpy.props.IntProperty(
+        name='Elevation Samples',
+        description='Samples of normals from the horizon to the maximum elevation. '
+                    'Increasing samples improves precision at the cost of processing time',
+        min=3,
+        default=6,
+    )
+
+    elevation_clamp: bpy.props.FloatProperty(
+        name='Max Sun Elevation',
+        description='Tested normals will be scaled to at most this elevation.'
+                    'Forces the sun closer to the horizon, allowing more dynamic lighting.',
+        min=0.0, soft_min=0.0,
+        max=PI_OVER_2, soft_max=PI_OVER_2,
+        default=radians(60),
+        step=10,
+        subtype='ANGLE'
+    )
+
+    occluder_set: bpy.props.EnumProperty(
+        name='Occluders',
+        description='Objects that can block the sun',
+        items=(
+            ('ALL', 'All', 'Every visible object blocks the sun'),
+            ('EXCLUDE_GENERATED', 'Exclude Light Painter',
+             'Every visible object blocks the sun, except flags and meshes made by Light Painter'),
+            ('COLLECTION', 'Collection', 'Only objects in a collection block the sun'),
+        ),
+        default='EXCLUDE_GENERATED'
+    )
+
+    occluder_collection: bpy.props.StringProperty(
+        name='Collection',
+        description='Collection of objects that can block the sun',
+        default='',
+    )
+
+    depth_map_resolution: bpy.props.IntProperty(
+        name='Depth Map Resolution',
+        description='Texels along each side of depth maps. '
+                    'Increasing resolution catches thinner occluders at the cost of processing time',
+        min=16, soft_max=2048,
+        default=DEFAULT_RESOLUTION,
+    )
+
+    def __init__(self):
+        self.visibility_cache = VisibilityCache()
+        self.occlusion_job = None
+        self.is_progressive = False
+
+    def start_occlusion_updates(self):
+        """Starts progressive occlusion while painting, updated as the scene changes."""
+        self.visibility_cache.watch()
+        self.is_progressive = True
+
+    def stop_occlusion_updates(self):
+        """Stops progressive occlusion and any job in progress."""
+        self.stop_occlusion_job()
+        self.visibility_cache.unwatch()
+        self.is_progressive = False
+
+    def stop_occlusion_job(self):
+        if self.occlusion_job is not None:
+            self.occlusion_job.stop()
+            self.occlusion_job = None
+
+    def flush_occlusion_job(self):
+        """Finishes any job in progress immediately (e.g. when confirming the tool)."""
+        if self.occlusion_job is not None:
+            self.occlusion_job.flush()
+            self.occlusion_job = None
+
+    def start_occlusion_job(self, context, vertices, avg_normal: Vector, apply) -> Vector:
+        """Runs the first slice of a progressive occlusion job, leaving the rest to timers.
+
+        :return: best direction found within the first slice, or the average normal
+        """
+        self.visibility_cache.set_directions(self.elevation_clamp, self.latitude_samples, self.longitude_samples)
+        workers = context.preferences.addons[base_package].preferences.occlusion_workers
+
+        points = to_points(vertices)
+        job = OcclusionJob(self.visibility_cache, vertices, avg_normal,
+                           lambda: self.get_occlusion_tracer(bpy.context, points), apply,
+                           batch_size=max(workers, 1))
+        job.run(SLICE_TIME_BUDGET)
+        if not job.is_done:
+            job.start()
+            self.occlusion_job = job
+
+        best_direction = job.best_direction
+        return Vector(avg_normal) if best_direction is None else best_direction
+
+    def draw_occluder_props(self, layout):
+        layout.prop(self, 'occluder_set')
+        if self.occluder_set == 'COLLECTION':
+            layout.prop_search(self, 'occluder_collection', bpy.data, 'collections')
+
+    def get_occluder_filter(self, context):
+        """Returns a function checking if an object can block the sun, None if every object can."""
+        if self.occluder_set == 'EXCLUDE_GENERATED':
+            return lambda obj: not is_generated(obj)
+        elif self.occluder_set == 'COLLECTION':
+            collection = context.blend_data.collections.get(self.occluder_collection)
+            names = set() if collection is None else {obj.name for obj in collection.all_objects}
+            return lambda obj: obj.name in names
+        return None
+
+    def get_occluders(self, context, cache: PointCache) -> Occluders:
+        """Returns the scene's occluders, exported once until the cache is invalidated."""
+        if cache.occluders is None:
+            cache.occluders = export_occluders(context.evaluated_depsgraph_get(), self.get_occluder_filter(context),
+                                               get_mesh_cache(context))
+        return cache.occluders
+
+    def get_occluder_bounds(self, context, cache: PointCache) -> OccluderBounds:
+        """Returns bounds of the scene's occluders, computed once until the cache is invalidated."""
+        if cache.bounds is None:
+            cache.bounds = get_occluder_bounds(context.evaluated_depsgraph_get(), self.get_occluder_filter(context))
+        return cache.bounds
+
+    def get_occlusion_pool(self, context, cache: PointCache):
+        """Returns the warm worker pool with the scene's occluders published, None if disabled in the preferences."""
+        workers = context.preferences.addons[base_package].preferences.occlusion_workers
+        if workers == 0:
+            return None
+
+        occluders = self.get_occluders(context, cache)
+        # workers cast rays against mesh BVHs, built (or loaded from the mesh cache) once instead of by every worker
+        occluders.load_mesh_bvhs()
+
+        pool = get_pool(workers)
+        pool.publish(occluders)
+        return pool
+
+    def get_occlusion_tracer(self, context, points: np.ndarray):
+        """Returns the occlusion test to use for a stroke, clearing cached points traced by any other test.
+
+        Renders depth maps if chosen (or if automatic and the stroke has many points),
+        otherwise casts rays, in worker processes or against cached BVHs if enabled in the preferences.
+
+        :param context: Blender context
+        :param points: stroke points in world space, shape (N, 3)
+        """
+        cache = self.visibility_cache
+        if self.normal_method == 'DEPTH_MAP' or (
+                self.normal_method == 'AUTO' and len(points) >= AUTO_DEPTH_MAP_POINTS):
+            # maps are rendered once per direction, then reused by every point until the stroke leaves their
+            # footprint or the cache is invalidated
+            depth_maps = cache.depth_maps
+            if (depth_maps is None or depth_maps.resolution != self.depth_map_resolution or
+                    not depth_maps.covers(points)):
+                bounds = get_footprint(points, None if depth_maps is None else depth_maps.bounds)
+                depth_maps = DepthMaps(self.get_occluders(context, cache).get_world_triangles(), bounds,
+                                       self.depth_map_resolution)
+                cache.depth_maps = depth_maps
+            cache.set_tracer_key(('DEPTH_MAP', depth_maps.resolution, depth_maps.bounds.tobytes()))
+            return depth_maps.is_blocked
+
+        # worker processes and cached BVHs cast the same rays against the same triangles as the scene
+        cache.set_tracer_key('RAY')
+        pool = self.get_occlusion_pool(context, cache)
+        if pool is not None:
+            return pool.is_blocked
+        if get_mesh_cache(context) is not None:
+            return self.get_occluders(context, cache).is_blocked
+        return scene_blocked_tracer(context.scene, context.evaluated_depsgraph_get(),
+                                    self.get_occluder_filter(context), self.get_occluder_bounds(context, cache))
+
+    def get_horizon_tracer(self, context):
+        """Returns the ray caster for horizon maps, running in worker processes or against cached BVHs
+        if enabled in the preferences.
+        """
+        pool = self.get_occlusion_pool(context, HORIZON_MAPS)
+        if pool is not None:
+            return pool.rays_blocked
+        if get_mesh_cache(context) is not None:
+            return self.get_occluders(context, HORIZON_MAPS).rays_blocked
+        return scene_ray_tracer(context.scene, context.evaluated_depsgraph_get(),
+                                self.get_occluder_filter(context), self.get_occluder_bounds(context, HORIZON_MAPS))
+
+    def get_sun_normal(self, context, vertices, avg_normal: Vector, apply=None) -> Vector:
+        """Returns the direction towards the sun based on the chosen method.
+
+        Falls back to the average normal if no direction can be found by occlusion.
+
+        :param apply: callback taking a better sun direction. While painting, occlusion is then refined
+            in timers starting from the returned direction, restarting on every new update
+        """
+        self.stop_occlusion_job()
+
+        occluder_key = (self.occluder_set, self.occluder_collection)
+        self.visibility_cache.set_occluder_key(occluder_key)
+        HORIZON_MAPS.set_occluder_key(occluder_key)
+
+        try:
+            if self.normal_method in OCCLUSION_METHODS:
+                if apply is not None and self.is_progressive:
+                    return self.start_occlusion_job(context, vertices, avg_normal, apply)
+                return get_occlusion_based_normal(
+                    context, vertices, avg_normal,
+                    self.elevation_clamp, self.latitude_samples, self.longitude_samples,
+                    cache=self.visibility_cache, trace=self.get_occlusion_tracer(context, to_points(vertices))
+                )
+            elif self.normal_method == 'HORIZON':
+                return get_horizon_based_normal(
+                    vertices, avg_normal,
+                    self.elevation_clamp, self.latitude_samples, self.longitude_samples,
+                    HORIZON_MAPS, self.get_horizon_tracer(context)
+                )
+        except ValueError:
+            self.report({'ERROR'}, NO_DIRECTION_ERROR)
+
+        return Vector(avg_normal)
@@ -32,6 +32,18 @@ def offset_prop(obj_descriptor, default_val: float = 1.0) -> bpy.props.FloatProp
     )
 
 
+def max_faces_prop(obj_descriptor) -> bpy.props.IntProperty:
+    """Returns max faces property to simplify convex hulls, see :func:`core.mesh.simplify_hull`."""
+    return bpy.props.IntProperty(
+        name='Max Faces',
+        description=f'Simplifies each {obj_descriptor} hull down to this many faces while still enclosing the strokes, '
+                    f'fewer faces build faster in render engines. If 0, keeps every face',
+        min=0,
+        soft_max=256,
+        default=0,
+    )
+
+
 def convert_val_to_unit_str(val, unit_category, precision=5):
     context = bpy.context
     scene = context.scene
@@ -1,10 +1,10 @@
-from math import atan, atan2, pi, radians, sqrt
+from math import atan, atan2, pi, sqrt
 
 import bpy
-from mathutils import Vector
 
 from .base_tool import BaseLightPaintTool
-from .lamp_util import get_average_normal, get_occlusion_based_normal, PI_OVER_2
+from .lamp_util import get_average_normal
+from .occlusion import aim_sun_lamp, DEPTH_MAP_METHODS, OcclusionSettings
 from .prop_util import axis_prop, convert_val_to_unit_str, get_drag_mode_header
 from .visibility import VisibilitySettings
 from ..axis import prep_stroke
@@ -17,52 +17,19 @@ else:
 WORLD_DATA_NAME = 'Light Painter World'
 
 
-class LIGHTPAINTER_OT_Sky(bpy.types.Operator, BaseLightPaintTool, VisibilitySettings):
+class LIGHTPAINTER_OT_Sky(bpy.types.Operator, BaseLightPaintTool, OcclusionSettings, VisibilitySettings):
     bl_idname = 'lightpainter.sky'
     bl_label = 'Paint Sky'
     bl_description = 'Rotates world sky texture to light surfaces specified by annotations'
 
     tool_id = 'view3d.lightpaint_sky'
+    property_updates = {
+        'size': 'update_sky_sun',
+        'power': 'update_sky_sun',
+    }
 
     axis: axis_prop('sky')
 
-    normal_method: bpy.props.EnumProperty(
-        name='Method',
-        description='Method to determine sun direction',
-        items=(
-            ('AVERAGE', 'Average', 'Uses average of normals'),
-            ('OCCLUSION', 'Occlusion', 'Casts rays to determine occlusion and optimal direction for visibility'),
-        ),
-        default='OCCLUSION'
-    )
-
-    longitude_samples: bpy.props.IntProperty(
-        name='Azimuth Samples',
-        description='Samples of normals around the azimuth. '
-                    'Increasing samples improves precision at the cost of processing time',
-        min=4,
-        default=6,
-    )
-
-    latitude_samples: bpy.props.IntProperty(
-        name='Elevation Samples',
-        description='Samples of normals from the horizon to the maximum elevation. '
-                    'Increasing samples improves precision at the cost of processing time',
-        min=3,
-        default=6,
-    )
-
-    elevation_clamp: bpy.props.FloatProperty(
-        name='Max Sun Elevation',
-        description='Tested normals will be scaled to at most this elevation.'
-                    'Forces the sun closer to the horizon, allowing more dynamic lighting.',
-        min=0.0, soft_min=0.0,
-        max=PI_OVER_2, soft_max=PI_OVER_2,
-        default=radians(60),
-        step=10,
-        subtype='ANGLE'
-    )
-
     texture_type: bpy.props.EnumProperty(
         name='Sky Model',
         description='Model used by sky texture node',
@@ -93,6 +60,20 @@ class LIGHTPAINTER_OT_Sky(bpy.types.Operator, BaseLightPaintTool, VisibilitySett
     def __init__(self, *args, **kwargs):
         bpy.types.Operator.__init__(self, *args, **kwargs)
         BaseLightPaintTool.__init__(self)
+        OcclusionSettings.__init__(self)
+
+    def invoke(self, context, event):
+        result = super().invoke(context, event)
+        if 'RUNNING_MODAL' in result:
+            self.start_occlusion_updates()
+        return result
+
+    def cancel(self, context):
+        super().cancel(context)
+        self.stop_occlusion_updates()
+
+    def finish_callback(self, context):
+        self.flush_occlusion_job()
 
     def draw(self, _context):
         layout = self.layout
@@ -103,10 +84,14 @@ class LIGHTPAINTER_OT_Sky(bpy.types.Operator, BaseLightPaintTool, VisibilitySett
         layout.prop(self, 'normal_method')
 
         col = layout.column()
-        col.active = self.normal_method == 'OCCLUSION'
+        col.active = self.normal_method != 'AVERAGE'
         col.prop(self, 'longitude_samples')
         col.prop(self, 'latitude_samples')
+        row = col.row()
+        row.active = self.normal_method in DEPTH_MAP_METHODS
+        row.prop(self, 'depth_map_resolution')
         col.prop(self, 'elevation_clamp', slider=True)
+        self.draw_occluder_props(col)
 
         layout.separator()
 
@@ -228,23 +213,19 @@ class LIGHTPAINTER_OT_Sky(bpy.types.Operator, BaseLightPaintTool, VisibilitySett
             self.report({'ERROR'}, str(e))
             return {'CANCELLED'}
 
-        if self.normal_method == 'OCCLUSION':
-            try:
-                sun_normal = get_occlusion_based_normal(
-                    context, vertices, avg_normal,
-                    self.elevation_clamp, self.latitude_samples, self.longitude_samples
-                )
-            except ValueError:
-                self.report({'ERROR'}, 'No valid directions found '
-                                       '(add more samples or increase the elevation clamp!), using average normal')
-                sun_normal = Vector(avg_normal)
-        else:
-            sun_normal = Vector(avg_normal)
+        sun_normal = self.get_sun_normal(context, vertices, avg_normal,
+                                         apply=lambda normal: self.paint_sky_texture(bpy.context, normal))
 
         self.paint_sky_texture(context, sun_normal)
 
         return {'FINISHED'}
 
+    def update_sky_sun(self, context):
+        """Writes only the sky's sun size and intensity, e.g. when dragging them."""
+        sky_node = next(node for node in context.scene.world.node_tree.nodes if node.type == 'TEX_SKY')
+        sky_node.sun_size = self.size
+        sky_node.sun_intensity = self.power
+
     def startup_callback(self, context):
         new_world = context.blend_data.worlds.new(WORLD_DATA_NAME)
         self.prev_world = context.scene.world
@@ -264,52 +245,19 @@ class LIGHTPAINTER_OT_Sky(bpy.types.Operator, BaseLightPaintTool, VisibilitySett
             context.scene.world = self.prev_world
 
 
-class LIGHTPAINTER_OT_Sun(bpy.types.Operator, BaseLightPaintTool, VisibilitySettings):
+class LIGHTPAINTER_OT_Sun(bpy.types.Operator, BaseLightPaintTool, OcclusionSettings, VisibilitySettings):
     bl_idname = 'lightpainter.sun'
     bl_label = 'Paint Sun'
     bl_description = 'Adds sun lamp to light surfaces specified by annotations'
 
     tool_id = 'view3d.lightpaint_sun'
+    property_updates = {
+        'power': 'update_sun_lamp',
+        'angle': 'update_sun_lamp',
+    }
 
     axis: axis_prop('sun')
 
-    normal_method: bpy.props.EnumProperty(
-        name='Method',
-        description='Method to determine sun direction',
-        items=(
-            ('AVERAGE', 'Average', 'Uses average of normals'),
-            ('OCCLUSION', 'Occlusion', 'Casts rays to determine occlusion and optimal direction for visibility'),
-        ),
-        default='OCCLUSION'
-    )
-
-    longitude_samples: bpy.props.IntProperty(
-        name='Azimuth Samples',
-        description='Samples of normals around the azimuth. '
-                    'Increasing samples improves precision at the cost of processing time',
-        min=4,
-        default=6,
-    )
-
-    latitude_samples: bpy.props.IntProperty(
-        name='Elevation Samples',
-        description='Samples of normals from the horizon to the maximum elevation. '
-                    'Increasing samples improves precision at the cost of processing time',
-        min=3,
-        default=6,
-    )
-
-    elevation_clamp: bpy.props.FloatProperty(
-        name='Max Sun Elevation',
-        description='Tested normals will be scaled to at most this elevation.'
-                    'Forces the sun closer to the horizon, allowing more dynamic lighting.',
-        min=0.0, soft_min=0.0,
-        max=PI_OVER_2, soft_max=PI_OVER_2,
-        default=radians(60),
-        step=10,
-        subtype='ANGLE'
-    )
-
     # SUN
     light_color: bpy.props.FloatVectorProperty(
         name='Color',
@@ -340,6 +288,20 @@ class LIGHTPAINTER_OT_Sun(bpy.types.Operator, BaseLightPaintTool, VisibilitySett
     def __init__(self, *args, **kwargs):
         bpy.types.Operator.__init__(self, *args, **kwargs)
         BaseLightPaintTool.__init__(self)
+        OcclusionSettings.__init__(self)
+
+    def invoke(self, context, event):
+        result = super().invoke(context, event)
+        if 'RUNNING_MODAL' in result:
+            self.start_occlusion_updates()
+        return result
+
+    def cancel(self, context):
+        super().cancel(context)
+        self.stop_occlusion_updates()
+
+    def finish_callback(self, context):
+        self.flush_occlusion_job()
 
     def draw(self, _context):
         layout = self.layout
@@ -349,10 +311,14 @@ class LIGHTPAINTER_OT_Sun(bpy.types.Operator, BaseLightPaintTool, VisibilitySett
         layout.prop(self, 'normal_method')
 
         col = layout.column()
-        col.active = self.normal_method == 'OCCLUSION'
+        col.active = self.normal_method != 'AVERAGE'
         col.prop(self, 'longitude_samples')
         col.prop(self, 'latitude_samples')
+        row = col.row()
+        row.active = self.normal_method in DEPTH_MAP_METHODS
+        row.prop(self, 'depth_map_resolution')
         col.prop(self, 'elevation_clamp', slider=True)
+        self.draw_occluder_props(col)
 
         layout.separator()
 
@@ -431,32 +397,16 @@ class LIGHTPAINTER_OT_Sun(bpy.types.Operator, BaseLightPaintTool, VisibilitySett
             self.report({'ERROR'}, str(e))
             return {'CANCELLED'}
 
-        if self.normal_method == 'OCCLUSION':
-            try:
-                sun_normal = get_occlusion_based_normal(
-                    context, vertices, avg_normal,
-                    self.elevation_clamp, self.latitude_samples, self.longitude_samples
-                )
-            except ValueError:
-                self.report({'ERROR'}, 'No valid directions found '
-                                       '(add more samples or increase the elevation clamp!), using average normal')
-                sun_normal = Vector(avg_normal)
-        else:
-            sun_normal = Vector(avg_normal)
-
-        sun_normal.negate()
-
-        # rotation difference
-        rotation = Vector((0.0, 0.0, -1.0)).rotation_difference(sun_normal).to_euler()
         center = context.scene.cursor.location
 
         if not context.active_object or context.active_object.type != 'LIGHT' or context.active_object.data.type != 'SUN':
-            bpy.ops.object.light_add(type='SUN', align='WORLD', location=center, rotation=rotation, scale=(1, 1, 1))
+            bpy.ops.object.light_add(type='SUN', align='WORLD', location=center, scale=(1, 1, 1))
 
         lamp = context.active_object
 
-        # Sun only rotates, no location change
-        lamp.rotation_euler = rotation
+        sun_normal = self.get_sun_normal(context, vertices, avg_normal,
+                                         apply=lambda normal: aim_sun_lamp(lamp, normal))
+        aim_sun_lamp(lamp, sun_normal)
 
         # set light data properties
         lamp.data.energy = self.power
@@ -465,6 +415,12 @@ class LIGHTPAINTER_OT_Sun(bpy.types.Operator, BaseLightPaintTool, VisibilitySett
 
         return {'FINISHED'}
 
+    def update_sun_lamp(self, context):
+        """Writes only the sun's power and angle, e.g. when dragging them."""
+        lamp = context.active_object
+        lamp.data.energy = self.power
+        lamp.data.angle = self.angle
+
     def startup_callback(self, context):
         center = context.scene.cursor.location
         bpy.ops.object.light_add(type='SUN', align='WORLD', location=center, scale=(1, 1, 1))
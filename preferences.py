@@ -1,3 +1,5 @@
+import os
+
 import bpy
 from rna_keymap_ui import _indented_layout
 
@@ -60,12 +62,42 @@ class VIEW3D_AddonPreferences(bpy.types.AddonPreferences):
         precision=1,
     )
 
+    occlusion_workers: bpy.props.IntProperty(
+        name='Occlusion Workers',
+        description='Number of background processes sharing occlusion ray casts for the sun and sky tools. '
+                    'Processes start on first use and are kept running until the add-on is disabled. '
+                    'Small tests, and all tests on a single CPU, still run in Blender when that is faster. '
+                    'Zero casts rays in Blender itself',
+        min=0,
+        soft_max=os.cpu_count() or 1,
+        default=0,
+    )
+
+    mesh_cache_size: bpy.props.IntProperty(
+        name='Mesh Cache Size',
+        description='Megabytes of disk space for occluder meshes and their BVHs, reused across sessions '
+                    'so heavy scenes are not exported and prepared for ray casting again. '
+                    'Least recently used meshes are deleted past this size. Zero disables the cache',
+        min=0,
+        soft_max=8192,
+        default=1024,
+    )
+
     def draw(self, context):
         layout = self.layout
 
         layout.use_property_split = True
         layout.use_property_decorate = False
 
+        layout.label(text='Performance')
+
+        col = layout.column()
+        col.prop(self, 'occlusion_workers')
+        col.prop(self, 'mesh_cache_size')
+        col.operator('lightpainter.clear_cache', icon='TRASH')
+
+        layout.separator()
+
         layout.label(text='Tools Keymap')
 
         col = layout.column(align=True, heading='Display')
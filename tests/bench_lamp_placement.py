@@ -0,0 +1,134 @@
+"""Benchmarks placing point, spot and area lamps on strokes of increasing size.
+
+Run from the repository root with a plain Python interpreter that has NumPy installed:
+
+    python tests/bench_lamp_placement.py --points 1000 10000 100000
+
+or with Blender's Python, to compare against the former per-vertex mathutils solver:
+
+    blender --background --factory-startup --python tests/bench_lamp_placement.py -- --points 1000 10000 100000
+"""
+
+import argparse
+import importlib
+import math
+from pathlib import Path
+import runpy
+import sys
+import time
+
+import numpy as np
+
+CORE_DIR = Path(__file__).parent.parent / 'core'
+
+try:
+    from mathutils import Matrix, Vector
+    from mathutils.geometry import box_fit_2d
+except ImportError:
+    Matrix = Vector = box_fit_2d = None
+
+
+def make_stroke(point_count: int, seed: int = 0):
+    """Stroke painted over a wavy floor, with normals facing up and offset along them."""
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform(-5, 5, (point_count, 2))
+    vertices = np.column_stack((xy, 0.2 * np.sin(xy[:, 0]) * np.cos(xy[:, 1])))
+    normals = np.column_stack((-0.2 * np.cos(xy[:, 0]) * np.cos(xy[:, 1]),
+                               0.2 * np.sin(xy[:, 0]) * np.sin(xy[:, 1]), np.ones(point_count)))
+    normals /= np.linalg.norm(normals, axis=1)[:, np.newaxis]
+    return vertices + normals, normals, vertices
+
+
+def make_band_stroke(point_count: int, seed: int = 0):
+    """Long, thin stroke along a diagonal, as painted in a single drag."""
+    rng = np.random.default_rng(seed)
+    along, across = rng.uniform(0, 10, point_count), rng.uniform(-0.3, 0.3, point_count)
+    xy = np.column_stack((along, across + 0.2 * np.sin(along))) @ np.array(((0.8, 0.6), (-0.6, 0.8)))
+    return np.column_stack((xy, np.ones(point_count)))
+
+
+def legacy_place(vertices, normals, orig_vertices):
+    """Former solver, with a Python pass per vertex for each step."""
+    avg_normal = sum(normals, start=Vector())
+    avg_normal.normalize()
+    avg_normal.negate()
+
+    farthest_point = max((v.project(avg_normal).length_squared, v) for v in vertices)[1]
+    projected_vertices = tuple(v + (farthest_point - v).project(avg_normal) for v in vertices)
+    center = sum(projected_vertices, start=Vector()) / len(projected_vertices)
+
+    orig_center = sum(orig_vertices, start=Vector()) / len(orig_vertices)
+    centers_dir = (orig_center - center).normalized()
+    spot_angle = 2 * max((v - center).normalized().angle(centers_dir) for v in orig_vertices)
+
+    align_to_z = avg_normal.rotation_difference(Vector((0.0, 0.0, 1.0))).to_matrix()
+    flattened_2d = [align_to_z @ v for v in projected_vertices]
+    angle = box_fit_2d([(v[0], v[1]) for v in flattened_2d])
+    box_mat = Matrix.Rotation(angle, 3, 'Z')
+    aligned_2d = [(box_mat @ Vector((co[0], co[1], 0))) for co in flattened_2d]
+    length = max(co[0] for co in aligned_2d) - min(co[0] for co in aligned_2d)
+    width = max(co[1] for co in aligned_2d) - min(co[1] for co in aligned_2d)
+
+    return center, spot_angle, length, width
+
+
+def main():
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else sys.argv[1:]
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--points', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    runpy.run_path(str(CORE_DIR / 'worker_bootstrap.py'))
+    placement = importlib.import_module('lightpainter_core.placement')
+
+    def best_of(func):
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = func()
+            timings.append(time.perf_counter() - start)
+        return min(timings), result
+
+    def place(vertices, normals, orig_vertices):
+        # conversion from stroke vectors is included, as the operators pay for it too
+        vertices, normals = np.array(vertices, dtype=np.float64), np.array(normals, dtype=np.float64)
+        orig_vertices = np.array(orig_vertices, dtype=np.float64)
+        avg_normal = -placement.get_average_normal(normals)
+        center, _, spot_angle = placement.get_spot_lamp_placement(vertices, orig_vertices, avg_normal)
+        _, _, length, width = placement.get_area_lamp_box(vertices, avg_normal)
+        return center, spot_angle, length, width
+
+    print('{:>8} {:>12} {:>12} {:>9} {:>12}'.format('points', 'numpy', 'mathutils', 'speedup', 'spot angle'))
+    for point_count in args.points:
+        vertices, normals, orig_vertices = make_stroke(point_count)
+        if Vector is None:
+            elapsed, result = best_of(lambda: place(vertices, normals, orig_vertices))
+            print('{:>8} {:>11.4f}s {:>12} {:>9} {:>11.2f}°'.format(
+                point_count, elapsed, '-', '-', math.degrees(result[1])))
+            continue
+
+        vertices, normals, orig_vertices = ([Vector(v) for v in array] for array in (vertices, normals, orig_vertices))
+        elapsed, result = best_of(lambda: place(vertices, normals, orig_vertices))
+        legacy_elapsed, expected = best_of(lambda: legacy_place(vertices, normals, orig_vertices))
+
+        assert (Vector(result[0]) - expected[0]).length < 1e-6, 'lamp locations differ'
+        assert result[1] <= expected[1] + 1e-6, 'spot cone is wider than centered on the centroid'
+        assert math.isclose(result[2] * result[3], expected[2] * expected[3], rel_tol=1e-6), 'area sizes differ'
+        print('{:>8} {:>11.4f}s {:>11.4f}s {:>8.1f}x {:>6.2f}° (was {:.2f}°)'.format(
+            point_count, elapsed, legacy_elapsed, legacy_elapsed / elapsed,
+            math.degrees(result[1]), math.degrees(expected[1])))
+
+    # PCA rectangles, used while painting strokes of at least FAST_FIT_POINTS points, against the exact fit
+    up = np.array((0.0, 0.0, 1.0))
+    print('\n{:>8} {:>8} {:>12} {:>12} {:>11}'.format('points', 'stroke', 'pca', 'exact', 'area ratio'))
+    for point_count in args.points:
+        for name, vertices in (('patch', make_stroke(point_count)[0]), ('band', make_band_stroke(point_count))):
+            fast_elapsed, fast = best_of(lambda: placement.get_area_lamp_box(vertices, up, fast=True))
+            exact_elapsed, exact = best_of(lambda: placement.get_area_lamp_box(vertices, up))
+            print('{:>8} {:>8} {:>11.4f}s {:>11.4f}s {:>10.3f}x'.format(
+                point_count, name, fast_elapsed, exact_elapsed, fast[2] * fast[3] / (exact[2] * exact[3])))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,6 @@
 import ast
 from math import pi
-from numpy import isclose as np_isclose
+import numpy as np
 import os
 from pathlib import Path
 import pytest
@@ -183,7 +183,7 @@ def test_conversion():
     ]
 
     def compare_vectors(vec1, vec2):
-        return all(np_isclose(v2, v1, atol=0.001, rtol=0.001) for v1, v2 in zip(vec1, vec2))
+        return all(np.isclose(v2, v1, atol=0.001, rtol=0.001) for v1, v2 in zip(vec1, vec2))
 
     for v, geo in TEST_CONVERSIONS:
         result = geo_to_dir(geo[0], geo[1])
@@ -262,3 +262,797 @@ def test_keymap_unique_without_clashes():
 
     if failed_keymaps:
         pytest.fail('Expected all keymaps to be unique, found matches:\n' + '\n'.join(failed_keymaps))
+
+
+def get_box_occluders():
+    """A unit cube on the ground at the origin, with another instance moved along X."""
+    from lightpainter.core.occluders import Occluders
+
+    corners = np.array([(x, y, z) for x in (-0.5, 0.5) for y in (-0.5, 0.5) for z in (0.0, 1.0)])
+    faces = [(0, 1, 3), (0, 3, 2), (4, 6, 7), (4, 7, 5), (0, 4, 5), (0, 5, 1),
+             (2, 3, 7), (2, 7, 6), (0, 2, 6), (0, 6, 4), (1, 5, 7), (1, 7, 3)]
+    matrices = np.repeat(np.eye(4)[np.newaxis], 2, axis=0)
+    matrices[1, 0, 3] = 5.0
+    return Occluders([corners[faces]], [0, 0], matrices)
+
+
+def test_occluders():
+    """Occluders block rays through any of their instances, and nothing else."""
+    occluders = get_box_occluders()
+    points = np.array([(0, 0, -1), (5, 0, -1), (2.5, 0, -1)])
+    directions = np.array([(0, 0, 1), (0, 0, -1)])
+
+    blocked = occluders.is_blocked(points, directions)
+    assert blocked.tolist() == [[True, False], [True, False], [False, False]]
+    assert occluders.rays_blocked(points, np.array([(0, 0, 1)] * 3)).tolist() == [True, True, False]
+
+
+def test_horizon_maps():
+    """Horizon map lookups match ray casts between both cubes."""
+    from lightpainter.core.horizon import compute_horizons, lookup_blocked
+
+    occluders = get_box_occluders()
+    points = np.array([(1.5, 0, 0.1)])
+    horizons = compute_horizons(points, occluders.rays_blocked)
+
+    directions = np.array([(-0.8, 0, 0.6), (-0.6, 0, 0.8), (0.8, 0, 0.6), (0.995, 0, 0.0995), (0, 1, 0), (0, 0, 1)])
+    blocked = occluders.is_blocked(points, directions)
+    assert blocked.tolist() == [[True, False, False, True, False, False]]
+    assert np.array_equal(lookup_blocked(horizons, directions), blocked)
+
+
+def test_depth_maps():
+    """Depth map lookups match ray casts between both cubes."""
+    from lightpainter.core.depth_map import depth_map_blocked
+
+    occluders = get_box_occluders()
+    points = np.array([(1.5, 0, 0.1), (3.5, 0, 0.1), (2.5, 2, 0.1)])
+    directions = np.array([(-0.8, 0, 0.6), (-0.6, 0, 0.8), (0.8, 0, 0.6), (0, 1, 0), (0, 0, 1)])
+
+    blocked = depth_map_blocked(occluders.get_world_triangles(), points, directions)
+    assert np.array_equal(blocked, occluders.is_blocked(points, directions))
+    assert blocked.any()
+
+
+def test_depth_maps_batches():
+    """Depth maps are rendered once per direction, and give the same results however points are batched."""
+    from lightpainter.core.depth_map import DepthMaps, get_footprint
+
+    triangles = get_box_occluders().get_world_triangles()
+    rng = np.random.default_rng(0)
+    points = rng.uniform((-1, -2, 0), (6, 2, 1.5), (400, 3))
+    directions = np.array([(-0.8, 0, 0.6), (0.6, 0.48, 0.64), (0, 0, 1)])
+    bounds = get_footprint(points)
+
+    whole = DepthMaps(triangles, bounds).is_blocked(points, directions)
+    maps = DepthMaps(triangles, bounds)
+    assert maps.covers(points) and not maps.covers(points + (0, 0, 10))
+    split = np.vstack([maps.is_blocked(batch, directions) for batch in np.array_split(points, 7)])
+    assert np.array_equal(whole, split)
+    assert len(maps.maps) == len(directions)
+    assert whole.any() and not whole.all()
+
+
+def test_depth_maps_large_scene():
+    """Depth maps follow the stroke's size, so a huge ground plane does not coarsen them."""
+    from lightpainter.core.depth_map import depth_map_blocked
+    from lightpainter.core.occluders import Occluders
+
+    points = np.array([(1.5, 0, 0.1), (0.7, 0, 0.1)])
+    directions = np.array([(-0.8, 0, 0.6)])
+    cube = get_box_occluders().get_world_triangles()
+    for size in (0.0, 10.0, 1000.0):
+        ground = np.array([[(-size, -size, 0), (size, -size, 0), (size, size, 0)],
+                           [(-size, -size, 0), (size, size, 0), (-size, size, 0)]])
+        occluders = Occluders([np.vstack((cube, ground))], [0], np.eye(4)[np.newaxis])
+
+        blocked = depth_map_blocked(occluders.get_world_triangles(), points, directions)
+        assert blocked.all() and np.array_equal(blocked, occluders.is_blocked(points, directions)), size
+
+
+def test_occlusion_tracer_keys():
+    """Cached points are traced again after switching between rays and depth maps, or depth map resolutions."""
+    from types import SimpleNamespace
+    from lightpainter.core.occluders import OccluderBounds
+    from lightpainter.operators import occlusion
+
+    settings = occlusion.OcclusionSettings()
+    settings.normal_method = 'AUTO'
+    settings.occluder_set = 'ALL'
+    settings.depth_map_resolution = 64
+    cache = settings.visibility_cache
+    cache.occluders = get_box_occluders()
+    cache.bounds = OccluderBounds(np.array([(-0.5, -0.5, 0), (4.5, -0.5, 0)]), np.array([(0.5, 0.5, 1), (5.5, 0.5, 1)]))
+    preferences = SimpleNamespace(occlusion_workers=0, mesh_cache_size=0)
+    context = SimpleNamespace(preferences=SimpleNamespace(addons={occlusion.base_package: SimpleNamespace(
+        preferences=preferences)}), scene=None, evaluated_depsgraph_get=lambda: None)
+
+    rng = np.random.default_rng(0)
+    points = rng.uniform((1, -1, 0), (4, 1, 1), (occlusion.AUTO_DEPTH_MAP_POINTS, 3))
+    columns = np.arange(len(cache.set_directions(1.2, 4, 4)))
+
+    def trace_stroke(stroke):
+        cache.get_blocked([tuple(point) for point in stroke], columns, settings.get_occlusion_tracer(context, stroke))
+
+    trace_stroke(points)
+    depth_maps = cache.depth_maps
+    trace_stroke(points[::-1])  # same footprint and resolution
+    assert cache.depth_maps is depth_maps and cache.traced.all()
+
+    settings.get_occlusion_tracer(context, points[:10])  # rays for short strokes
+    assert len(cache.rows) == 0
+
+    trace_stroke(points)
+    settings.depth_map_resolution = 128
+    settings.get_occlusion_tracer(context, points)
+    assert cache.depth_maps is not depth_maps and len(cache.rows) == 0
+
+
+def test_occluder_bounds():
+    """Rays only travel as far as the occluder bounds they enter, and not at all if they enter none."""
+    from lightpainter.core.occluders import OccluderBounds
+
+    bounds = OccluderBounds(np.array([(-1, -1, 1), (4, -1, 1)]), np.array([(1, 1, 2), (6, 1, 2)]))
+    origins = np.array([(0, 0, 0), (5, 0, 0), (2.5, 0, 0)])
+    lengths = bounds.get_ray_lengths(origins, np.array([(0, 0, 1)] * 3))
+
+    assert np.allclose(lengths[:2], 2.0, atol=0.1)
+    assert lengths[2] == 0.0
+
+
+def test_mesh_cache(tmp_path):
+    """Cached meshes and BVHs are memory-mapped back unchanged, shared with workers by file,
+    and evicted least recently used first.
+    """
+    from lightpainter.core.mesh_cache import get_key_digest, MeshCache
+    from lightpainter.core.occluders import Occluders
+    from lightpainter.core.occlusion_pool import pack_arrays, unpack_arrays
+
+    occluders = get_box_occluders()
+    triangles = occluders.meshes[0]
+    digest = get_key_digest(('box.blend', 0.0, 'Box'))
+    exports = []
+
+    def export():
+        exports.append(triangles)
+        return triangles
+
+    cache = MeshCache(str(tmp_path))
+    assert cache.get_triangles(digest, export) is triangles
+    loaded = cache.get_triangles(digest, export)
+    assert len(exports) == 1
+    assert isinstance(loaded, np.memmap) and np.array_equal(loaded, triangles)
+
+    built_bvh = cache.get_bvh(digest, triangles)
+    loaded_bvh = cache.get_bvh(digest, triangles)
+    assert isinstance(loaded_bvh.order, np.memmap)
+    assert np.array_equal(loaded_bvh.order, built_bvh.order)
+
+    # occluders have no BVH until rays are cast against them, then load cached ones
+    cached = Occluders([loaded], occluders.instance_meshes, occluders.instance_matrices,
+                       mesh_cache=cache, mesh_digests=[digest])
+    assert cached.mesh_bvhs == [None]
+    cached.load_mesh_bvhs()
+    assert isinstance(cached.mesh_bvhs[0].order, np.memmap)
+
+    # workers map cached arrays from their files instead of copying them into shared memory
+    memory, layout = pack_arrays(cached.to_arrays())
+    try:
+        assert layout['mesh_0'][0] is not None and layout['bvh_0_order'][0] is not None
+        assert layout['instance_matrices'][0] is None
+        unpacked = Occluders.from_arrays(unpack_arrays(memory, layout))
+        points = np.array([(0, 0, -1), (5, 0, -1), (2.5, 0, -1)])
+        directions = np.array([(0, 0, 1), (0, 0, -1)])
+        assert np.array_equal(unpacked.is_blocked(points, directions), occluders.is_blocked(points, directions))
+    finally:
+        memory.close()
+        memory.unlink()
+
+    # entries used within the last minute are spared, as other sessions may still map them
+    for _, _, path in cache.get_entries():
+        os.utime(path, (0.0, 0.0))
+    cache.max_bytes = cache.get_size()
+    other_digest = get_key_digest(('box.blend', 1.0, 'Box'))
+    cache.get_triangles(other_digest, lambda: triangles + 1.0)
+    assert cache.load_triangles(digest) is None
+    assert cache.load_triangles(other_digest) is not None
+    assert cache.get_size() <= cache.max_bytes
+
+    cache.clear()
+    assert cache.get_size() == 0
+
+
+def test_occlusion_pool_dispatch(monkeypatch):
+    """Pools cast small calls, and every call on a single CPU, in-process, and large ones wherever measured faster."""
+    from lightpainter.core import occlusion_pool
+
+    occluders = get_box_occluders()
+    points = np.zeros((occlusion_pool.MIN_POOL_RAYS, 3))
+    directions = np.array([(0, 0, 1)])
+
+    monkeypatch.setattr(occlusion_pool, 'get_cpu_count', lambda: 1)
+    assert not occlusion_pool.OcclusionPool(4).use_workers(occlusion_pool.MIN_POOL_RAYS)
+
+    monkeypatch.setattr(occlusion_pool, 'get_cpu_count', lambda: 8)
+    pool = occlusion_pool.OcclusionPool(4)
+    pool.published = occluders
+    calls = []
+
+    def map_is_blocked(*args):
+        calls.append(args)
+        return occluders.is_blocked(*args)
+
+    monkeypatch.setattr(pool, 'map_is_blocked', map_is_blocked)
+    pool.is_blocked(points[:10], directions)
+    assert len(calls) == 0 and pool.ray_times == {False: None, True: None}
+
+    # workers first, then this process, then whichever took less time per ray
+    pool.is_blocked(points, directions)
+    assert len(calls) == 1 and pool.ray_times[True] is not None
+    pool.is_blocked(points, directions)
+    assert len(calls) == 1 and pool.ray_times[False] is not None
+    pool.ray_times[True] = pool.ray_times[False] * 2.0
+    assert not pool.use_workers(len(points))
+    pool.ray_times[True] = pool.ray_times[False] / 2.0
+    assert pool.use_workers(len(points))
+
+
+def test_occluder_meshes(tmp_path, monkeypatch):
+    """Objects are exported once until their geometry changes, and unchanged ones are reused across sessions."""
+    from types import SimpleNamespace
+    from lightpainter.core.mesh_cache import MeshCache
+    from lightpainter.operators import occlusion
+
+    triangles = get_box_occluders().meshes[0]
+    exports = []
+
+    def get_object_triangles(obj):
+        exports.append(obj)
+        return triangles
+
+    monkeypatch.setattr(occlusion, 'get_object_triangles', get_object_triangles)
+    monkeypatch.setattr(occlusion.bpy.path, 'abspath', lambda path, library=None: path)
+
+    library_path = tmp_path / 'library.blend'
+    library_path.write_bytes(b'BLENDER')
+    obj = SimpleNamespace(name_full='Rock', library=SimpleNamespace(filepath=str(library_path), library=None))
+    obj.original = obj
+    cache = MeshCache(str(tmp_path / 'cache'))
+
+    meshes = occlusion.OccluderMeshes()
+    exported, digest = meshes.get_triangles(obj, cache)
+    assert digest is not None and len(exports) == 1
+    assert meshes.get_triangles(obj, cache)[0] is exported
+    assert len(exports) == 1
+
+    # a new session loads the linked object from the cache
+    loaded, loaded_digest = occlusion.OccluderMeshes().get_triangles(obj, cache)
+    assert len(exports) == 1
+    assert loaded_digest == digest and isinstance(loaded, np.memmap) and np.array_equal(loaded, triangles)
+
+    # edited objects no longer match their file, so they are exported again and kept out of the cache
+    meshes.generations['Rock'] = 1
+    edited, edited_digest = meshes.get_triangles(obj, cache)
+    assert edited_digest is None and len(exports) == 2
+    assert meshes.get_triangles(obj, cache)[0] is edited
+
+
+def test_min_area_rect():
+    """The tightest rectangle around a rotated rectangle is itself, whatever points lie inside."""
+    from lightpainter.core.hull import convex_hull_2d, IncrementalHull, min_area_rect
+
+    rng = np.random.default_rng(0)
+    angle = 0.3
+    rotation = np.array(((np.cos(angle), -np.sin(angle)), (np.sin(angle), np.cos(angle))))
+    points = np.vstack(((-2, -1), (2, -1), (2, 1), (-2, 1), rng.uniform(-1, 1, (500, 2)) * (2, 1))) @ rotation.T
+
+    hull = convex_hull_2d(points)
+    assert len(hull) == 4
+    center, fit_angle, length, width = min_area_rect(hull)
+    assert np.allclose(center, 0.0)
+    assert np.isclose(length * width, 8.0)
+    assert np.isclose(np.cos(4 * (fit_angle + angle)), 1.0)  # up to quarter turns
+
+    incremental = IncrementalHull()
+    points_3d = np.column_stack((points, np.zeros(len(points))))
+    incremental.update(points_3d[4:], np.eye(3))
+    assert np.allclose(incremental.update(points_3d, np.eye(3)), hull)
+
+
+def test_incremental_hull_frames():
+    """Hulls of a stroke on a curved surface match building them at once, while its average normal changes."""
+    from lightpainter.core.hull import convex_hull_2d, IncrementalHull
+    from lightpainter.core.placement import get_rotation_to_z
+
+    angles = np.linspace(0.0, 2.0, 300)
+    vertices = np.column_stack((np.cos(angles), np.sin(angles) * 0.5, np.sin(angles * 3.0) * 0.2 + angles))
+    incremental = IncrementalHull()
+    first_rotation = get_rotation_to_z(np.array((0.0, 0.0, 1.0)))
+    for count in range(4, len(vertices) + 1, 37):
+        normal = vertices[:count].mean(axis=0)
+        # back and forth between a changing normal and a fixed one
+        for align_to_z in (get_rotation_to_z(normal / np.linalg.norm(normal)), first_rotation):
+            hull = incremental.update(vertices[:count], align_to_z)
+            expected = convex_hull_2d(vertices[:count] @ align_to_z[:2].T)
+            assert len(hull) == len(expected) and np.allclose(np.sort(hull, axis=0), np.sort(expected, axis=0))
+
+
+def test_incremental_hull_3d():
+    """Patching the 3D hull point by point, or rebuilding it after erasing, matches building it at once."""
+    from lightpainter.core.hull import get_face_planes, IncrementalHull3D
+
+    points = np.random.default_rng(0).normal(size=(2000, 3))
+
+    def get_sorted_vertices(hull):
+        return hull[0][np.lexsort(hull[0].T)]
+
+    # a mesh patched with the changed slots of each update matches the hull's slots
+    incremental = IncrementalHull3D()
+    slot_faces = np.empty((0, 3), dtype=int)
+    for count in range(10, len(points) + 1, 10):
+        hull = incremental.update(points[:count])
+        coords, faces = incremental.get_slot_faces()
+        if incremental.changed_slots is None:
+            slot_faces = faces.copy()
+        else:
+            slot_faces = np.concatenate((slot_faces[:len(faces)], faces[len(slot_faces):]))
+            slot_faces[incremental.changed_slots] = faces[incremental.changed_slots]
+        assert np.array_equal(slot_faces, faces)
+        assert len(hull[1]) == len(faces) and np.allclose(np.sort(coords[faces], axis=None), np.sort(
+            hull[0][hull[2]], axis=None))
+    assert np.allclose(get_sorted_vertices(hull), get_sorted_vertices(IncrementalHull3D().update(points)))
+    assert incremental.update(points) is hull  # nothing new, nothing to write
+
+    vertices, face_sizes, face_vertices = hull
+    normals, offsets = get_face_planes(vertices, face_vertices.reshape(-1, 3))
+    assert np.all(points @ normals.T - offsets < 1e-9)
+    assert len(vertices) - len(face_sizes) * 3 // 2 + len(face_sizes) == 2  # closed surface
+
+    remaining = points[::2]
+    assert np.allclose(get_sorted_vertices(incremental.update(remaining)),
+                       get_sorted_vertices(IncrementalHull3D().update(remaining)))
+
+    assert IncrementalHull3D().update(points * (1, 1, 0)) is None
+
+
+def test_incremental_flat_hull():
+    """Flattened hulls follow the average normal once it moves past the tolerance, and match flattening at once."""
+    from lightpainter.core.hull import convex_hull_2d
+    from lightpainter.core.mesh import get_hull_points, IncrementalFlatHull
+    from lightpainter.core.placement import get_rotation_to_z
+
+    rng = np.random.default_rng(0)
+    vertices = rng.uniform(-1, 1, (400, 3)) * (1, 1, 0.1)
+    normals = np.tile((0.0, 0.0, 1.0), (len(vertices), 1))
+    normals[200:] += rng.normal(size=(200, 3)) * 1e-3  # wobbles within the tolerance
+
+    incremental = IncrementalFlatHull()
+    hull = incremental.update(vertices[:100], normals[:100])
+    for count in range(110, len(vertices) + 1, 10):
+        hull = incremental.update(vertices[:count], normals[:count])
+    assert np.array_equal(incremental.normal, (0.0, 0.0, 1.0))
+    assert incremental.update(vertices, normals) is hull
+
+    coords, face_sizes, face_vertices = hull
+    assert face_sizes.tolist() == [len(coords)] and np.allclose(coords[:, 2], coords[0, 2])
+    expected = convex_hull_2d(get_hull_points(vertices, np.tile((0.0, 0.0, 1.0), (len(vertices), 1)), True)[:, :2])
+    assert np.allclose(np.sort(coords[:, :2], axis=0), np.sort(expected, axis=0))
+
+    # a tilted stroke rebuilds the hull along its new average normal
+    tilted = np.array((0.0, 0.6, 0.8))
+    coords = incremental.update(vertices, np.tile(tilted, (len(vertices), 1)))[0]
+    assert np.allclose(incremental.normal, tilted)
+    assert np.allclose(coords @ tilted, coords[0] @ tilted)
+    assert len(coords) == len(convex_hull_2d(vertices @ get_rotation_to_z(tilted)[:2].T))
+
+
+def test_min_enclosing_cone():
+    """The narrowest cone around directions is bounded by the widest of them, not by their centroid."""
+    from lightpainter.core.cone import min_enclosing_cone
+
+    # a wide cluster and a single stray direction pull the centroid off the cone axis
+    angles = np.radians([0, 90, 180, 270])
+    directions = np.column_stack((np.sin(np.radians(30)) * np.cos(angles), np.sin(np.radians(30)) * np.sin(angles),
+                                  np.full(4, np.cos(np.radians(30)))))
+    directions = np.vstack((directions, directions[:1], directions[:1], (0, 0, 1)))
+
+    axis, half_angle = min_enclosing_cone(directions)
+    assert np.allclose(axis, (0, 0, 1))
+    assert np.isclose(np.degrees(half_angle), 30.0)
+
+
+def test_area_lamp_shapes():
+    """Ellipse and disk emitters fit the stroke itself, so they are smaller than the rectangle around it."""
+    from lightpainter.core.placement import get_area_lamp_box
+
+    angles = np.linspace(0, 2 * np.pi, 200, endpoint=False)
+    vertices = np.column_stack((3 * np.cos(angles), np.sin(angles), np.zeros(200)))
+    normal = np.array((0.0, 0.0, -1.0))
+
+    _, _, length, width = get_area_lamp_box(vertices, normal, shape='ELLIPSE')
+    assert np.isclose(length, 6.0, rtol=0.01) and np.isclose(width, 2.0, rtol=0.01)
+
+    _, _, length, width = get_area_lamp_box(vertices, normal, shape='DISK')
+    assert np.isclose(length, 6.0) and length == width
+
+    center, _, length, width = get_area_lamp_box(vertices, normal)
+    assert np.allclose(center, 0.0, atol=1e-9) and np.isclose(length * width, 12.0, rtol=0.01)
+
+
+def test_fast_area_lamp_box():
+    """While painting huge strokes, rectangles are fitted by PCA, which is close to exact on elongated strokes."""
+    from lightpainter.core.placement import FAST_FIT_POINTS, get_area_lamp_box
+
+    rng = np.random.default_rng(0)
+    points = rng.uniform((-5.0, -0.5), (5.0, 0.5), (FAST_FIT_POINTS, 2)) @ np.array(((0.8, 0.6), (-0.6, 0.8)))
+    vertices = np.column_stack((points, np.zeros(FAST_FIT_POINTS)))
+    normal = np.array((0.0, 0.0, -1.0))
+
+    _, _, length, width = get_area_lamp_box(vertices, normal)
+    _, _, fast_length, fast_width = get_area_lamp_box(vertices, normal, fast=True)
+    assert length * width <= fast_length * fast_width <= 1.02 * length * width
+    assert np.isclose(max(fast_length, fast_width), 10.0, rtol=0.01)
+
+    # below the threshold, the exact fit is kept
+    assert (get_area_lamp_box(vertices[:-1], normal, fast=True)[2:]
+            == get_area_lamp_box(vertices[:-1], normal)[2:])
+
+
+def test_prep_stroke():
+    """Strokes are prepared from arrays alone, so the core runs outside Blender."""
+    from lightpainter.core.mesh import get_tube_edges
+    from lightpainter.core.stroke import prep_stroke
+
+    vertices = np.array(((0.0, 0.0, 0.0), (1.0, 0.0, 0.0)))
+    normals = np.array(((0.0, 0.0, 1.0), (0.0, 1.0, 0.0)))
+
+    offset_vertices, offset_normals, orig_vertices = prep_stroke(vertices, normals, 'X', -2.0)
+    assert np.array_equal(offset_vertices, [(-2.0, 0.0, 0.0), (-1.0, 0.0, 0.0)])
+    assert np.array_equal(offset_normals, [(-1.0, 0.0, 0.0)] * 2) and np.array_equal(orig_vertices, vertices)
+
+    # camera looking straight down at a floor sees its own reflection
+    _, offset_normals, _ = prep_stroke(vertices[:1], normals[:1], 'REFLECT', 0.0, np.array((0.0, 0.0, 5.0)))
+    assert np.allclose(offset_normals, [(0.0, 0.0, 1.0)])
+    with pytest.raises(ValueError):
+        prep_stroke(vertices, normals, 'REFLECT', 0.0)
+
+    # single-point strokes have no edges, but still shift later strokes
+    assert get_tube_edges([3, 1, 2]).tolist() == [[0, 1], [1, 2], [4, 5]]
+
+
+def test_join_hulls():
+    """Joined hulls keep their faces, pointing to their own vertices."""
+    from lightpainter.core.mesh import join_hulls
+
+    triangle = (np.eye(3), np.array([3], dtype=np.int32), np.array([0, 1, 2], dtype=np.int32))
+    quad = (np.zeros((4, 3)), np.array([4], dtype=np.int32), np.array([0, 1, 2, 3], dtype=np.int32))
+    vertices, face_sizes, face_vertices = join_hulls([triangle, quad])
+    assert vertices.shape == (7, 3)
+    assert face_sizes.tolist() == [3, 4]
+    assert face_vertices.tolist() == [0, 1, 2, 3, 4, 5, 6]
+    assert join_hulls([])[0].shape == (0, 3)
+
+
+def test_simplify_hull():
+    """Simplified hulls stay within the face budget and still enclose every point."""
+    from lightpainter.core.hull import IncrementalHull3D
+    from lightpainter.core.mesh import get_polygon_normals, simplify_hull
+
+    points = np.random.default_rng(0).normal(size=(2000, 3)) * (3.0, 1.0, 0.5)
+    hull = IncrementalHull3D().update(points)
+    assert simplify_hull(hull, 0) is hull
+
+    vertices, face_sizes, face_vertices = simplify_hull(hull, 16)
+    assert len(face_sizes) == 16
+    assert len(vertices) - face_sizes.sum() // 2 + len(face_sizes) == 2  # closed surface
+
+    normals, areas = get_polygon_normals(vertices, face_sizes, face_vertices)
+    assert np.all(areas > 0.0)
+    first_vertices = vertices[face_vertices[np.cumsum(face_sizes) - face_sizes]]
+    offsets = np.einsum('ij,ij->i', normals, first_vertices)
+    assert np.all(points @ normals.T - offsets < 1e-9)
+
+    # a box stays a box, its triangles merged into quads
+    box = np.array([(x, y, z) for x in (0, 1) for y in (0, 2) for z in (0, 3)], dtype=np.float64)
+    vertices, face_sizes, _ = simplify_hull(IncrementalHull3D().update(box), 6)
+    assert face_sizes.tolist() == [4] * 6
+    assert np.allclose(np.ptp(vertices, axis=0), (1, 2, 3))
+
+
+def test_extract_faces():
+    """Copied faces keep their winding and move along their normals, in world space."""
+    from lightpainter.core.mesh import extract_faces
+
+    # two quads side by side, then a triangle, facing +Z
+    coords = np.array(((0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0), (2, 0, 0), (2, 1, 0), (3, 0, 0)), dtype=np.float64)
+    normals = np.tile((0.0, 0.0, 1.0), (len(coords), 1))
+    loop_starts = np.array((0, 4, 8))
+    loop_totals = np.array((4, 4, 3))
+    loop_vertices = np.array((0, 1, 2, 3, 1, 4, 5, 2, 4, 6, 5))
+    matrix_world = np.diag((2.0, 2.0, 2.0, 1.0))
+    matrix_world[:3, 3] = (0, 0, 5)
+
+    vertices, face_sizes, face_vertices = extract_faces(coords, normals, loop_starts, loop_totals, loop_vertices,
+                                                        np.array((2, 1)), matrix_world, 0.5)
+    assert face_sizes.tolist() == [3, 4]
+    assert vertices.shape == (5, 3)
+    assert np.allclose(vertices[:, 2], 5.5)
+    # same loops as the original faces, in the same order
+    assert np.allclose(vertices[face_vertices[:3]], coords[[4, 6, 5]] * 2 + (0, 0, 5.5))
+    assert np.allclose(vertices[face_vertices[3:]], coords[[1, 4, 5, 2]] * 2 + (0, 0, 5.5))
+
+
+def test_merge_by_distance():
+    """Merging a dense stroke keeps it a single path instead of collapsing it into one point."""
+    from lightpainter.core.mesh import get_island_roots, get_tube_edges, join_wires, merge_by_distance
+
+    stroke = np.column_stack((np.linspace(0.0, 1.0, 101), np.zeros(101), np.zeros(101)))
+    separate = stroke + (0.0, 5.0, 0.0)
+    vertices, edges = merge_by_distance(np.vstack((stroke, separate)), get_tube_edges([101, 101]), 0.045)
+
+    assert len(vertices) == 2 * 21  # every fifth point of each stroke is kept
+    assert len(edges) == 2 * 20
+    assert np.all(np.linalg.norm(vertices[edges[:, 0]] - vertices[edges[:, 1]], axis=1) <= 0.05 + 1e-9)
+    assert get_island_roots(len(vertices), edges).sum() == 2
+
+    # merging stroke by stroke then joining gives the same wires
+    wires = []
+    for path in (stroke, separate):
+        path_vertices, path_edges = merge_by_distance(path, get_tube_edges([len(path)]), 0.045)
+        wires.append((path_vertices, path_edges, get_island_roots(len(path_vertices), path_edges)))
+    joined_vertices, joined_edges, joined_roots = join_wires(wires)
+    assert np.allclose(joined_vertices, vertices) and np.array_equal(joined_edges, edges)
+    assert joined_roots.sum() == 2
+
+
+def test_sweep_circle():
+    """Swept tubes follow a curved path at a constant radius, closed and with outward faces."""
+    from lightpainter.core.mesh import get_polygon_normals, smooth_path, sweep_circle, thin_path
+
+    angles = np.linspace(0.0, np.pi, 200)
+    stroke = np.column_stack((np.cos(angles), np.sin(angles), angles * 0.2))
+    path = smooth_path(thin_path(stroke, 0.05), 2)
+    assert np.allclose(path[[0, -1]], stroke[[0, -1]])
+
+    vertices, face_sizes, face_vertices = sweep_circle(path, 0.1, 8)
+    assert len(vertices) == len(path) * 8
+    assert len(face_sizes) == (len(path) - 1) * 8 + 2
+    assert np.allclose(np.linalg.norm(vertices.reshape(-1, 8, 3) - path[:, np.newaxis], axis=2), 0.1)
+
+    # the closed tube's faces all point away from the path
+    normals, _ = get_polygon_normals(vertices, face_sizes, face_vertices)
+    centers = vertices[face_vertices[:-16].reshape(-1, 4)].mean(axis=1)
+    nearest = path[np.repeat(np.arange(len(path) - 1), 8)]
+    assert np.all(np.einsum('ij,ij->i', normals[:-2], centers - nearest) > 0.0)
+    assert np.dot(normals[-2], path[0] - path[1]) > 0.0 and np.dot(normals[-1], path[-1] - path[-2]) > 0.0
+
+
+def test_solve_memo():
+    """Stroke digests only change with the strokes, and the memo keeps the most recently used results."""
+    from lightpainter.core.memo import LRUMemo, StrokeDigest
+
+    points = [((float(idx), 0.0, 0.0), (0.0, 0.0, 1.0)) for idx in range(10)]
+    digest = StrokeDigest()
+    strokes = [points[:5]]
+    first = digest.update(strokes)
+    first_stroke_digest = digest.get_stroke_digests()[0]
+    strokes[0] += points[5:]
+    appended = digest.update(strokes)
+    assert appended != first and appended == StrokeDigest().update([points])
+    assert digest.update([points[:5], points[5:]]) != appended
+    assert digest.get_stroke_digests()[0] == first_stroke_digest
+
+    memo = LRUMemo(max_entries=2, max_bytes=1000)
+    memo.put('a', np.zeros(10))
+    memo.put('b', np.zeros(10))
+    assert memo.get('a') is not None
+    memo.put('c', np.zeros(10))
+    assert memo.get('b') is None and len(memo) == 2
+    memo.put('d', np.zeros(1000))
+    assert memo.get('d') is None
+    assert memo.get_or_compute('a', lambda: None) is memo.get('a')
+
+
+def test_lamp_solve_memo():
+    """Lamps are only solved again when the strokes or a parameter of their placement change."""
+    from types import SimpleNamespace
+    from lightpainter.operators.base_tool import BaseLightPaintTool
+    from lightpainter.operators.lamp_util import LampUtils
+
+    class LampTool(BaseLightPaintTool, LampUtils):
+        def __init__(self):
+            BaseLightPaintTool.__init__(self)
+            LampUtils.__init__(self)
+            self.axis = 'NORMAL'
+            self.offset = 1.0
+            self.power = 10.0
+            self.solve_count = 0
+
+        def solve_lamp(self, *args):
+            self.solve_count += 1
+            return super().solve_lamp(*args)
+
+    tool = LampTool()
+    context = SimpleNamespace(scene=SimpleNamespace(camera=None))
+    tool.mouse_path = [[((float(idx), 0.0, 0.0), (0.0, 0.0, 1.0)) for idx in range(5)]]
+
+    first = tool.get_lamp_placement(context, 'POINT')
+    assert tool.get_lamp_placement(context, 'POINT') is first and tool.solve_count == 1
+    tool.power = 100.0  # appearance only
+    assert tool.get_lamp_placement(context, 'POINT') is first and tool.solve_count == 1
+
+    tool.offset = 2.0
+    assert tool.get_lamp_placement(context, 'POINT') is not first and tool.solve_count == 2
+    tool.mouse_path[0].append(((5.0, 0.0, 0.0), (0.0, 0.0, 1.0)))
+    tool.get_lamp_placement(context, 'POINT')
+    assert tool.solve_count == 3
+
+
+def test_drag_property_updates():
+    """Dragging a property with its own writer skips update_light, dragging any other property solves again."""
+    from types import SimpleNamespace
+    from lightpainter.operators import flag_tool, lamp_adjust_tool, lamp_tool, mesh_tool, sky_tool
+    from lightpainter.operators.base_tool import BaseLightPaintTool
+
+    for module in (flag_tool, lamp_adjust_tool, lamp_tool, mesh_tool, sky_tool):
+        for cls in vars(module).values():
+            if isinstance(cls, type) and issubclass(cls, BaseLightPaintTool):
+                assert all(callable(getattr(cls, name, None)) for name in cls.property_updates.values()), cls
+
+    class DragTool(BaseLightPaintTool):
+        property_updates = {'power': 'update_power'}
+
+        def __init__(self):
+            super().__init__()
+            self.power = 10.0
+            self.offset = 1.0
+            self.calls = []
+
+        def update_light(self, context):
+            self.calls.append('update_light')
+
+        def update_power(self, context):
+            self.calls.append('update_power')
+
+    tool = DragTool()
+    tool.mouse_path = [[((0.0, 0.0, 0.0), (0.0, 0.0, 1.0))]]
+    context = SimpleNamespace(region=SimpleNamespace(x=0, width=1000))
+    event = SimpleNamespace(mouse_x=110, mouse_y=0, mouse_region_x=110, shift=False, ctrl=False)
+
+    tool.set_drag_attr('power', 100, drag_increment=1.0)
+    tool.handle_drag_event(context, event, None)
+    assert tool.power == 20.0 and tool.calls == ['update_power']
+
+    tool.set_drag_attr('offset', 100, drag_increment=0.1)
+    tool.handle_drag_event(context, event, None)
+    assert np.isclose(tool.offset, 2.0) and tool.calls == ['update_power', 'update_light']
+
+
+def test_surface_patch_cells(monkeypatch):
+    """Points painted in the same grid cell share one face search, and erasing them releases their faces."""
+    from types import SimpleNamespace
+    from lightpainter.operators import mesh_util
+
+    # a strip of 10 unit quads along X, face i spanning x from i to i + 1
+    arrays = {
+        'co': np.array([(x, y, 0.0) for y in (0.0, 1.0) for x in range(11)]),
+        'normal': np.tile((0.0, 0.0, 1.0), (22, 1)),
+        'loop_start': np.arange(0, 40, 4),
+        'loop_total': np.full(10, 4),
+        'vertex_index': np.array([(i, i + 1, i + 12, i + 11) for i in range(10)]).ravel(),
+    }
+    searches = []
+
+    def find_nearest_range(point, distance):
+        searches.append(point)
+        return [(None, None, i, 0.0) for i in range(10) if max(i - point[0], point[0] - i - 1, 0.0) <= distance]
+
+    monkeypatch.setattr(mesh_util, 'get_mesh_array', lambda _collection, attr, *_args: arrays[attr])
+    monkeypatch.setattr(mesh_util, 'BVHTree', SimpleNamespace(
+        FromObject=lambda *_args: SimpleNamespace(find_nearest_range=find_nearest_range)))
+    obj = SimpleNamespace(data=SimpleNamespace(vertices=None, polygons=None, loops=None), matrix_world=np.eye(4))
+    obj.evaluated_get = lambda _depsgraph: obj
+    patch = mesh_util.SurfacePatch(obj, None)
+
+    cell_points = {(x, 0.5, 0.0): 2 for x in (2.01, 2.03, 2.06, 2.1)}
+    far_point = {(7.6, 0.5, 0.0): 7}
+    result = patch.update({**cell_points, **far_point}, 0.5, 0.0)
+    assert len(searches) == 2
+    assert np.flatnonzero(patch.face_counts).tolist() == [1, 2, 6, 7, 8]
+    assert len(result[1]) == 5
+
+    # painting again in known cells searches nothing, erasing the cell's points releases its faces
+    patch.update({**cell_points, **far_point, (2.08, 0.52, 0.0): 2}, 0.5, 0.0)
+    assert len(searches) == 2
+    result = patch.update(far_point, 0.5, 0.0)
+    assert np.flatnonzero(patch.face_counts).tolist() == [6, 7, 8] and len(result[1]) == 3
+
+
+def test_tube_skin_data_kept(context, ops):
+    """Growing a tube's wire keeps its skin vertex data, so its modifiers are only added again after erasing."""
+    import bpy
+    from lightpainter.operators.mesh_tool import set_skin_modifiers
+    from lightpainter.operators.mesh_util import write_edges
+
+    mesh = bpy.data.meshes.new('LightPaint_Tube')
+    obj = bpy.data.objects.new(mesh.name, mesh)
+    context.collection.objects.link(obj)
+    vertices = np.array([(x, 0.0, 0.0) for x in range(6)])
+    edges = np.array([(i, i + 1) for i in range(5)])
+
+    write_edges(mesh, vertices[:3], edges[:2])
+    set_skin_modifiers(obj, True, True, 1, 1)
+    skin_mod = obj.modifiers[1]
+
+    write_edges(mesh, vertices, edges)
+    assert len(mesh.skin_vertices) == 1 and len(mesh.skin_vertices[0].data) == len(vertices)
+    set_skin_modifiers(obj, True, True, 1, 1)
+    assert obj.modifiers[1] == skin_mod
+
+    write_edges(mesh, vertices[:2], edges[:1])
+    assert len(mesh.skin_vertices) == 0
+    set_skin_modifiers(obj, True, True, 1, 1)
+    assert len(mesh.skin_vertices) == 1 and [mod.type for mod in obj.modifiers] == ['SUBSURF', 'SKIN', 'SUBSURF']
+
+
+def test_convex_hull_bulk():
+    """Convex hulls drop interior points, join triangles into quads and remove their temporary mesh."""
+    import bpy
+    from lightpainter.operators.mesh_util import get_convex_hull
+
+    mesh_count = len(bpy.data.meshes)
+    corners = np.array([(x, y, z) for x in (0.0, 1.0) for y in (0.0, 1.0) for z in (0.0, 1.0)])
+    vertices, face_sizes, face_vertices = get_convex_hull(np.vstack((corners, (0.5, 0.5, 0.5))))
+    assert len(vertices) == 8 and sorted(map(tuple, vertices)) == sorted(map(tuple, corners))
+    assert list(face_sizes) == [4] * 6 and len(face_vertices) == 24 and set(face_vertices) == set(range(8))
+
+    flat = corners[corners[:, 2] == 0.0]
+    vertices, face_sizes, face_vertices = get_convex_hull(flat)
+    assert np.array_equal(vertices, flat) and len(face_sizes) == 0 and len(face_vertices) == 0
+    assert len(bpy.data.meshes) == mesh_count
+
+
+def test_tube_rewrite_skipping(monkeypatch):
+    """Tube geometry is only written again when its solved result changes, not on every update."""
+    from types import SimpleNamespace
+    from lightpainter.operators import mesh_tool
+    from lightpainter.operators.base_tool import BaseLightPaintTool
+
+    written = []
+    monkeypatch.setattr(mesh_tool, 'write_splines', lambda curve, paths, prev_paths: written.append(paths))
+    monkeypatch.setattr(mesh_tool, 'set_emit_value', lambda obj, emit_value: None)
+
+    class TubeTool(BaseLightPaintTool):
+        update_curve = mesh_tool.LIGHTPAINTER_OT_Tube_Light.update_curve
+        get_stroke_tubes = mesh_tool.LIGHTPAINTER_OT_Tube_Light.get_stroke_tubes
+
+        def __init__(self):
+            super().__init__()
+            self.tube_type = 'CURVE'
+            self.axis = 'NORMAL'
+            self.offset = 1.0
+            self.merge_distance = 0.05
+            self.is_smooth = True
+            self.emit_value = 1.0
+            self.prev_tube = None
+            self.stroke_tubes = dict()
+
+        def set_visibility(self, obj):
+            pass
+
+    tool = TubeTool()
+    context = SimpleNamespace(scene=SimpleNamespace(camera=None),
+                              active_object=SimpleNamespace(data=SimpleNamespace(splines=[])))
+    tool.mouse_path = [[((float(idx), 0.0, 0.0), (0.0, 0.0, 1.0)) for idx in range(5)]]
+
+    tool.update_curve(context)
+    tool.update_curve(context)
+    assert len(written) == 1
+
+    tool.emit_value = 10.0  # appearance only
+    tool.update_curve(context)
+    assert len(written) == 1
+
+    tool.mouse_path[0].append(((5.0, 0.0, 0.0), (0.0, 0.0, 1.0)))
+    tool.update_curve(context)
+    assert len(written) == 2 and len(written[1][0]) == 6